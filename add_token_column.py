@@ -1,33 +1,18 @@
 import sqlite3
-import secrets
+import migrations
+from config import Config
 
-# Conectar a la base de datos
-conn = sqlite3.connect('cotizaciones.db')
-cursor = conn.cursor()
-
-# Agregar la columna token_aprobacion (sin UNIQUE porque SQLite no lo permite en ALTER)
-try:
-    cursor.execute('ALTER TABLE cotizaciones ADD COLUMN token_aprobacion TEXT')
-    conn.commit()
-    print('✓ Columna token_aprobacion agregada')
-except sqlite3.OperationalError as e:
-    print(f'Columna ya existe o error: {e}')
-
-# Generar tokens para todas las cotizaciones existentes sin token
-cursor.execute('SELECT id FROM cotizaciones WHERE token_aprobacion IS NULL')
-rows = cursor.fetchall()
-
-if rows:
-    print(f'\nGenerando tokens para {len(rows)} cotizaciones...')
-    for row in rows:
-        token = secrets.token_urlsafe(32)
-        cursor.execute('UPDATE cotizaciones SET token_aprobacion = ? WHERE id = ?', (token, row[0]))
-    conn.commit()
-    print(f'✓ {len(rows)} tokens generados exitosamente')
+# La columna token_aprobacion y la generación de tokens para cotizaciones
+# antiguas forman parte de las migraciones versionadas (migrations.py)
+desde, hasta = migrations.migrate(Config.DATABASE_PATH)
+if desde == hasta:
+    print(f'Esquema al día (versión {hasta}), no hay cambios que aplicar')
 else:
-    print('Todas las cotizaciones ya tienen token')
+    print(f'✓ Esquema migrado de la versión {desde} a la {hasta}')
 
 # Verificar
+conn = sqlite3.connect(Config.DATABASE_PATH)
+cursor = conn.cursor()
 cursor.execute('SELECT id, numero_cotizacion, token_aprobacion FROM cotizaciones')
 cotizaciones = cursor.fetchall()
 print(f'\n=== VERIFICACIÓN ===')
@@ -1,16 +1,11 @@
-import sqlite3
+import migrations
+from config import Config
 
-# Conectar a la base de datos
-conn = sqlite3.connect('cotizaciones.db')
-cursor = conn.cursor()
+# La columna emails_destino ahora es la migración 002 del esquema versionado
+desde, hasta = migrations.migrate(Config.DATABASE_PATH)
+if desde == hasta:
+    print(f'Esquema al día (versión {hasta}), la columna emails_destino ya existe')
+else:
+    print(f'✓ Esquema migrado de la versión {desde} a la {hasta}')
 
-# Agregar columna emails_destino para guardar los emails a los que se envió
-try:
-    cursor.execute('ALTER TABLE cotizaciones ADD COLUMN emails_destino TEXT')
-    conn.commit()
-    print('✓ Columna emails_destino agregada')
-except sqlite3.OperationalError as e:
-    print(f'Columna ya existe o error: {e}')
-
-conn.close()
 print('✓ Proceso completado')
@@ -1,16 +1,25 @@
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, Response, stream_with_context, g
 from flask_cors import CORS
 from functools import wraps
+import hashlib
+import hmac
 import os
+import time
 from datetime import datetime
 from uuid import uuid4
 from werkzeug.utils import secure_filename
 from database import Database
+from db_pool import usar_carril_lectura, restaurar_carril
+from proveedor_json import ProveedorJSON
+import instrumentacion_sql
+import metricas
 from pdf_generator import PDFGenerator
 from email_sender import EmailSender
+import importar_productos
 from config import Config
 
 app = Flask(__name__)
+app.json = ProveedorJSON(app)
 app.config.from_object(Config)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-integrational3-2025')
 app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
@@ -25,6 +34,85 @@ email_sender = EmailSender()
 os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(os.path.join(Config.UPLOAD_FOLDER, 'productos'), exist_ok=True)
 
+@app.before_request
+def elegir_carril_lectura():
+    """Las peticiones GET/HEAD leen por el pool de solo lectura (las escrituras que hagan usan el de escritura)"""
+    if request.method in ('GET', 'HEAD'):
+        g.carril_lectura = usar_carril_lectura()
+
+@app.teardown_request
+def restaurar_carril_lectura(exc):
+    token = g.pop('carril_lectura', None)
+    if token is not None:
+        restaurar_carril(token)
+
+@app.before_request
+def iniciar_instrumentacion_sql():
+    """Acumular sentencias, tiempo de SQL y conexiones de esta petición (sin envoltorios: sólo lo de /metrics)"""
+    g.instrumentacion_sql = instrumentacion_sql.iniciar_peticion()
+
+@app.after_request
+def cabecera_server_timing(response):
+    """
+    Server-Timing con el SQL de la petición (sólo para administradores, salvo
+    Config.SQL_SERVER_TIMING); en debug, aviso de sentencias repetidas (N+1)
+    """
+    estadisticas = instrumentacion_sql.estadisticas_actuales()
+    if estadisticas is None or not Config.SQL_INSTRUMENTACION:
+        return response
+    if Config.SQL_SERVER_TIMING or session.get('rol') == 'admin':
+        response.headers.add('Server-Timing', estadisticas.server_timing(detalle=app.debug))
+    if app.debug:
+        for forma, veces in estadisticas.repetidas(Config.SQL_N_MAS_1_UMBRAL):
+            print(f"[SQL] Posible N+1 en {request.method} {request.path}: {veces} ejecuciones de "
+                  f"{forma[:instrumentacion_sql.LARGO_MAX_SENTENCIA]}")
+    return response
+
+@app.teardown_request
+def finalizar_instrumentacion_sql(exc):
+    token = g.pop('instrumentacion_sql', None)
+    if token is not None:
+        instrumentacion_sql.finalizar_peticion(token)
+
+def _ruta_metricas():
+    """Plantilla de la ruta (cardinalidad acotada: /api/cotizaciones/<int:cotizacion_id>)"""
+    return request.url_rule.rule if request.url_rule else 'sin_ruta'
+
+@app.before_request
+def iniciar_metricas_peticion():
+    g.metricas_inicio = time.perf_counter()
+    g.metricas_ruta = _ruta_metricas()
+    metricas.registro.incrementar('cotizador_http_requests_in_flight', 1, route=g.metricas_ruta, method=request.method)
+
+@app.after_request
+def registrar_metricas_peticion(response):
+    """Latencia, tamaño de respuesta y tiempo de SQL por ruta y método"""
+    inicio = g.get('metricas_inicio')
+    if inicio is None:
+        return response
+    ruta = g.metricas_ruta
+    metricas.registro.incrementar('cotizador_http_requests_total', route=ruta, method=request.method,
+                                  status=str(response.status_code))
+    metricas.registro.observar('cotizador_http_request_duration_seconds', time.perf_counter() - inicio,
+                               route=ruta, method=request.method)
+    if not response.is_streamed and response.content_length is not None:
+        metricas.registro.observar('cotizador_http_response_size_bytes', response.content_length,
+                                   route=ruta, method=request.method)
+    estadisticas = instrumentacion_sql.estadisticas_actuales()
+    if estadisticas is not None:
+        metricas.registro.observar('cotizador_db_request_duration_seconds',
+                                   instrumentacion_sql.tiempo_db_s(estadisticas), route=ruta, method=request.method)
+        metricas.registro.incrementar('cotizador_db_statements_total', estadisticas.sentencias,
+                                      route=ruta, method=request.method)
+    metricas.registro.tal_vez_escribir()
+    return response
+
+@app.teardown_request
+def finalizar_metricas_peticion(exc):
+    ruta = g.pop('metricas_ruta', None)
+    if ruta is not None:
+        metricas.registro.incrementar('cotizador_http_requests_in_flight', -1, route=ruta, method=request.method)
+
 def _allowed_attachment(filename):
     if not filename or '.' not in filename:
         return False
@@ -57,6 +145,154 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def etag_tablas(*tablas):
+    """
+    GET condicional para listados: ETag débil derivado de los contadores de
+    cambios (versiones_tabla) de `tablas` y de la URL con sus parámetros.
+    Si el cliente envía el mismo ETag en If-None-Match se responde 304 sin
+    ejecutar la consulta ni serializar el resultado.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'GET':
+                return f(*args, **kwargs)
+            
+            versiones = db.versiones_tablas(*tablas)
+            # Accept también elige la representación (JSON o NDJSON)
+            clave = f"{versiones}|{request.full_path}|{request.headers.get('Accept', '')}"
+            firma = hashlib.sha1(clave.encode()).hexdigest()[:20]
+            
+            if request.if_none_match.contains_weak(firma):
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(firma, weak=True)
+            # El navegador debe revalidar siempre; el 304 es la respuesta barata
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+IDEMPOTENCIA_INTERVALO_SEGUNDOS = 0.1
+IDEMPOTENCIA_ABANDONO_SEGUNDOS = 300
+IDEMPOTENCIA_MAX_LONGITUD_CLAVE = 255
+
+def idempotente(f):
+    """
+    Soporte de la cabecera Idempotency-Key en un POST de creación.
+    
+    La primera petición con una clave reserva la clave en la base y guarda
+    su respuesta (códigos < 500); los reintentos con la misma clave y el
+    mismo cuerpo reciben esa respuesta sin volver a escribir. Un duplicado
+    que llega mientras la original sigue en curso espera su resultado
+    (hasta Config.IDEMPOTENCIA_ESPERA_SEGUNDOS, luego 409). La misma clave con otro
+    cuerpo es un error del cliente (422). Las claves son por usuario y ruta.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        clave = request.headers.get('Idempotency-Key')
+        if request.method != 'POST' or clave is None:
+            return f(*args, **kwargs)
+        
+        clave = clave.strip()
+        if not clave or len(clave) > IDEMPOTENCIA_MAX_LONGITUD_CLAVE:
+            return jsonify({'success': False, 'message': 'Idempotency-Key inválida'}), 400
+        
+        alcance = f"{session.get('user_id')}:{request.path}"
+        huella = hashlib.sha256(request.get_data()).hexdigest()
+        ttl = Config.IDEMPOTENCIA_TTL_HORAS * 3600
+        limite = time.monotonic() + Config.IDEMPOTENCIA_ESPERA_SEGUNDOS
+        
+        previa = db.reservar_idempotencia(alcance, clave, huella, ttl, IDEMPOTENCIA_ABANDONO_SEGUNDOS)
+        while previa is not None:
+            if previa['huella'] != huella:
+                return jsonify({
+                    'success': False,
+                    'message': 'Idempotency-Key ya usada con otro contenido'
+                }), 422
+            if previa['estado'] == 'completada':
+                response = app.response_class(
+                    previa['respuesta'], status=previa['codigo'], content_type=previa['tipo_contenido']
+                )
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if time.monotonic() >= limite:
+                response = jsonify({
+                    'success': False,
+                    'message': 'Una petición con la misma Idempotency-Key sigue en proceso'
+                })
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+            
+            time.sleep(IDEMPOTENCIA_INTERVALO_SEGUNDOS)
+            # Si la original liberó la clave (error 5xx) este duplicado la toma
+            previa = (db.consultar_idempotencia(alcance, clave)
+                      or db.reservar_idempotencia(alcance, clave, huella, ttl, IDEMPOTENCIA_ABANDONO_SEGUNDOS))
+        
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except Exception:
+            db.liberar_idempotencia(alcance, clave)
+            raise
+        
+        if response.status_code >= 500 or response.is_streamed:
+            db.liberar_idempotencia(alcance, clave)
+        else:
+            db.completar_idempotencia(
+                alcance, clave, response.status_code, response.get_data(as_text=True), response.content_type
+            )
+        return response
+    return decorated_function
+
+FILAS_POR_BLOQUE_STREAMING = 500
+
+def _formato_streaming():
+    """
+    Formato de exportación en streaming pedido por el cliente:
+    'ndjson' (?format=ndjson o Accept: application/x-ndjson), 'json'
+    (?format=json-stream: arreglo JSON enviado por bloques) o None.
+    """
+    formato = request.args.get('format', '').lower()
+    if formato == 'ndjson':
+        return 'ndjson'
+    if formato == 'json-stream':
+        return 'json'
+    mejor = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return 'ndjson' if mejor == 'application/x-ndjson' else None
+
+def _respuesta_streaming(filas, formato):
+    """
+    Enviar un iterable de filas codificándolas por bloques: la memoria queda
+    acotada al bloque y el primer byte sale sin esperar a toda la consulta.
+    """
+    def generar():
+        bloque = []
+        primero = True
+        if formato == 'json':
+            yield '['
+        for fila in filas:
+            texto = app.json.dumps(fila)
+            if formato == 'json':
+                texto = texto if primero else ',' + texto
+                primero = False
+            else:
+                texto += '\n'
+            bloque.append(texto)
+            if len(bloque) >= FILAS_POR_BLOQUE_STREAMING:
+                yield ''.join(bloque)
+                bloque = []
+        if bloque:
+            yield ''.join(bloque)
+        if formato == 'json':
+            yield ']'
+    
+    mimetype = 'application/json' if formato == 'json' else 'application/x-ndjson'
+    return Response(stream_with_context(generar()), mimetype=mimetype)
+
 # Rutas de autenticación
 
 @app.route('/')
@@ -153,10 +389,15 @@ def get_session():
 
 @app.route('/api/clientes', methods=['GET', 'POST'])
 @login_required
+@etag_tablas('clientes')
+@idempotente
 def clientes():
     """Gestión de clientes"""
     if request.method == 'GET':
         # Obtener todos los clientes
+        formato = _formato_streaming()
+        if formato:
+            return _respuesta_streaming(db.iterar_clientes(), formato)
         clientes_list = db.obtener_clientes()
         return jsonify(clientes_list)
     
@@ -250,14 +491,63 @@ def obtener_cliente(cliente_id):
                 'message': f'Error: {str(e)}'
             }), 400
 
+_PARAMS_LISTADO_COTIZACIONES = (
+    'limite', 'cursor', 'estado', 'estado_aprobacion', 'cliente_id', 'creado_por',
+    'desde', 'hasta', 'total_min', 'total_max', 'con_total', 'archivo'
+)
+LIMITE_MAX_COTIZACIONES = 200
+
+def _filtros_listado_cotizaciones(args):
+    """Traducir query params de /api/cotizaciones a argumentos de listar_cotizaciones"""
+    try:
+        limite = int(args.get('limite', 50))
+        filtros = {
+            'limite': max(1, min(limite, LIMITE_MAX_COTIZACIONES)),
+            'cursor': args.get('cursor') or None,
+            'estado': args.get('estado') or None,
+            'estado_aprobacion': args.get('estado_aprobacion') or None,
+            'cliente_id': int(args['cliente_id']) if args.get('cliente_id') else None,
+            'creado_por': int(args['creado_por']) if args.get('creado_por') else None,
+            'fecha_desde': args.get('desde') or None,
+            'fecha_hasta': args.get('hasta') or None,
+            'total_min': float(args['total_min']) if args.get('total_min') else None,
+            'total_max': float(args['total_max']) if args.get('total_max') else None,
+            'con_total': args.get('con_total', 'false').lower() in ('1', 'true'),
+            # ?archivo=1 lista las cotizaciones archivadas (archive.db)
+            'archivo': args.get('archivo', 'false').lower() in ('1', 'true'),
+        }
+    except ValueError:
+        raise ValueError('Parámetros de filtro inválidos')
+    
+    for clave in ('fecha_desde', 'fecha_hasta'):
+        if filtros[clave]:
+            try:
+                datetime.strptime(filtros[clave], '%Y-%m-%d')
+            except ValueError:
+                raise ValueError('Las fechas deben tener formato AAAA-MM-DD')
+    return filtros
+
 @app.route('/api/cotizaciones', methods=['GET', 'POST'])
 @login_required
+@etag_tablas('cotizaciones', 'clientes', 'usuarios')
+@idempotente
 def cotizaciones():
     """Gestión de cotizaciones"""
     if request.method == 'GET':
-        # Obtener todas las cotizaciones
-        cotizaciones_list = db.obtener_cotizaciones()
-        return jsonify(cotizaciones_list)
+        if not any(param in request.args for param in _PARAMS_LISTADO_COTIZACIONES):
+            # Sin paginación: todas las cotizaciones (compatibilidad o exportación)
+            formato = _formato_streaming()
+            if formato:
+                return _respuesta_streaming(db.iterar_cotizaciones(), formato)
+            cotizaciones_list = db.obtener_cotizaciones()
+            return jsonify(cotizaciones_list)
+        
+        try:
+            filtros = _filtros_listado_cotizaciones(request.args)
+            pagina = db.listar_cotizaciones(**filtros)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        return jsonify(pagina)
     
     elif request.method == 'POST':
         # Crear nueva cotización
@@ -287,12 +577,60 @@ def cotizaciones():
                 'message': f'Error al crear cotización: {str(e)}'
             }), 400
 
+LIMITE_MAX_COTIZACIONES_LOTE = 500
+
+@app.route('/api/cotizaciones/bulk', methods=['POST'])
+@login_required
+@idempotente
+def crear_cotizaciones_lote():
+    """
+    Crear muchas cotizaciones en una sola transacción.
+    
+    Cuerpo: {"cotizaciones": [{cliente_id, items, ...}, ...], "modo": "atomico"|"parcial"}
+    En modo atómico cualquier error cancela todo el lote; en modo parcial se
+    guardan las válidas y se reportan los errores por índice.
+    """
+    data = request.get_json(silent=True) or {}
+    cotizaciones_lote = data.get('cotizaciones')
+    modo = data.get('modo', 'atomico')
+    
+    if not isinstance(cotizaciones_lote, list) or not cotizaciones_lote:
+        return jsonify({'success': False, 'message': 'Se requiere una lista de cotizaciones'}), 400
+    if len(cotizaciones_lote) > LIMITE_MAX_COTIZACIONES_LOTE:
+        return jsonify({
+            'success': False,
+            'message': f'Máximo {LIMITE_MAX_COTIZACIONES_LOTE} cotizaciones por lote'
+        }), 400
+    
+    try:
+        resultado = db.crear_cotizaciones_lote(cotizaciones_lote, modo=modo, creado_por=session.get('user_id'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if resultado['errores'] and not resultado['creadas']:
+        codigo = 400
+    elif resultado['errores']:
+        codigo = 207
+    else:
+        codigo = 201
+    print(f"[API] Lote de cotizaciones ({modo}): {len(resultado['creadas'])} creadas, {len(resultado['errores'])} con error")
+    return jsonify({'success': not resultado['errores'], 'modo': modo, **resultado}), codigo
+
 @app.route('/api/cotizaciones/<int:cotizacion_id>', methods=['GET', 'PUT', 'DELETE'])
 @login_required
 def obtener_cotizacion(cotizacion_id):
     """Obtener o actualizar una cotización específica"""
     if request.method == 'GET':
-        cotizacion = db.obtener_cotizacion(cotizacion_id)
+        # ?include=cliente,items,adjuntos limita lo que se carga (sin parámetro: todo)
+        # ?archivo=1 busca también en las cotizaciones archivadas
+        try:
+            cotizacion = db.obtener_cotizacion(
+                cotizacion_id,
+                include=request.args.get('include'),
+                archivo=request.args.get('archivo', 'false').lower() in ('1', 'true')
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
         if cotizacion:
             return jsonify(cotizacion)
@@ -349,8 +687,7 @@ def obtener_cotizacion(cotizacion_id):
 @login_required
 def subir_adjuntos(cotizacion_id):
     """Subir adjuntos para una cotización"""
-    cotizacion = db.obtener_cotizacion(cotizacion_id)
-    if not cotizacion:
+    if not db.existe_cotizacion(cotizacion_id):
         return jsonify({'success': False, 'message': 'Cotización no encontrada'}), 404
 
     archivos = request.files.getlist('archivos')
@@ -436,7 +773,7 @@ def subir_adjuntos(cotizacion_id):
 def generar_pdf(cotizacion_id):
     """Generar PDF de una cotización"""
     try:
-        cotizacion = db.obtener_cotizacion(cotizacion_id)
+        cotizacion = db.obtener_cotizacion(cotizacion_id, include=('cliente', 'items'))
         
         if not cotizacion:
             return jsonify({'error': 'Cotización no encontrada'}), 404
@@ -484,7 +821,7 @@ def enviar_email(cotizacion_id):
         pdf_path = pdf_gen.generar_cotizacion_pdf(cotizacion)
         print(f"[API] PDF generado: {pdf_path}")
 
-        adjuntos = db.obtener_adjuntos(cotizacion_id)
+        adjuntos = cotizacion['adjuntos']
         
         # Obtener emails de destinatarios (puede ser uno o varios)
         emails = data.get('emails', [])
@@ -768,11 +1105,16 @@ def serve_upload(filename):
 
 @app.route('/api/productos', methods=['GET', 'POST'])
 @login_required
+@etag_tablas('productos')
+@idempotente
 def api_productos():
     """Gestión de productos"""
     if request.method == 'GET':
         # Obtener todos los productos
         incluir_inactivos = request.args.get('incluir_inactivos', 'false').lower() == 'true'
+        formato = _formato_streaming()
+        if formato:
+            return _respuesta_streaming(db.iterar_productos(incluir_inactivos), formato)
         productos = db.obtener_productos(incluir_inactivos)
         return jsonify(productos)
     
@@ -869,6 +1211,22 @@ def api_producto(producto_id):
                 'message': f'Error: {str(e)}'
             }), 500
 
+LIMITE_MAX_BUSQUEDA_PRODUCTOS = 100
+
+@app.route('/api/productos/search', methods=['GET'])
+@login_required
+@etag_tablas('productos')
+def buscar_productos():
+    """Búsqueda de texto completo de productos: ?q=texto&limite=20&incluir_inactivos=false"""
+    try:
+        limite = max(1, min(int(request.args.get('limite', 20)), LIMITE_MAX_BUSQUEDA_PRODUCTOS))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'El límite debe ser un número'}), 400
+    
+    incluir_inactivos = request.args.get('incluir_inactivos', 'false').lower() == 'true'
+    productos = db.buscar_productos(request.args.get('q', ''), limite, incluir_inactivos)
+    return jsonify(productos)
+
 @app.route('/api/productos/buscar/<codigo>', methods=['GET'])
 @login_required
 def buscar_producto_por_codigo(codigo):
@@ -878,13 +1236,128 @@ def buscar_producto_por_codigo(codigo):
         return jsonify(producto)
     return jsonify({'error': 'Producto no encontrado'}), 404
 
+@app.route('/api/admin/productos/importar', methods=['POST'])
+@admin_required
+def importar_productos_archivo():
+    """Importar/actualizar productos desde una lista de precios CSV o XLSX (campo 'archivo')"""
+    archivo = request.files.get('archivo')
+    if not archivo or not archivo.filename:
+        return jsonify({'success': False, 'message': 'No se recibió ningún archivo'}), 400
+    
+    try:
+        tamano_lote = max(1, min(int(request.form.get('lote', 1000)), 10000))
+        resultado = importar_productos.importar_archivo(
+            db, archivo.stream, archivo.filename, tamano_lote,
+            encoding=request.form.get('encoding') or 'utf-8-sig'
+        )
+    except (ValueError, LookupError) as e:
+        # Incluye UnicodeDecodeError; los lotes anteriores al error ya quedaron guardados
+        return jsonify({'success': False, 'message': f'No se pudo importar: {str(e)}'}), 400
+    
+    print(f"[API] Importación de productos {archivo.filename}: "
+          f"{resultado['insertados']} nuevos, {resultado['actualizados']} actualizados, "
+          f"{resultado['rechazados']} rechazados en {resultado['segundos']}s")
+    return jsonify({'success': True, **resultado})
+
+_FILTROS_REPRECIO = ('categoria', 'tipo', 'prefijo_codigo', 'ids', 'incluir_inactivos', 'todos')
+
+@app.route('/api/admin/productos/reprecio', methods=['POST'])
+@admin_required
+def repreciar_productos():
+    """
+    Reprecio masivo: {"operacion": "porcentaje|delta|factor|redondeo", "valor": 5,
+    "redondeo": 1, "simular": true, "categoria": "...", "tipo": "...",
+    "prefijo_codigo": "...", "ids": [...], "incluir_inactivos": false}
+    """
+    data = request.get_json() or {}
+    try:
+        resultado = db.repreciar_productos(
+            operacion=data.get('operacion'),
+            valor=data.get('valor', 0),
+            redondeo=data.get('redondeo', 0.01),
+            simular=bool(data.get('simular', False)),
+            usuario_id=session.get('user_id'),
+            **{clave: data[clave] for clave in _FILTROS_REPRECIO if clave in data}
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if not resultado['simulacion']:
+        print(f"[API] Reprecio {resultado['lote']}: {resultado['afectados']} productos ({data.get('operacion')} {data.get('valor')})")
+    return jsonify({'success': True, **resultado})
+
+@app.route('/api/admin/productos/reprecio/<lote>', methods=['GET'])
+@admin_required
+def historial_reprecio(lote):
+    """Precios antes/después de un lote de reprecio"""
+    return jsonify(db.obtener_historial_precios(lote=lote, limite=10000))
+
+@app.route('/api/productos/<int:producto_id>/historial-precios', methods=['GET'])
+@login_required
+def historial_precios_producto(producto_id):
+    """Historial de cambios de precio de un producto"""
+    return jsonify(db.obtener_historial_precios(producto_id=producto_id))
+
 @app.route('/api/categorias', methods=['GET'])
 @login_required
+@etag_tablas('productos')
 def api_categorias():
     """Obtener lista de categorías"""
     categorias = db.obtener_categorias()
     return jsonify(categorias)
 
+LIMITE_MAX_CAMBIOS = 2000
+
+@app.route('/api/changes', methods=['GET'])
+@login_required
+def obtener_cambios():
+    """
+    Cambios desde un cursor para sincronizar por deltas:
+    ?since=<cursor>&tablas=clientes,productos,cotizaciones&limite=500.
+    Sin since sólo devuelve el cursor actual. Las cotizaciones movidas al
+    archivo llegan en `archivados`, no en `eliminados`.
+    """
+    try:
+        desde = request.args.get('since')
+        desde = int(desde) if desde not in (None, '') else None
+        limite = max(1, min(int(request.args.get('limite', 500)), LIMITE_MAX_CAMBIOS))
+        tablas = [t.strip() for t in request.args.get('tablas', '').split(',') if t.strip()] or None
+        return jsonify(db.obtener_cambios(desde, tablas, limite))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Parámetros inválidos: {str(e)}'}), 400
+
+@app.route('/api/admin/db/pool', methods=['GET'])
+@admin_required
+def estadisticas_pool():
+    """Estadísticas del pool de conexiones SQLite de este worker"""
+    return jsonify(db.pool_stats())
+
+@app.route('/metrics', methods=['GET'])
+def metricas_prometheus():
+    """Métricas de todos los workers en formato de texto de Prometheus (token del scraper o sesión de admin)"""
+    autorizacion = request.headers.get('Authorization', '').encode()
+    token_valido = bool(Config.METRICAS_TOKEN) and hmac.compare_digest(
+        autorizacion, f'Bearer {Config.METRICAS_TOKEN}'.encode()
+    )
+    if not token_valido:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'message': 'No autenticado'}), 401
+        if session.get('rol') != 'admin':
+            return jsonify({'success': False, 'message': 'Acceso denegado'}), 403
+    return Response(metricas.exposicion(metricas.combinar()), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/admin/db/cola', methods=['GET'])
+@admin_required
+def estadisticas_cola_escritura():
+    """Estadísticas de la cola de escritura (tamaño de lotes, espera, commits) de este worker"""
+    return jsonify({'activa': Config.DB_COLA_ESCRITURA, 'stats': db.cola_stats()})
+
+@app.route('/api/admin/cache', methods=['GET'])
+@admin_required
+def estadisticas_cache():
+    """Estadísticas (hits/misses) de la caché del catálogo de este worker"""
+    return jsonify(db.cache_stats())
+
 @app.route('/api/config', methods=['GET'])
 def obtener_config():
     """Obtener configuración de la empresa"""
@@ -902,7 +1375,7 @@ def obtener_config():
 def aprobar_cotizacion(token):
     """Página pública para aprobar cotización"""
     try:
-        cotizacion = db.obtener_cotizacion_por_token(token)
+        cotizacion = db.obtener_cotizacion_por_token(token, include=('cliente',))
         
         if not cotizacion:
             return render_template('aprobacion_resultado.html', 
@@ -965,7 +1438,7 @@ def aprobar_cotizacion(token):
 def rechazar_cotizacion(token):
     """Página pública para rechazar cotización"""
     try:
-        cotizacion = db.obtener_cotizacion_por_token(token)
+        cotizacion = db.obtener_cotizacion_por_token(token, include=('cliente',))
         
         if not cotizacion:
             return render_template('aprobacion_resultado.html',
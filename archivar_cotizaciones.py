@@ -0,0 +1,41 @@
+"""
+Archivar cotizaciones viejas o cerradas en la base de archivo (archive.db)
+
+Mueve por lotes pequeños (cada uno en transacciones cortas) las cotizaciones
+con sus items y adjuntos; siguen consultables con ?archivo=1 en la API.
+
+Uso (por ejemplo semanal desde cron):
+    python archivar_cotizaciones.py [--dias 730] [--dias-estado-final 180] [--lote 100]
+                                    [--max-lotes N] [--pausa 0.05]
+"""
+import argparse
+import time
+
+from config import Config
+from database import Database
+
+parser = argparse.ArgumentParser(description='Archivar cotizaciones viejas o cerradas')
+parser.add_argument('--dias', type=int, default=Config.ARCHIVO_DIAS,
+                    help='archivar cualquier cotización con más de estos días')
+parser.add_argument('--dias-estado-final', type=int, default=Config.ARCHIVO_DIAS_ESTADO_FINAL,
+                    help=f'días para las cotizaciones en estado final ({Config.ARCHIVO_ESTADOS_FINALES})')
+parser.add_argument('--lote', type=int, default=100, help='cotizaciones por transacción')
+parser.add_argument('--max-lotes', type=int, help='detenerse tras este número de lotes')
+parser.add_argument('--pausa', type=float, default=0.05, help='segundos entre lotes')
+args = parser.parse_args()
+
+db = Database()
+inicio = time.perf_counter()
+resultado = db.archivar_cotizaciones(
+    dias=args.dias,
+    dias_estado_final=args.dias_estado_final,
+    tamano_lote=args.lote,
+    max_lotes=args.max_lotes,
+    pausa=args.pausa,
+)
+
+print(f"✓ Cotizaciones archivadas: {resultado['cotizaciones']} en {resultado['lotes']} lotes")
+print(f"  Archivo: {db.archivo_path}")
+if resultado['pendientes']:
+    print('  Quedan cotizaciones por archivar: vuelva a ejecutar')
+print(f"Tiempo: {time.perf_counter() - inicio:.3f}s")
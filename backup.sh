@@ -22,29 +22,23 @@ echo ""
 # Crear directorio de backup si no existe
 mkdir -p $BACKUP_DIR
 
-# Backup de base de datos
-echo -e "${GREEN}Respaldando base de datos...${NC}"
+# Backup en caliente de las bases (API de backup de SQLite, verificado con
+# integrity_check) e incremental de uploads/ y pdfs/ contra un manifiesto de hashes.
+# Ya no se usa cp sobre la base en uso: podía copiar un archivo a medio escribir.
+echo -e "${GREEN}Respaldando bases de datos y archivos...${NC}"
 if [ -f "$APP_DIR/data/cotizaciones.db" ]; then
-    cp "$APP_DIR/data/cotizaciones.db" "$BACKUP_DIR/db_$DATE.db"
-    echo "✓ Base de datos respaldada: db_$DATE.db"
+    python3 "$APP_DIR/respaldo.py" respaldar \
+        --destino "$BACKUP_DIR" \
+        --raiz "$APP_DIR" \
+        --base data/cotizaciones.db \
+        --base data/archive.db \
+        --carpeta uploads \
+        --carpeta pdfs \
+        --retencion-dias $RETENTION_DAYS || exit 1
 else
     echo -e "${YELLOW}⚠ Base de datos no encontrada${NC}"
 fi
 
-# Backup de uploads
-echo -e "${GREEN}Respaldando archivos subidos...${NC}"
-if [ -d "$APP_DIR/uploads" ]; then
-    tar -czf "$BACKUP_DIR/uploads_$DATE.tar.gz" -C "$APP_DIR" uploads/
-    echo "✓ Uploads respaldados: uploads_$DATE.tar.gz"
-fi
-
-# Backup de PDFs
-echo -e "${GREEN}Respaldando PDFs...${NC}"
-if [ -d "$APP_DIR/pdfs" ]; then
-    tar -czf "$BACKUP_DIR/pdfs_$DATE.tar.gz" -C "$APP_DIR" pdfs/
-    echo "✓ PDFs respaldados: pdfs_$DATE.tar.gz"
-fi
-
 # Backup de configuración
 echo -e "${GREEN}Respaldando configuración...${NC}"
 if [ -f "$APP_DIR/.env" ]; then
@@ -52,12 +46,10 @@ if [ -f "$APP_DIR/.env" ]; then
     echo "✓ Configuración respaldada: env_$DATE.txt"
 fi
 
-# Limpiar backups antiguos
+# Limpiar copias de configuración antiguas (respaldo.py aplica la retención del resto)
 echo ""
-echo -e "${GREEN}Limpiando backups antiguos (>$RETENTION_DAYS días)...${NC}"
-find "$BACKUP_DIR" -name "*.db" -mtime +$RETENTION_DAYS -delete
-find "$BACKUP_DIR" -name "*.tar.gz" -mtime +$RETENTION_DAYS -delete
-find "$BACKUP_DIR" -name "*.txt" -mtime +$RETENTION_DAYS -delete
+echo -e "${GREEN}Limpiando configuraciones antiguas (>$RETENTION_DAYS días)...${NC}"
+find "$BACKUP_DIR" -maxdepth 1 -name "env_*.txt" -mtime +$RETENTION_DAYS -delete
 echo "✓ Limpieza completada"
 
 # Resumen
@@ -65,6 +57,8 @@ echo ""
 echo "============================================"
 echo "Backup completado exitosamente"
 echo "Ubicación: $BACKUP_DIR"
+echo "Verificar: python3 $APP_DIR/respaldo.py verificar <respaldo>"
+echo "Restaurar: python3 $APP_DIR/respaldo.py restaurar <respaldo> --en <directorio>"
 echo "============================================"
 echo ""
 
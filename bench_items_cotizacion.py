@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark: guardado de items de cotización (anterior vs. por diferencias)
+
+Compara el método anterior de actualizar_cotizacion (DELETE de todos los
+items + un INSERT por item) contra el actual (diff por id con executemany)
+para cotizaciones de 10, 500 y 5,000 items, editando el 10% de ellos.
+
+Uso:
+    python bench_items_cotizacion.py
+"""
+import os
+import tempfile
+import time
+
+from database import Database
+
+TAMANOS = (10, 500, 5000)
+REPETICIONES = 5
+
+
+def _actualizar_anterior(db, cotizacion_id, items):
+    """Implementación anterior: borra y reinserta item por item"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM cotizacion_items WHERE cotizacion_id = ?', (cotizacion_id,))
+    for item in items:
+        item_subtotal = item['cantidad'] * item['precio_unitario']
+        cursor.execute('''
+            INSERT INTO cotizacion_items 
+            (cotizacion_id, producto_id, concepto, descripcion, cantidad, precio_unitario, subtotal)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (cotizacion_id, item.get('producto_id'), item['concepto'], item.get('descripcion', ''),
+              item['cantidad'], item['precio_unitario'], item_subtotal))
+    conn.commit()
+    conn.close()
+
+
+def _cambios_filas(db):
+    """Filas modificadas acumuladas por la conexión del pool"""
+    conn = db.get_connection()
+    total = conn.total_changes
+    conn.close()
+    return total
+
+
+def _medir(db, cliente_id, n, actualizar):
+    items = [
+        {'concepto': f'Concepto {i}', 'descripcion': 'Descripción de servicio ' * 4,
+         'cantidad': 1, 'precio_unitario': 100.0}
+        for i in range(n)
+    ]
+    cotizacion_id, _ = db.crear_cotizacion(cliente_id, items)
+
+    tiempos = []
+    filas = 0
+    for repeticion in range(REPETICIONES):
+        guardados = db.obtener_cotizacion(cotizacion_id)['items']
+        # Editar el 10% de los items (al menos uno)
+        for item in guardados[::10]:
+            item['cantidad'] += 1
+        antes = _cambios_filas(db)
+        inicio = time.perf_counter()
+        actualizar(db, cotizacion_id, cliente_id, guardados)
+        tiempos.append(time.perf_counter() - inicio)
+        filas += _cambios_filas(db) - antes
+
+    return min(tiempos) * 1000, filas // REPETICIONES
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directorio:
+        db = Database(os.path.join(directorio, 'bench.db'))
+        cliente_id = db.crear_cliente('Cliente', 'bench@test.com')
+
+        print(f"{'items':>6} | {'anterior ms':>12} | {'filas':>6} | {'diff ms':>9} | {'filas':>6} | {'mejora':>7}")
+        print('-' * 62)
+        for n in TAMANOS:
+            anterior_ms, anterior_filas = _medir(
+                db, cliente_id, n,
+                lambda db, cid, _cl, items: _actualizar_anterior(db, cid, items)
+            )
+            diff_ms, diff_filas = _medir(
+                db, cliente_id, n,
+                lambda db, cid, cl, items: db.actualizar_cotizacion(cid, cl, items)
+            )
+            print(f'{n:>6} | {anterior_ms:>12.2f} | {anterior_filas:>6} | {diff_ms:>9.2f} | '
+                  f'{diff_filas:>6} | {anterior_ms / diff_ms:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
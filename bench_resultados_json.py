@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark: listados grandes a JSON (dict por fila + json vs. FilaDict + orjson)
+
+Compara el camino anterior de los listados (cada sqlite3.Row copiada a un
+dict y codificada con el proveedor JSON por omisión de Flask) contra el
+actual (tuplas armadas como `FilaDict` desde cursor.description y
+codificadas por ProveedorJSON sin hook por fila) sobre 10,000 cotizaciones
+y 50,000 productos, más el catálogo en caché (filas ya armadas: sólo se
+codifica). Reporta tiempo de CPU (mejor de varias repeticiones) y memoria
+pico (tracemalloc) de consulta + codificación, y falla si el camino actual
+no es más rápido.
+
+Uso:
+    python bench_resultados_json.py
+"""
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import proveedor_json
+from database import Database
+from filas import consultar_filas
+from proveedor_json import ProveedorJSON
+
+COTIZACIONES = 10_000
+PRODUCTOS = 50_000
+REPETICIONES = 3
+
+CONSULTAS = {
+    'cotizaciones': Database._SQL_COTIZACIONES_CON_CLIENTE + ' ORDER BY c.fecha_creacion DESC',
+    'productos': 'SELECT * FROM productos ORDER BY nombre',
+}
+
+
+def _sembrar(db):
+    db.importar_productos(
+        ('codigo', 'nombre', 'descripcion', 'precio', 'categoria'),
+        ({'codigo': f'P-{i:06d}', 'nombre': f'Producto {i}', 'descripcion': 'Descripción de catálogo ' * 3,
+          'precio': 10.0 + i % 500, 'categoria': f'Categoría {i % 40}'} for i in range(PRODUCTOS)),
+        tamano_lote=5000,
+    )
+    clientes = [db.crear_cliente(f'Cliente {i}', f'c{i}@test.com') for i in range(200)]
+    items = [{'concepto': f'Concepto {j}', 'cantidad': 1, 'precio_unitario': 100.0} for j in range(3)]
+    for inicio in range(0, COTIZACIONES, 500):
+        db.crear_cotizaciones_lote([
+            {'cliente_id': clientes[i % len(clientes)], 'items': items, 'notas': 'Nota de la cotización'}
+            for i in range(inicio, min(inicio + 500, COTIZACIONES))
+        ])
+
+
+def _anterior(conn, sql, proveedor):
+    conn.row_factory = sqlite3.Row
+    filas = [dict(row) for row in conn.execute(sql).fetchall()]
+    return proveedor.response(filas).get_data()
+
+
+def _actual(conn, sql, proveedor):
+    filas = consultar_filas(conn, sql)
+    return proveedor.response(filas).get_data()
+
+
+def _catalogo_en_cache(filas):
+    """Camino de obtener_productos(): las filas salen de la caché y sólo se codifican"""
+    def camino(conn, sql, proveedor):
+        return proveedor.response(filas).get_data()
+    return camino
+
+
+def _medir(ruta, sql, camino, proveedor):
+    conn = sqlite3.connect(ruta)
+    try:
+        tiempos = []
+        for _ in range(REPETICIONES):
+            inicio = time.process_time()
+            cuerpo = camino(conn, sql, proveedor)
+            tiempos.append(time.process_time() - inicio)
+
+        tracemalloc.start()
+        camino(conn, sql, proveedor)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        conn.close()
+    return min(tiempos) * 1000, pico / (1024 * 1024), len(cuerpo)
+
+
+def main():
+    app = Flask(__name__)
+    anterior = DefaultJSONProvider(app)
+    actual = ProveedorJSON(app)
+    motor = 'orjson' if proveedor_json.orjson else 'json (sin orjson)'
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'bench.db')
+        _sembrar(Database(ruta))
+
+        print(f'Codificador actual: {motor}')
+        print(f"{'listado':>12} | {'filas':>6} | {'camino':>8} | {'CPU ms':>8} | {'pico MB':>8} | {'bytes':>10}")
+        print('-' * 68)
+        conn = sqlite3.connect(ruta)
+        catalogo = consultar_filas(conn, CONSULTAS['productos'])
+        conn.close()
+        casos = [(nombre, sql, _actual) for nombre, sql in CONSULTAS.items()]
+        casos.append(('catálogo', CONSULTAS['productos'], _catalogo_en_cache(catalogo)))
+
+        for nombre, sql, camino_actual in casos:
+            filas = COTIZACIONES if nombre == 'cotizaciones' else PRODUCTOS
+            resultados = {}
+            for etiqueta, camino, proveedor in (('anterior', _anterior, anterior),
+                                                ('actual', camino_actual, actual)):
+                resultados[etiqueta] = _medir(ruta, sql, camino, proveedor)
+                cpu_ms, pico_mb, tamano = resultados[etiqueta]
+                print(f'{nombre:>12} | {filas:>6} | {etiqueta:>8} | {cpu_ms:>8.1f} | {pico_mb:>8.1f} | {tamano:>10}')
+            print(f"{'':>12} | {'':>6} | {'mejora':>8} | "
+                  f"{resultados['anterior'][0] / resultados['actual'][0]:>7.1f}x | "
+                  f"{resultados['anterior'][1] / resultados['actual'][1]:>7.1f}x |")
+            assert resultados['actual'][0] < resultados['anterior'][0], f'{nombre}: el camino actual no es más rápido'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Caché en memoria por proceso (worker de Gunicorn) de datos derivados de una tabla
+
+Cada caché guarda una instantánea junto con la versión de la tabla en
+`versiones_tabla`, un contador que mantienen triggers de SQLite en cada
+INSERT/UPDATE/DELETE. Antes de servir la instantánea se compara esa versión
+con la de la base (una lectura por llave primaria): si otro worker modificó
+la tabla, la caché se recarga. Las escrituras del propio worker además la
+invalidan de inmediato con `invalidar()`.
+"""
+import os
+import threading
+import time
+
+
+class CacheTabla:
+    """Instantánea de solo lectura de una tabla, validada contra su contador de cambios"""
+
+    def __init__(self, tabla):
+        self.tabla = tabla
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        """Caché vacía (también tras un fork del proceso)"""
+        self._pid = os.getpid()
+        self._instantanea = None  # (versión, datos)
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidaciones': 0,
+            'carga_total_ms': 0.0,
+        }
+        self._cargado_en = None
+
+    def version(self, conn):
+        """Versión actual de la tabla según la base"""
+        row = conn.execute(
+            'SELECT version FROM versiones_tabla WHERE tabla = ?', (self.tabla,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def obtener(self, conn, cargar):
+        """
+        Datos vigentes de la caché; si cambió la versión se recargan.
+
+        Args:
+            conn: conexión del pool (la usa también `cargar`)
+            cargar: función conn -> datos que arma la instantánea
+
+        Los datos devueltos se comparten entre peticiones: no deben modificarse.
+        """
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reiniciar()
+
+        version = self.version(conn)
+        instantanea = self._instantanea
+        if instantanea is not None and instantanea[0] == version:
+            with self._lock:
+                self._stats['hits'] += 1
+            return instantanea[1]
+
+        with self._lock:
+            # Otro hilo/greenlet pudo recargar mientras se esperaba el lock
+            instantanea = self._instantanea
+            if instantanea is not None and instantanea[0] == version:
+                self._stats['hits'] += 1
+                return instantanea[1]
+
+            self._stats['misses'] += 1
+            inicio = time.perf_counter()
+            # Versión y datos se leen en la misma transacción (misma instantánea WAL)
+            en_transaccion = conn.in_transaction
+            if not en_transaccion:
+                conn.execute('BEGIN')
+            try:
+                version = self.version(conn)
+                datos = cargar(conn)
+            finally:
+                if not en_transaccion:
+                    conn.commit()
+            self._stats['carga_total_ms'] += (time.perf_counter() - inicio) * 1000
+            self._instantanea = (version, datos)
+            self._cargado_en = time.time()
+            return datos
+
+    def invalidar(self):
+        """Descartar la instantánea (tras una escritura de este proceso)"""
+        with self._lock:
+            self._instantanea = None
+            self._stats['invalidaciones'] += 1
+
+    def stats(self):
+        """Métricas de la caché para monitoreo"""
+        with self._lock:
+            datos = dict(self._stats)
+            datos.update({
+                'tabla': self.tabla,
+                'pid': self._pid,
+                'version': self._instantanea[0] if self._instantanea else None,
+                'cargada': self._instantanea is not None,
+                'cargado_en': self._cargado_en,
+            })
+        consultas = datos['hits'] + datos['misses']
+        datos['hit_ratio'] = round(datos['hits'] / consultas, 4) if consultas else None
+        datos['carga_total_ms'] = round(datos['carga_total_ms'], 3)
+        return datos
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(db_path, tabla):
+    """Caché compartida por todas las instancias de Database del proceso"""
+    clave = (os.path.abspath(db_path), tabla)
+    cache = _caches.get(clave)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(clave)
+            if cache is None:
+                cache = CacheTabla(tabla)
+                _caches[clave] = cache
+    return cache
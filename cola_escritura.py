@@ -0,0 +1,279 @@
+"""
+Cola de escritura por proceso con commit agrupado (group commit)
+
+Opcional (Config.DB_COLA_ESCRITURA): en lugar de que cada petición abra su
+propia transacción de escritura y haga su propio COMMIT (un fsync cada una y
+competencia por el lock de SQLite entre greenlets del mismo worker), las
+escrituras de Database se encolan y un único hilo escritor por proceso las
+ejecuta agrupadas:
+
+    BEGIN IMMEDIATE
+      SAVEPOINT operacion; op 1; RELEASE      <- si falla, ROLLBACK TO sólo esa
+      SAVEPOINT operacion; op 2; RELEASE
+      ...
+    COMMIT                                   <- un solo fsync para todo el lote
+
+Cada operación recibe su propio resultado o excepción. El lote se cierra al
+llegar a DB_COLA_MAX_LOTE operaciones o DB_COLA_MAX_ESPERA_MS después de la
+primera, lo que acota la latencia agregada.
+
+Las operaciones exclusivas (ejecutar(fn, exclusiva=True)) corren en el mismo
+hilo pero solas, entre lotes y sin transacción abierta: fn maneja sus propias
+transacciones. Son para lo que no cabe en un SAVEPOINT del lote, como el
+archivo de cotizaciones (ATTACH y dos COMMIT por lote). Así todas las
+escrituras del proceso, también las masivas, pasan por el único escritor.
+"""
+import contextvars
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+
+from config import Config
+from db_pool import abrir_conexion
+from instrumentacion_sql import ConexionInstrumentada, contar_sentencia
+
+# Límites superiores de los grupos del histograma de tamaño de lote
+CUBETAS_LOTE = (1, 2, 4, 8, 16, 32, 64)
+
+
+class _Operacion:
+    """Escritura encolada: fn(conn) y su resultado"""
+
+    __slots__ = ('fn', 'exclusiva', 'contexto', 'listo', 'resultado', 'error', 'encolada_en')
+
+    def __init__(self, fn, exclusiva=False):
+        self.fn = fn
+        self.exclusiva = exclusiva
+        # fn corre en el hilo escritor con el contexto de quien la encoló
+        # (p. ej. para sumar su SQL a las estadísticas de la petición)
+        self.contexto = contextvars.copy_context()
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.encolada_en = time.perf_counter()
+
+
+class ColaEscritura:
+    """Hilo escritor único por proceso para una base SQLite"""
+
+    def __init__(self, db_path, max_lote=None, max_espera_ms=None):
+        self.db_path = db_path
+        self.max_lote = max_lote or Config.DB_COLA_MAX_LOTE
+        self.max_espera = (Config.DB_COLA_MAX_ESPERA_MS if max_espera_ms is None else max_espera_ms) / 1000
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        """Cola vacía y sin hilo (también tras un fork del proceso)"""
+        self._pid = os.getpid()
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._stats = {
+            'operaciones': 0,
+            'exclusivas': 0,
+            'errores': 0,
+            'commits': 0,
+            'commits_fallidos': 0,
+            'lote_max': 0,
+            'espera_total_ms': 0.0,
+            'espera_max_ms': 0.0,
+            'commit_total_ms': 0.0,
+            'histograma_lotes': {f'<={limite}': 0 for limite in CUBETAS_LOTE},
+        }
+        self._stats['histograma_lotes'][f'>{CUBETAS_LOTE[-1]}'] = 0
+
+    def _asegurar_hilo(self):
+        if os.getpid() != self._pid or self._hilo is None:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reiniciar()
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._bucle, name='cola-escritura-sqlite', daemon=True)
+                    self._hilo.start()
+
+    def ejecutar(self, fn, exclusiva=False):
+        """
+        Encolar fn(conn) y esperar su resultado.
+
+        fn corre dentro de la transacción del lote (no debe hacer commit ni
+        rollback); si lanza una excepción sólo se revierte su parte y la
+        excepción se relanza aquí. Con exclusiva=True corre sola, fuera de
+        cualquier transacción, y es fn quien abre y confirma las suyas.
+        """
+        self._asegurar_hilo()
+        if threading.current_thread() is self._hilo:
+            # Escritura anidada desde el propio hilo escritor: ya está en la transacción
+            return fn(self._conn)
+
+        operacion = _Operacion(fn, exclusiva)
+        self._cola.put(operacion)
+        operacion.listo.wait()
+        if operacion.error is not None:
+            raise operacion.error
+        return operacion.resultado
+
+    # ------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------
+
+    def _bucle(self):
+        # Conexión propia configurada igual que las del pool, sin transacciones implícitas
+        self._conn = abrir_conexion(self.db_path)
+        self._conn.isolation_level = None
+        if not isinstance(self._conn, ConexionInstrumentada):
+            # Sin envoltorios: las sentencias de cada operación cuentan en la petición que la encoló
+            self._conn.set_trace_callback(contar_sentencia)
+        while True:
+            for lote in self._separar_exclusivas(self._siguiente_lote()):
+                try:
+                    if lote[0].exclusiva:
+                        self._ejecutar_exclusiva(lote[0])
+                    else:
+                        self._confirmar(lote)
+                except Exception as e:  # Nunca dejar esperando a quien encoló
+                    print(f'[DB] Error en la cola de escritura ({len(lote)} operaciones): {e}')
+                    traceback.print_exc()
+                    for operacion in lote:
+                        if not operacion.listo.is_set():
+                            operacion.error = operacion.error or e
+                            operacion.listo.set()
+
+    @staticmethod
+    def _separar_exclusivas(lote):
+        """Partir el lote en orden: tramos de operaciones normales y cada exclusiva sola"""
+        tramo = []
+        for operacion in lote:
+            if operacion.exclusiva:
+                if tramo:
+                    yield tramo
+                    tramo = []
+                yield [operacion]
+            else:
+                tramo.append(operacion)
+        if tramo:
+            yield tramo
+
+    def _siguiente_lote(self):
+        """Primera operación (bloqueante) más las que lleguen dentro de la ventana"""
+        lote = [self._cola.get()]
+        limite = time.perf_counter() + self.max_espera
+        while len(lote) < self.max_lote:
+            try:
+                lote.append(self._cola.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _confirmar(self, lote):
+        """Ejecutar el lote en una transacción con un SAVEPOINT por operación"""
+        conn = self._conn
+        inicio = time.perf_counter()
+        errores = 0
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for operacion in lote:
+                conn.execute('SAVEPOINT operacion')
+                try:
+                    operacion.resultado = operacion.contexto.run(operacion.fn, conn)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO operacion')
+                    operacion.error = e
+                    errores += 1
+                conn.execute('RELEASE operacion')
+            conn.execute('COMMIT')
+            confirmado = True
+        except sqlite3.Error as e:
+            # BEGIN o COMMIT fallaron (p. ej. lock de otro proceso): falla todo el lote
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for operacion in lote:
+                operacion.resultado = None
+                operacion.error = operacion.error or e
+            confirmado = False
+
+        fin = time.perf_counter()
+        with self._lock:
+            stats = self._stats
+            stats['operaciones'] += len(lote)
+            stats['errores'] += errores if confirmado else len(lote)
+            stats['commits' if confirmado else 'commits_fallidos'] += 1
+            stats['lote_max'] = max(stats['lote_max'], len(lote))
+            stats['commit_total_ms'] += (fin - inicio) * 1000
+            cubeta = next((f'<={limite}' for limite in CUBETAS_LOTE if len(lote) <= limite),
+                          f'>{CUBETAS_LOTE[-1]}')
+            stats['histograma_lotes'][cubeta] += 1
+            for operacion in lote:
+                espera_ms = (fin - operacion.encolada_en) * 1000
+                stats['espera_total_ms'] += espera_ms
+                stats['espera_max_ms'] = max(stats['espera_max_ms'], espera_ms)
+
+        for operacion in lote:
+            operacion.listo.set()
+
+    def _ejecutar_exclusiva(self, operacion):
+        """Ejecutar una operación exclusiva sin transacción del lote (revierte lo que deje abierto)"""
+        conn = self._conn
+        try:
+            operacion.resultado = operacion.contexto.run(operacion.fn, conn)
+        except Exception as e:
+            operacion.error = e
+        finally:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+
+        fin = time.perf_counter()
+        with self._lock:
+            stats = self._stats
+            stats['operaciones'] += 1
+            stats['exclusivas'] += 1
+            stats['errores'] += operacion.error is not None
+            espera_ms = (fin - operacion.encolada_en) * 1000
+            stats['espera_total_ms'] += espera_ms
+            stats['espera_max_ms'] = max(stats['espera_max_ms'], espera_ms)
+        operacion.listo.set()
+
+    def stats(self):
+        """Métricas de la cola para monitoreo"""
+        with self._lock:
+            datos = dict(self._stats)
+            datos['histograma_lotes'] = dict(self._stats['histograma_lotes'])
+        lotes = datos['commits'] + datos['commits_fallidos']
+        datos.update({
+            'pid': self._pid,
+            'profundidad': self._cola.qsize(),
+            'lote_promedio': round((datos['operaciones'] - datos['exclusivas']) / lotes, 2) if lotes else None,
+            'espera_promedio_ms': round(datos['espera_total_ms'] / datos['operaciones'], 3)
+            if datos['operaciones'] else None,
+            'espera_total_ms': round(datos['espera_total_ms'], 3),
+            'espera_max_ms': round(datos['espera_max_ms'], 3),
+            'commit_total_ms': round(datos['commit_total_ms'], 3),
+        })
+        return datos
+
+
+_colas = {}
+_colas_lock = threading.Lock()
+
+
+def get_cola(db_path):
+    """Cola de escritura compartida por todas las instancias de Database del proceso"""
+    clave = os.path.abspath(db_path)
+    cola = _colas.get(clave)
+    if cola is None:
+        with _colas_lock:
+            cola = _colas.get(clave)
+            if cola is None:
+                cola = ColaEscritura(db_path)
+                _colas[clave] = cola
+    return cola
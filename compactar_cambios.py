@@ -0,0 +1,19 @@
+"""
+Compactar la bitácora de cambios de /api/changes
+
+Uso (por ejemplo diario desde cron):
+    python compactar_cambios.py [días_de_retención]
+"""
+import sys
+
+from config import Config
+from database import Database
+
+dias = int(sys.argv[1]) if len(sys.argv) > 1 else Config.CAMBIOS_RETENCION_DIAS
+
+db = Database()
+resultado = db.compactar_cambios(dias)
+
+print(f"✓ Entradas superadas eliminadas: {resultado['superadas']}")
+print(f"✓ Entradas con más de {dias} días purgadas: {resultado['purgadas']}")
+print(f"  Cursores anteriores a {resultado['purgados_hasta']} deberán resincronizar")
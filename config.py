@@ -13,6 +13,57 @@ class Config:
     
     # Base de datos
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'cotizaciones.db')
+
+    # Pool de conexiones SQLite (por worker)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+    # Pool de solo lectura para las peticiones GET/HEAD (lectores WAL)
+    DB_POOL_LECTURA_SIZE = int(os.getenv('DB_POOL_LECTURA_SIZE', 16))
+    DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', 15))
+    DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', 16384))
+    DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', 128 * 1024 * 1024))
+    
+    # Cola de escritura con commit agrupado (un hilo escritor por worker): tamaño
+    # máximo del lote y milisegundos que espera a más escrituras tras la primera
+    DB_COLA_ESCRITURA = os.getenv('DB_COLA_ESCRITURA', 'False').lower() == 'true'
+    DB_COLA_MAX_LOTE = int(os.getenv('DB_COLA_MAX_LOTE', 64))
+    DB_COLA_MAX_ESPERA_MS = float(os.getenv('DB_COLA_MAX_ESPERA_MS', 2))
+    
+    # Instrumentación de SQL por petición (apagada por omisión: envuelve cada
+    # sentencia en Python), Server-Timing también para usuarios que no son
+    # administradores, umbral del log de sentencias lentas y repeticiones de
+    # una misma sentencia que en modo debug se avisan como posible N+1
+    SQL_INSTRUMENTACION = os.getenv('SQL_INSTRUMENTACION', 'False').lower() == 'true'
+    SQL_SERVER_TIMING = os.getenv('SQL_SERVER_TIMING', 'False').lower() == 'true'
+    SQL_LENTA_MS = float(os.getenv('SQL_LENTA_MS', 200))
+    SQL_N_MAS_1_UMBRAL = int(os.getenv('SQL_N_MAS_1_UMBRAL', 10))
+    
+    # Métricas de Prometheus (/metrics): directorio donde cada worker vuelca
+    # las suyas para sumarlas entre procesos (vacío = sólo el proceso actual),
+    # cada cuántos segundos las vuelca y token Bearer para el scraper (sin
+    # token sólo con sesión de administrador)
+    METRICAS_DIR = os.getenv('METRICAS_DIR', '')
+    METRICAS_INTERVALO_SEGUNDOS = float(os.getenv('METRICAS_INTERVALO_SEGUNDOS', 5))
+    METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+    
+    # Numeración de cotizaciones: 'global' (consecutivo continuo) o 'dia' (reinicia cada día)
+    NUMERO_COTIZACION_ALCANCE = os.getenv('NUMERO_COTIZACION_ALCANCE', 'global')
+    
+    # Bitácora de cambios (/api/changes): días que se conservan antes de compactar
+    CAMBIOS_RETENCION_DIAS = int(os.getenv('CAMBIOS_RETENCION_DIAS', 30))
+    
+    # Idempotency-Key en los POST de creación: vigencia de la respuesta guardada
+    # y segundos que espera un duplicado mientras la petición original termina
+    IDEMPOTENCIA_TTL_HORAS = int(os.getenv('IDEMPOTENCIA_TTL_HORAS', 24))
+    IDEMPOTENCIA_ESPERA_SEGUNDOS = float(os.getenv('IDEMPOTENCIA_ESPERA_SEGUNDOS', 10))
+    
+    # Archivo de cotizaciones (archivar_cotizaciones.py): ruta de la base de archivo
+    # (vacío = archive.db junto a la principal), antigüedad para archivar cualquier
+    # cotización y antigüedad para las que ya están en un estado de aprobación final
+    ARCHIVO_DATABASE_PATH = os.getenv('ARCHIVO_DATABASE_PATH', '')
+    ARCHIVO_DIAS = int(os.getenv('ARCHIVO_DIAS', 730))
+    ARCHIVO_DIAS_ESTADO_FINAL = int(os.getenv('ARCHIVO_DIAS_ESTADO_FINAL', 180))
+    ARCHIVO_ESTADOS_FINALES = os.getenv('ARCHIVO_ESTADOS_FINALES', 'aprobado,rechazado')
     
     # SMTP - Configuración de correo
     SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
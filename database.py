@@ -1,216 +1,177 @@
+import os
 import sqlite3
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import pytz
 from config import Config
+from db_pool import abrir_conexion, get_pool, en_carril_lectura
+from cache_tablas import get_cache
+from cola_escritura import get_cola
+from filas import consultar_filas, cursor_tuplas, filas_dict
+import migrations
+import base64
 import hashlib
+import json
+import re
 import secrets
 
 class Database:
     """Manejo de la base de datos SQLite"""
     
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, archivo_path=None, cola_escritura=None):
         self.db_path = db_path or Config.DATABASE_PATH
+        usar_cola = Config.DB_COLA_ESCRITURA if cola_escritura is None else cola_escritura
+        self._cola = get_cola(self.db_path) if usar_cola else None
+        # Base de archivo de cotizaciones: por omisión archive.db junto a la principal
+        self.archivo_path = archivo_path or Config.ARCHIVO_DATABASE_PATH or os.path.join(
+            os.path.dirname(os.path.abspath(self.db_path)), 'archive.db'
+        )
+        self._pool = get_pool(self.db_path)
+        self._pool_lectura = get_pool(self.db_path, solo_lectura=True)
+        self._cache_catalogo = get_cache(self.db_path, 'productos')
         self.init_db()
     
     def get_connection(self):
-        """Obtener conexión a la base de datos"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """
+        Obtener una conexión del pool (close() la devuelve al pool).
+        
+        Dentro del carril de lectura (peticiones GET/HEAD) es una conexión de
+        solo lectura; las escrituras van por _ejecutar_escritura() (o
+        _ejecutar_escritura_exclusiva()), que usan el pool de escritura o la cola.
+        """
+        if en_carril_lectura():
+            return self._pool_lectura.acquire()
+        return self._pool.acquire()
     
-    def init_db(self):
-        """Inicializar la base de datos con las tablas necesarias"""
+    def _conexion_escritura(self):
+        """Conexión del pool de lectura/escritura sin importar el carril activo"""
+        return self._pool.acquire()
+    
+    def cache_stats(self):
+        """Estadísticas de la caché del catálogo de productos de este worker"""
+        return self._cache_catalogo.stats()
+    
+    def versiones_tablas(self, *tablas):
+        """Contadores de cambios (versiones_tabla) de las tablas indicadas, en el mismo orden"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # Tabla de clientes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS clientes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                email TEXT NOT NULL,
-                telefono TEXT,
-                direccion TEXT,
-                rfc TEXT,
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabla de cotizaciones
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cotizaciones (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero_cotizacion TEXT UNIQUE NOT NULL,
-                cliente_id INTEGER NOT NULL,
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                fecha_validez DATE,
-                subtotal REAL NOT NULL,
-                iva REAL DEFAULT 0,
-                total REAL NOT NULL,
-                notas TEXT,
-                condiciones_comerciales TEXT,
-                estado TEXT DEFAULT 'pendiente',
-                FOREIGN KEY (cliente_id) REFERENCES clientes (id)
-            )
-        ''')
-        
-        # Agregar columna condiciones_comerciales si no existe (para bases de datos existentes)
-        try:
-            cursor.execute('ALTER TABLE cotizaciones ADD COLUMN condiciones_comerciales TEXT')
-            conn.commit()
-        except sqlite3.OperationalError:
-            pass  # La columna ya existe
-        
-        # Agregar columnas de aprobación si no existen
-        columnas_aprobacion = [
-            ('token_aprobacion', 'TEXT UNIQUE'),
-            ('estado_aprobacion', "TEXT DEFAULT 'pendiente'"),
-            ('fecha_aprobacion', 'TIMESTAMP'),
-            ('comentarios_cliente', 'TEXT'),
-            ('creado_por', 'INTEGER')  # ID del usuario que creó la cotización
-        ]
-        
-        for columna, tipo in columnas_aprobacion:
-            try:
-                cursor.execute(f'ALTER TABLE cotizaciones ADD COLUMN {columna} {tipo}')
-                conn.commit()
-            except sqlite3.OperationalError:
-                pass  # La columna ya existe
-        
-        # Tabla de items de cotización
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cotizacion_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cotizacion_id INTEGER NOT NULL,
-                producto_id INTEGER,
-                concepto TEXT NOT NULL,
-                descripcion TEXT,
-                cantidad INTEGER NOT NULL,
-                precio_unitario REAL NOT NULL,
-                subtotal REAL NOT NULL,
-                FOREIGN KEY (cotizacion_id) REFERENCES cotizaciones (id) ON DELETE CASCADE,
-                FOREIGN KEY (producto_id) REFERENCES productos (id) ON DELETE SET NULL
-            )
-        ''')
+        cursor.execute(
+            f"SELECT tabla, version FROM versiones_tabla WHERE tabla IN ({', '.join('?' * len(tablas))})",
+            tablas
+        )
+        versiones = {row['tabla']: row['version'] for row in cursor.fetchall()}
         
-        # Agregar columna producto_id si no existe
+        conn.close()
+        return tuple(versiones.get(tabla, 0) for tabla in tablas)
+    
+    def pool_stats(self):
+        """Estadísticas del pool de conexiones de este worker (el de solo lectura en `lectura`)"""
+        return dict(self._pool.stats(), lectura=self._pool_lectura.stats())
+    
+    def cola_stats(self):
+        """Estadísticas de la cola de escritura de este worker (None si está desactivada)"""
+        return self._cola.stats() if self._cola else None
+    
+    def _ejecutar_escritura(self, fn):
+        """
+        Ejecutar fn(conn) como una transacción de escritura y devolver su resultado.
+        
+        Con la cola de escritura activa (Config.DB_COLA_ESCRITURA) la ejecuta el
+        hilo escritor del proceso agrupada con otras en un solo COMMIT; si no, en
+        una conexión del pool con BEGIN IMMEDIATE (el lock se toma al inicio y no
+        al primer UPDATE, lo que evita los "database is locked" por promoción).
+        fn no debe hacer commit ni rollback.
+        """
+        if self._cola:
+            return self._cola.ejecutar(fn)
+        
+        conn = self._conexion_escritura()
         try:
-            cursor.execute('ALTER TABLE cotizacion_items ADD COLUMN producto_id INTEGER')
+            conn.execute('BEGIN IMMEDIATE')
+            resultado = fn(conn)
             conn.commit()
-        except sqlite3.OperationalError:
-            pass
-
-        # Tabla de adjuntos de cotización
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cotizacion_adjuntos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cotizacion_id INTEGER NOT NULL,
-                nombre_original TEXT NOT NULL,
-                nombre_archivo TEXT NOT NULL,
-                ruta_archivo TEXT NOT NULL,
-                mime_tipo TEXT,
-                tamano_bytes INTEGER,
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cotizacion_id) REFERENCES cotizaciones (id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # Tabla de usuarios
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                nombre_completo TEXT NOT NULL,
-                email TEXT NOT NULL,
-                rol TEXT DEFAULT 'usuario',
-                activo INTEGER DEFAULT 1,
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ultimo_acceso TIMESTAMP
-            )
-        ''')
-        
-        # Tabla de productos y servicios
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS productos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                codigo TEXT UNIQUE NOT NULL,
-                nombre TEXT NOT NULL,
-                descripcion TEXT,
-                tipo TEXT NOT NULL DEFAULT 'producto',
-                precio REAL NOT NULL,
-                unidad TEXT DEFAULT 'pza',
-                categoria TEXT,
-                imagen_url TEXT,
-                activo INTEGER DEFAULT 1,
-                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Agregar columna imagen_url si no existe
+        finally:
+            # Si fn falló, devolver la conexión revierte la transacción
+            conn.close()
+        return resultado
+    
+    def _ejecutar_escritura_exclusiva(self, fn):
+        """
+        Ejecutar fn(conn) en una conexión de escritura sin transacción abierta:
+        fn abre y confirma las suyas (p. ej. tras un ATTACH, que no se permite
+        dentro de una transacción). Con la cola de escritura activa la ejecuta
+        el hilo escritor, sola y entre lotes.
+        """
+        if self._cola:
+            return self._cola.ejecutar(fn, exclusiva=True)
+        
+        conn = self._conexion_escritura()
         try:
-            cursor.execute('ALTER TABLE productos ADD COLUMN imagen_url TEXT')
-            conn.commit()
-        except sqlite3.OperationalError:
-            pass
-        
-        conn.commit()
-        
-        # Crear usuario admin por defecto si no existe
-        cursor.execute('SELECT COUNT(*) FROM usuarios WHERE username = ?', ('admin',))
-        if cursor.fetchone()[0] == 0:
-            admin_password = self._hash_password('admin123')
-            cursor.execute('''
-                INSERT INTO usuarios (username, password_hash, nombre_completo, email, rol)
-                VALUES (?, ?, ?, ?, ?)
-            ''', ('admin', admin_password, 'Administrador', 'admin@integrational3.com.mx', 'admin'))
-            conn.commit()
-        
+            return fn(conn)
+        finally:
+            # Si fn dejó una transacción abierta, devolver la conexión la revierte
+            conn.close()
+    
+    def init_db(self):
+        """Aplicar migraciones pendientes (sin escrituras si el esquema está al día)"""
+        conn = self._conexion_escritura()
+        version = migrations.version_actual(conn)
         conn.close()
+        
+        if version < migrations.ULTIMA_VERSION:
+            migrations.migrate(self.db_path)
     
     def crear_cliente(self, nombre, email, telefono='', direccion='', rfc=''):
         """Crear un nuevo cliente"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO clientes (nombre, email, telefono, direccion, rfc)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (nombre, email, telefono, direccion, rfc))
-        
-        conn.commit()
-        cliente_id = cursor.lastrowid
-        conn.close()
+        def _escribir(conn):
+            cursor = conn.execute('''
+                INSERT INTO clientes (nombre, email, telefono, direccion, rfc)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (nombre, email, telefono, direccion, rfc))
+            return cursor.lastrowid
         
-        return cliente_id
+        return self._ejecutar_escritura(_escribir)
     
     def actualizar_cliente(self, cliente_id, nombre, email, telefono='', direccion='', rfc=''):
         """Actualizar un cliente existente"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE clientes 
-            SET nombre = ?, email = ?, telefono = ?, direccion = ?, rfc = ?
-            WHERE id = ?
-        ''', (nombre, email, telefono, direccion, rfc, cliente_id))
-        
-        conn.commit()
-        affected = cursor.rowcount
-        conn.close()
+        def _escribir(conn):
+            cursor = conn.execute('''
+                UPDATE clientes 
+                SET nombre = ?, email = ?, telefono = ?, direccion = ?, rfc = ?
+                WHERE id = ?
+            ''', (nombre, email, telefono, direccion, rfc, cliente_id))
+            return cursor.rowcount > 0
+        
+        return self._ejecutar_escritura(_escribir)
+    
+    def _iterar_filas(self, sql, params=(), tamano_lote=500):
+        """
+        Generador de filas (FilaDict, de solo lectura) leídas por lotes con fetchmany.
         
-        return affected > 0
+        La conexión se devuelve al pool al agotar el generador o al cerrarlo
+        (por ejemplo cuando el cliente corta una respuesta en streaming).
+        """
+        conn = self.get_connection()
+        try:
+            cursor = cursor_tuplas(conn)
+            cursor.execute(sql, params)
+            while True:
+                tuplas = cursor.fetchmany(tamano_lote)
+                if not tuplas:
+                    break
+                yield from filas_dict(cursor, tuplas)
+        finally:
+            conn.close()
+    
+    def iterar_clientes(self):
+        """Todos los clientes por nombre, fila por fila (para exportar en streaming)"""
+        return self._iterar_filas('SELECT * FROM clientes ORDER BY nombre')
     
     def obtener_clientes(self):
         """Obtener todos los clientes"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM clientes ORDER BY nombre')
-        clientes = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        return clientes
+        return list(self.iterar_clientes())
     
     def obtener_cliente(self, cliente_id):
         """Obtener un cliente por ID"""
@@ -224,36 +185,57 @@ class Database:
         return dict(cliente) if cliente else None
 
     def eliminar_cliente(self, cliente_id):
-        """Eliminar un cliente si no tiene cotizaciones asociadas"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT COUNT(*) as total FROM cotizaciones WHERE cliente_id = ?', (cliente_id,))
-        total_cotizaciones = cursor.fetchone()['total']
-
-        if total_cotizaciones > 0:
-            conn.close()
-            raise ValueError('No se puede eliminar el cliente porque tiene cotizaciones asociadas')
-
-        cursor.execute('DELETE FROM clientes WHERE id = ?', (cliente_id,))
-        deleted = cursor.rowcount > 0
-
-        conn.commit()
-        conn.close()
-
-        return deleted
-    
-    def crear_cotizacion(self, cliente_id, items, fecha_validez=None, notas='', condiciones_comerciales='', iva_porcentaje=16, creado_por=None):
-        """Crear una nueva cotización con sus items"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """Eliminar un cliente si no tiene cotizaciones asociadas (vigentes o archivadas)"""
+        def _escribir(conn):
+            cursor = conn.execute('SELECT COUNT(*) as total FROM cotizaciones WHERE cliente_id = ?', (cliente_id,))
+            if cursor.fetchone()['total'] > 0 or self._cliente_en_archivo(cliente_id):
+                raise ValueError('No se puede eliminar el cliente porque tiene cotizaciones asociadas')
+            
+            cursor.execute('DELETE FROM clientes WHERE id = ?', (cliente_id,))
+            return cursor.rowcount > 0
         
+        return self._ejecutar_escritura(_escribir)
+    
+    def _siguiente_numero_cotizacion(self, cursor, fecha_actual):
+        """
+        Avanzar la secuencia de cotizaciones y construir el número.
+        
+        Debe llamarse dentro de la transacción (BEGIN IMMEDIATE) que inserta
+        la cotización: si la inserción falla, el consecutivo también se revierte.
+        """
+        fecha = fecha_actual.strftime('%Y%m%d')
+        if Config.NUMERO_COTIZACION_ALCANCE == 'dia':
+            secuencia = f'cotizaciones:{fecha}'
+        else:
+            secuencia = 'cotizaciones'
+        
+        cursor.execute(
+            'UPDATE secuencias SET valor = valor + 1 WHERE nombre = ? RETURNING valor',
+            (secuencia,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            # Primera cotización del alcance: continuar tras los números ya emitidos
+            if secuencia == 'cotizaciones':
+                rango = ('INT-', 'INT.')
+            else:
+                rango = (f'INT-{fecha}-', f'INT-{fecha}.')
+            cursor.execute('''
+                INSERT INTO secuencias (nombre, valor)
+                SELECT ?, COALESCE(MAX(CAST(substr(numero_cotizacion, 14) AS INTEGER)), 0) + 1
+                FROM cotizaciones
+                WHERE numero_cotizacion >= ? AND numero_cotizacion < ?
+                RETURNING valor
+            ''', (secuencia, *rango))
+            row = cursor.fetchone()
+        
+        return f"INT-{fecha}-{row[0]:04d}"
+    
+    def _insertar_encabezado_cotizacion(self, cursor, fecha_actual, cliente_id, items, fecha_validez=None, notas='',
+                                        condiciones_comerciales='', iva_porcentaje=16, creado_por=None):
+        """Tomar el consecutivo e insertar el encabezado (dentro de una transacción abierta)"""
         # Generar número de cotización con formato INT-
-        tz_mexico = pytz.timezone('America/Mexico_City')
-        fecha_actual = datetime.now(tz_mexico)
-        cursor.execute('SELECT COUNT(*) as total FROM cotizaciones')
-        total = cursor.fetchone()['total']
-        numero_cotizacion = f"INT-{fecha_actual.strftime('%Y%m%d')}-{total + 1:04d}"
+        numero_cotizacion = self._siguiente_numero_cotizacion(cursor, fecha_actual)
         
         # Generar token único de aprobación
         token_aprobacion = secrets.token_urlsafe(32)
@@ -270,115 +252,467 @@ class Database:
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (numero_cotizacion, cliente_id, fecha_validez, subtotal, iva, total, notas, condiciones_comerciales, token_aprobacion, 'pendiente', creado_por))
         
-        cotizacion_id = cursor.lastrowid
-        
-        # Insertar items
-        for item in items:
-            item_subtotal = item['cantidad'] * item['precio_unitario']
-            cursor.execute('''
-                INSERT INTO cotizacion_items 
-                (cotizacion_id, producto_id, concepto, descripcion, cantidad, precio_unitario, subtotal)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (cotizacion_id, item.get('producto_id'), item['concepto'], item.get('descripcion', ''), 
-                  item['cantidad'], item['precio_unitario'], item_subtotal))
-        
-        conn.commit()
-        conn.close()
+        return cursor.lastrowid, numero_cotizacion
+    
+    def crear_cotizacion(self, cliente_id, items, fecha_validez=None, notas='', condiciones_comerciales='', iva_porcentaje=16, creado_por=None):
+        """Crear una nueva cotización con sus items"""
+        def _escribir(conn):
+            cursor = conn.cursor()
+            fecha_actual = datetime.now(pytz.timezone('America/Mexico_City'))
+            cotizacion_id, numero_cotizacion = self._insertar_encabezado_cotizacion(
+                cursor, fecha_actual, cliente_id, items, fecha_validez, notas,
+                condiciones_comerciales, iva_porcentaje, creado_por
+            )
+            
+            # Insertar items en lote
+            self._insertar_items(cursor, cotizacion_id, items)
+            return cotizacion_id, numero_cotizacion
         
-        return cotizacion_id, numero_cotizacion
+        # La transacción de escritura (BEGIN IMMEDIATE) se toma antes del consecutivo
+        return self._ejecutar_escritura(_escribir)
+    
+    @staticmethod
+    def _validar_cotizacion_lote(datos):
+        """Normalizar una cotización del lote; ValueError con el motivo si es inválida"""
+        if not isinstance(datos, dict):
+            raise ValueError('cada cotización debe ser un objeto')
+        try:
+            cliente_id = int(datos['cliente_id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('cliente_id inválido')
+        
+        items = datos.get('items', [])
+        if not isinstance(items, list):
+            raise ValueError('items debe ser una lista')
+        for numero, item in enumerate(items, start=1):
+            if not isinstance(item, dict) or not str(item.get('concepto') or '').strip():
+                raise ValueError(f'item {numero}: concepto requerido')
+            for campo in ('cantidad', 'precio_unitario'):
+                valor = item.get(campo)
+                if isinstance(valor, bool) or not isinstance(valor, (int, float)) or valor < 0:
+                    raise ValueError(f'item {numero}: {campo} debe ser un número no negativo')
+            producto_id = item.get('producto_id')
+            if producto_id not in (None, ''):
+                try:
+                    int(producto_id)
+                except (TypeError, ValueError):
+                    raise ValueError(f'item {numero}: producto_id inválido')
+        
+        iva_porcentaje = datos.get('iva_porcentaje', 16)
+        if isinstance(iva_porcentaje, bool) or not isinstance(iva_porcentaje, (int, float)) or not 0 <= iva_porcentaje <= 100:
+            raise ValueError('iva_porcentaje debe estar entre 0 y 100')
+        
+        return {
+            'cliente_id': cliente_id,
+            'items': items,
+            'fecha_validez': datos.get('fecha_validez'),
+            'notas': datos.get('notas', ''),
+            'condiciones_comerciales': datos.get('condiciones_comerciales', ''),
+            'iva_porcentaje': iva_porcentaje,
+        }
+    
+    def crear_cotizaciones_lote(self, cotizaciones, modo='atomico', creado_por=None):
+        """
+        Crear muchas cotizaciones en una sola transacción.
+        
+        Todas se validan antes de escribir; la existencia de los clientes se
+        revisa dentro de la misma transacción de escritura (BEGIN IMMEDIATE),
+        así un cliente borrado entre tanto se reporta como error de la fila.
+        Los errores de SQLite al insertar (p. ej. un producto_id inexistente)
+        también se reportan por cotización en ambos modos.
+        
+        Args:
+            modo: 'atomico' (si alguna es inválida o falla no se guarda ninguna)
+                o 'parcial' (se guardan las válidas; cada una en su SAVEPOINT)
+        
+        Returns:
+            {'creadas': [{'indice', 'id', 'numero_cotizacion'}], 'errores': [{'indice', 'error'}]}
+        """
+        if modo not in ('atomico', 'parcial'):
+            raise ValueError(f'Modo inválido: {modo}')
+        
+        validas = []
+        errores = []
+        for indice, datos in enumerate(cotizaciones):
+            try:
+                validas.append((indice, self._validar_cotizacion_lote(datos)))
+            except ValueError as e:
+                errores.append({'indice': indice, 'error': str(e)})
+        
+        def _escribir(conn):
+            cursor = conn.cursor()
+            clientes = sorted({datos['cliente_id'] for _, datos in validas})
+            existentes = set()
+            for i in range(0, len(clientes), 500):
+                grupo = clientes[i:i + 500]
+                cursor.execute(f"SELECT id FROM clientes WHERE id IN ({', '.join('?' * len(grupo))})", grupo)
+                existentes.update(row['id'] for row in cursor.fetchall())
+            pendientes = []
+            for indice, datos in validas:
+                if datos['cliente_id'] in existentes:
+                    pendientes.append((indice, datos))
+                else:
+                    errores.append({'indice': indice, 'error': f"cliente {datos['cliente_id']} no existe"})
+            if modo == 'atomico' and errores:
+                return []
+            
+            fecha_actual = datetime.now(pytz.timezone('America/Mexico_City'))
+            creadas = []
+            
+            if modo == 'atomico':
+                cursor.execute('SAVEPOINT cotizaciones_lote')
+                items = []
+                for indice, datos in pendientes:
+                    try:
+                        cotizacion_id, numero = self._insertar_encabezado_cotizacion(
+                            cursor, fecha_actual, creado_por=creado_por, **datos
+                        )
+                    except sqlite3.Error as e:
+                        errores.append({'indice': indice, 'error': str(e)})
+                        continue
+                    creadas.append({'indice': indice, 'id': cotizacion_id, 'numero_cotizacion': numero})
+                    items += [(cotizacion_id, *self._valores_item(item)) for item in datos['items']]
+                
+                if not errores:
+                    try:
+                        # Todos los items del lote en un solo executemany
+                        cursor.executemany(self._SQL_INSERTAR_ITEM, items)
+                    except sqlite3.Error as e:
+                        # executemany se detiene en la fila que falló: las anteriores
+                        # (de cotizaciones nuevas, con id creciente) ya se insertaron
+                        cursor.execute('SELECT COUNT(*) FROM cotizacion_items WHERE cotizacion_id >= ?',
+                                       (creadas[0]['id'],))
+                        fallida = items[cursor.fetchone()[0]][0]
+                        indice = next(c['indice'] for c in creadas if c['id'] == fallida)
+                        errores.append({'indice': indice, 'error': str(e)})
+                
+                if errores:
+                    cursor.execute('ROLLBACK TO cotizaciones_lote')
+                    cursor.execute('RELEASE cotizaciones_lote')
+                    return []
+                cursor.execute('RELEASE cotizaciones_lote')
+            else:
+                for indice, datos in pendientes:
+                    cursor.execute('SAVEPOINT cotizacion_lote')
+                    try:
+                        cotizacion_id, numero = self._insertar_encabezado_cotizacion(
+                            cursor, fecha_actual, creado_por=creado_por, **datos
+                        )
+                        self._insertar_items(cursor, cotizacion_id, datos['items'])
+                    except sqlite3.Error as e:
+                        cursor.execute('ROLLBACK TO cotizacion_lote')
+                        cursor.execute('RELEASE cotizacion_lote')
+                        errores.append({'indice': indice, 'error': str(e)})
+                        continue
+                    cursor.execute('RELEASE cotizacion_lote')
+                    creadas.append({'indice': indice, 'id': cotizacion_id, 'numero_cotizacion': numero})
+            return creadas
+        
+        creadas = self._ejecutar_escritura(_escribir)
+        return {'creadas': creadas, 'errores': sorted(errores, key=lambda e: e['indice'])}
+    
+    _SQL_COTIZACIONES_CON_CLIENTE = '''
+        SELECT c.*, cl.nombre as cliente_nombre, cl.email as cliente_email,
+               u.nombre_completo as creado_por_nombre, u.username as creado_por_username
+        FROM cotizaciones c
+        JOIN clientes cl ON c.cliente_id = cl.id
+        LEFT JOIN usuarios u ON c.creado_por = u.id
+    '''
+    
+    def iterar_cotizaciones(self):
+        """Todas las cotizaciones (más recientes primero), fila por fila"""
+        return self._iterar_filas(self._SQL_COTIZACIONES_CON_CLIENTE + ' ORDER BY c.fecha_creacion DESC')
     
     def obtener_cotizaciones(self):
         """Obtener todas las cotizaciones con información del cliente"""
+        return list(self.iterar_cotizaciones())
+    
+    @staticmethod
+    def _codificar_cursor(fecha_creacion, cotizacion_id):
+        """Cursor opaco para la paginación keyset (fecha_creacion, id)"""
+        crudo = json.dumps([fecha_creacion, cotizacion_id], separators=(',', ':'))
+        return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def _decodificar_cursor(cursor):
+        """Inverso de _codificar_cursor; ValueError si el cursor no es válido"""
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            fecha_creacion, cotizacion_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+            return str(fecha_creacion), int(cotizacion_id)
+        except Exception:
+            raise ValueError('Cursor de paginación inválido')
+    
+    def listar_cotizaciones(self, limite=50, cursor=None, estado=None, estado_aprobacion=None,
+                            cliente_id=None, creado_por=None, fecha_desde=None, fecha_hasta=None,
+                            total_min=None, total_max=None, con_total=False, archivo=False):
+        """
+        Página de cotizaciones (más recientes primero) con filtros opcionales.
+        
+        La paginación es por cursor sobre (fecha_creacion, id): el costo de cada
+        página no depende de cuántas cotizaciones haya antes. Con `archivo` se
+        listan las cotizaciones archivadas (base de archivo) en lugar de las vigentes.
+        
+        Returns:
+            dict: {'cotizaciones': [...], 'siguiente_cursor': str | None,
+                   'total': int (sólo si con_total)}
+        """
+        condiciones = []
+        params = []
+        
+        filtros_igualdad = (
+            ('c.estado', estado),
+            ('c.estado_aprobacion', estado_aprobacion),
+            ('c.cliente_id', cliente_id),
+            ('c.creado_por', creado_por),
+        )
+        for columna, valor in filtros_igualdad:
+            if valor is not None:
+                condiciones.append(f'{columna} = ?')
+                params.append(valor)
+        
+        if fecha_desde:
+            condiciones.append('c.fecha_creacion >= ?')
+            params.append(fecha_desde)
+        if fecha_hasta:
+            # Fecha límite inclusiva (todo el día)
+            condiciones.append("c.fecha_creacion < date(?, '+1 day')")
+            params.append(fecha_hasta)
+        if total_min is not None:
+            condiciones.append('c.total >= ?')
+            params.append(total_min)
+        if total_max is not None:
+            condiciones.append('c.total <= ?')
+            params.append(total_max)
+        
+        filtro_sql = ' AND '.join(condiciones)
+        filtro_params = list(params)
+        
+        if cursor:
+            condiciones.append('(c.fecha_creacion, c.id) < (?, ?)')
+            params.extend(self._decodificar_cursor(cursor))
+        
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+        esquema = 'archivo' if archivo else 'main'
+        
+        if archivo and not self.archivo_disponible():
+            return {'cotizaciones': [], 'siguiente_cursor': None, **({'total': 0} if con_total else {})}
+        
+        if archivo:
+            with self._conexion_archivo() as conn:
+                return self._pagina_cotizaciones(conn, esquema, where, params, filtro_sql, filtro_params, limite, con_total)
+        
         conn = self.get_connection()
-        cursor = conn.cursor()
+        try:
+            return self._pagina_cotizaciones(conn, esquema, where, params, filtro_sql, filtro_params, limite, con_total)
+        finally:
+            conn.close()
+    
+    def _pagina_cotizaciones(self, conn, esquema, where, params, filtro_sql, filtro_params, limite, con_total):
+        """Consulta de listar_cotizaciones sobre el esquema indicado"""
+        cursor_db = cursor_tuplas(conn)
         
-        cursor.execute('''
+        cursor_db.execute(f'''
             SELECT c.*, cl.nombre as cliente_nombre, cl.email as cliente_email,
                    u.nombre_completo as creado_por_nombre, u.username as creado_por_username
-            FROM cotizaciones c
+            FROM {esquema}.cotizaciones c
             JOIN clientes cl ON c.cliente_id = cl.id
             LEFT JOIN usuarios u ON c.creado_por = u.id
-            ORDER BY c.fecha_creacion DESC
-        ''')
-        
-        cotizaciones = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+            {where}
+            ORDER BY c.fecha_creacion DESC, c.id DESC
+            LIMIT ?
+        ''', (*params, limite + 1))
+        
+        cotizaciones = filas_dict(cursor_db, cursor_db.fetchall())
+        
+        resultado = {'cotizaciones': cotizaciones[:limite], 'siguiente_cursor': None}
+        if len(cotizaciones) > limite:
+            ultima = cotizaciones[limite - 1]
+            resultado['siguiente_cursor'] = self._codificar_cursor(ultima['fecha_creacion'], ultima['id'])
+        
+        if con_total:
+            cursor_db.execute(
+                f"SELECT COUNT(*) FROM {esquema}.cotizaciones c {'WHERE ' + filtro_sql if filtro_sql else ''}",
+                filtro_params
+            )
+            resultado['total'] = cursor_db.fetchone()[0]
         
-        return cotizaciones
+        return resultado
     
-    def obtener_cotizacion(self, cotizacion_id):
-        """Obtener una cotización completa con items y cliente"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Obtener cotización
-        cursor.execute('''
-            SELECT c.*, cl.*,
-                   u.nombre_completo as creado_por_nombre, u.username as creado_por_username
-            FROM cotizaciones c
-            JOIN clientes cl ON c.cliente_id = cl.id
+    # Detalle de cotización en una sola sentencia: encabezado + usuario y, según
+    # la proyección pedida, cliente, items y adjuntos (agregados como JSON).
+    # Todas las columnas llevan alias explícito para que las del cliente no
+    # pisen id/fecha_creacion de la cotización. {esquema} es 'main' o 'archivo'.
+    PROYECCIONES_COTIZACION = ('cliente', 'items', 'adjuntos')
+    
+    _SQL_DETALLE_ENCABEZADO = '''
+        c.id, c.numero_cotizacion, c.cliente_id, c.fecha_creacion, c.fecha_validez,
+        c.subtotal, c.iva, c.total, c.notas, c.condiciones_comerciales, c.estado,
+        c.token_aprobacion, c.estado_aprobacion, c.fecha_aprobacion,
+        c.comentarios_cliente, c.creado_por, c.emails_destino,
+        u.nombre_completo AS creado_por_nombre, u.username AS creado_por_username
+    '''
+    
+    _SQL_DETALLE_CLIENTE = '''
+        cl.nombre AS cliente_nombre, cl.email AS cliente_email,
+        cl.telefono AS cliente_telefono, cl.direccion AS cliente_direccion,
+        cl.rfc AS cliente_rfc, cl.fecha_creacion AS cliente_fecha_creacion
+    '''
+    
+    _SQL_DETALLE_ITEMS = '''
+        (
+            SELECT json_group_array(json_object(
+                'id', i.id, 'cotizacion_id', i.cotizacion_id, 'producto_id', i.producto_id,
+                'concepto', i.concepto, 'descripcion', i.descripcion, 'cantidad', i.cantidad,
+                'precio_unitario', i.precio_unitario, 'subtotal', i.subtotal,
+                'producto_codigo', i.producto_codigo, 'producto_imagen', i.producto_imagen
+            ))
+            FROM (
+                SELECT ci.*, p.codigo AS producto_codigo, p.imagen_url AS producto_imagen
+                FROM {esquema}.cotizacion_items ci
+                LEFT JOIN productos p ON ci.producto_id = p.id
+                WHERE ci.cotizacion_id = c.id
+                ORDER BY ci.id
+            ) i
+        ) AS items_json
+    '''
+    
+    _SQL_DETALLE_ADJUNTOS = '''
+        (
+            SELECT json_group_array(json_object(
+                'id', a.id, 'cotizacion_id', a.cotizacion_id,
+                'nombre_original', a.nombre_original, 'nombre_archivo', a.nombre_archivo,
+                'ruta_archivo', a.ruta_archivo, 'mime_tipo', a.mime_tipo,
+                'tamano_bytes', a.tamano_bytes, 'fecha_creacion', a.fecha_creacion
+            ))
+            FROM (
+                SELECT * FROM {esquema}.cotizacion_adjuntos
+                WHERE cotizacion_id = c.id
+                ORDER BY fecha_creacion ASC
+            ) a
+        ) AS adjuntos_json
+    '''
+    
+    def _normalizar_include(self, include):
+        """Proyección pedida como tupla ordenada; None = todo. ValueError si hay partes desconocidas"""
+        if include is None:
+            return self.PROYECCIONES_COTIZACION
+        if isinstance(include, str):
+            include = [parte.strip() for parte in include.split(',') if parte.strip()]
+        desconocidas = set(include) - set(self.PROYECCIONES_COTIZACION)
+        if desconocidas:
+            raise ValueError(f"Proyección desconocida: {', '.join(sorted(desconocidas))}")
+        return tuple(parte for parte in self.PROYECCIONES_COTIZACION if parte in include)
+    
+    def _obtener_detalle_cotizacion(self, condicion, valor, include=None, archivo=False):
+        """Ejecutar la consulta de detalle con la proyección pedida y armar el diccionario"""
+        include = self._normalizar_include(include)
+        esquema = 'archivo' if archivo else 'main'
+        
+        columnas = [self._SQL_DETALLE_ENCABEZADO]
+        joins = ''
+        if 'cliente' in include:
+            columnas.append(self._SQL_DETALLE_CLIENTE)
+            joins = 'JOIN clientes cl ON c.cliente_id = cl.id'
+        if 'items' in include:
+            columnas.append(self._SQL_DETALLE_ITEMS.format(esquema=esquema))
+        if 'adjuntos' in include:
+            columnas.append(self._SQL_DETALLE_ADJUNTOS.format(esquema=esquema))
+        
+        sql = f'''
+            SELECT {', '.join(columnas)}
+            FROM {esquema}.cotizaciones c
+            {joins}
             LEFT JOIN usuarios u ON c.creado_por = u.id
-            WHERE c.id = ?
-        ''', (cotizacion_id,))
-        
-        cotizacion = cursor.fetchone()
-        if not cotizacion:
+            WHERE {condicion}
+        '''
+        if archivo:
+            if not self.archivo_disponible():
+                return None
+            with self._conexion_archivo() as conn:
+                row = conn.execute(sql, (valor,)).fetchone()
+        else:
+            conn = self.get_connection()
+            row = conn.execute(sql, (valor,)).fetchone()
             conn.close()
+        
+        if not row:
             return None
         
-        cotizacion_dict = dict(cotizacion)
+        cotizacion = dict(row)
+        if 'items' in include:
+            cotizacion['items'] = json.loads(cotizacion.pop('items_json'))
+        if 'adjuntos' in include:
+            cotizacion['adjuntos'] = json.loads(cotizacion.pop('adjuntos_json'))
+        
+        if 'cliente' in include:
+            cliente = {
+                'id': cotizacion['cliente_id'],
+                'nombre': cotizacion['cliente_nombre'],
+                'email': cotizacion['cliente_email'],
+                'telefono': cotizacion.pop('cliente_telefono'),
+                'direccion': cotizacion.pop('cliente_direccion'),
+                'rfc': cotizacion.pop('cliente_rfc'),
+                'fecha_creacion': cotizacion.pop('cliente_fecha_creacion'),
+            }
+            cotizacion['cliente'] = cliente
+            
+            # Campos planos del cliente que usan el PDF, los emails y el front end
+            for campo in ('nombre', 'email', 'telefono', 'direccion', 'rfc'):
+                cotizacion[campo] = cliente[campo]
         
-        # Obtener items con información del producto (JOIN)
-        cursor.execute('''
-            SELECT ci.*, p.codigo as producto_codigo, p.imagen_url as producto_imagen
-            FROM cotizacion_items ci
-            LEFT JOIN productos p ON ci.producto_id = p.id
-            WHERE ci.cotizacion_id = ?
-            ORDER BY ci.id
-        ''', (cotizacion_id,))
+        return cotizacion
+    
+    def obtener_cotizacion(self, cotizacion_id, include=None, archivo=False):
+        """
+        Obtener una cotización en una sola consulta.
+        
+        Args:
+            include: partes a cargar además del encabezado ('cliente', 'items',
+                'adjuntos'), como iterable o texto separado por comas.
+                None carga todo; una lista vacía sólo el encabezado.
+            archivo: si no está en la base principal, buscarla también en la
+                base de archivo (la cotización lleva 'archivada': True)
+        """
+        cotizacion = self._obtener_detalle_cotizacion('c.id = ?', cotizacion_id, include)
+        if cotizacion is None and archivo:
+            cotizacion = self._obtener_detalle_cotizacion('c.id = ?', cotizacion_id, include, archivo=True)
+            if cotizacion is not None:
+                cotizacion['archivada'] = True
+        return cotizacion
+    
+    def existe_cotizacion(self, cotizacion_id):
+        """Verificar si existe una cotización sin cargar sus datos"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
         
-        items = [dict(row) for row in cursor.fetchall()]
-        cotizacion_dict['items'] = items
-
-        # Obtener adjuntos
-        cursor.execute('''
-            SELECT * FROM cotizacion_adjuntos WHERE cotizacion_id = ?
-            ORDER BY fecha_creacion ASC
-        ''', (cotizacion_id,))
-
-        adjuntos = [dict(row) for row in cursor.fetchall()]
-        cotizacion_dict['adjuntos'] = adjuntos
+        cursor.execute('SELECT 1 FROM cotizaciones WHERE id = ?', (cotizacion_id,))
+        existe = cursor.fetchone() is not None
         
         conn.close()
-        return cotizacion_dict
+        return existe
 
     def agregar_adjuntos(self, cotizacion_id, adjuntos):
         """Agregar adjuntos a una cotización"""
         if not adjuntos:
             return 0
 
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        for adjunto in adjuntos:
-            cursor.execute('''
+        def _escribir(conn):
+            cursor = conn.executemany('''
                 INSERT INTO cotizacion_adjuntos
                 (cotizacion_id, nombre_original, nombre_archivo, ruta_archivo, mime_tipo, tamano_bytes)
                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
+            ''', [(
                 cotizacion_id,
                 adjunto['nombre_original'],
                 adjunto['nombre_archivo'],
                 adjunto['ruta_archivo'],
                 adjunto.get('mime_tipo'),
                 adjunto.get('tamano_bytes')
-            ))
-
-        conn.commit()
-        count = cursor.rowcount
-        conn.close()
+            ) for adjunto in adjuntos])
+            return cursor.rowcount
 
-        return count
+        return self._ejecutar_escritura(_escribir)
 
     def obtener_adjuntos(self, cotizacion_id):
         """Obtener adjuntos de una cotización"""
@@ -395,61 +729,152 @@ class Database:
 
         return adjuntos
     
+    @staticmethod
+    def _valores_item(item):
+        """Columnas persistidas de un item: (producto_id, concepto, descripcion, cantidad, precio_unitario, subtotal)"""
+        producto_id = item.get('producto_id')
+        producto_id = int(producto_id) if producto_id not in (None, '') else None
+        return (
+            producto_id,
+            item['concepto'],
+            item.get('descripcion', ''),
+            item['cantidad'],
+            item['precio_unitario'],
+            item['cantidad'] * item['precio_unitario']
+        )
+    
+    _SQL_INSERTAR_ITEM = '''
+        INSERT INTO cotizacion_items 
+        (cotizacion_id, producto_id, concepto, descripcion, cantidad, precio_unitario, subtotal)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    def _insertar_items(self, cursor, cotizacion_id, items):
+        """Insertar items de una cotización con un solo executemany"""
+        cursor.executemany(self._SQL_INSERTAR_ITEM, [(cotizacion_id, *self._valores_item(item)) for item in items])
+    
     def actualizar_cotizacion(self, cotizacion_id, cliente_id, items, fecha_validez=None, notas='', condiciones_comerciales='', iva_porcentaje=16):
-        """Actualizar una cotización existente"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Calcular totales
-        subtotal = sum(item['cantidad'] * item['precio_unitario'] for item in items)
-        iva = subtotal * (iva_porcentaje / 100)
-        total = subtotal + iva
-        
-        # Actualizar cotización
-        cursor.execute('''
-            UPDATE cotizaciones 
-            SET cliente_id = ?, fecha_validez = ?, subtotal = ?, iva = ?, total = ?, notas = ?, condiciones_comerciales = ?
-            WHERE id = ?
-        ''', (cliente_id, fecha_validez, subtotal, iva, total, notas, condiciones_comerciales, cotizacion_id))
-        
-        # Eliminar items anteriores
-        cursor.execute('DELETE FROM cotizacion_items WHERE cotizacion_id = ?', (cotizacion_id,))
-        
-        # Insertar nuevos items
-        for item in items:
-            item_subtotal = item['cantidad'] * item['precio_unitario']
+        """
+        Actualizar una cotización existente.
+        
+        Los items se comparan por `id` contra los guardados: sólo se actualizan
+        los que cambiaron, se insertan los nuevos (sin `id`) y se eliminan los
+        que ya no vienen en la lista, todo en una sola transacción.
+        """
+        def _escribir(conn):
+            cursor = conn.cursor()
+            
+            # Calcular totales
+            subtotal = sum(item['cantidad'] * item['precio_unitario'] for item in items)
+            iva = subtotal * (iva_porcentaje / 100)
+            total = subtotal + iva
+            
+            # Actualizar cotización
             cursor.execute('''
-                INSERT INTO cotizacion_items 
-                (cotizacion_id, producto_id, concepto, descripcion, cantidad, precio_unitario, subtotal)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (cotizacion_id, item.get('producto_id'), item['concepto'], item.get('descripcion', ''), 
-                  item['cantidad'], item['precio_unitario'], item_subtotal))
-        
-        conn.commit()
-        conn.close()
-        
+                UPDATE cotizaciones 
+                SET cliente_id = ?, fecha_validez = ?, subtotal = ?, iva = ?, total = ?, notas = ?, condiciones_comerciales = ?
+                WHERE id = ?
+            ''', (cliente_id, fecha_validez, subtotal, iva, total, notas, condiciones_comerciales, cotizacion_id))
+            
+            # Items guardados actualmente, por id
+            cursor.execute('''
+                SELECT id, producto_id, concepto, descripcion, cantidad, precio_unitario, subtotal
+                FROM cotizacion_items WHERE cotizacion_id = ?
+            ''', (cotizacion_id,))
+            guardados = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+            
+            actualizar, insertar = [], []
+            for item in items:
+                valores = self._valores_item(item)
+                item_id = item.get('id')
+                item_id = int(item_id) if item_id not in (None, '') else None
+                
+                if item_id in guardados:
+                    if guardados.pop(item_id) != valores:
+                        actualizar.append((*valores, item_id))
+                else:
+                    # Item nuevo (o con id ajeno a esta cotización)
+                    insertar.append(item)
+            
+            if guardados:
+                cursor.executemany(
+                    'DELETE FROM cotizacion_items WHERE id = ?',
+                    [(item_id,) for item_id in guardados]
+                )
+            if actualizar:
+                cursor.executemany('''
+                    UPDATE cotizacion_items
+                    SET producto_id = ?, concepto = ?, descripcion = ?, cantidad = ?, precio_unitario = ?, subtotal = ?
+                    WHERE id = ?
+                ''', actualizar)
+            if insertar:
+                self._insertar_items(cursor, cotizacion_id, insertar)
+        
+        self._ejecutar_escritura(_escribir)
         return True
 
     def eliminar_cotizacion(self, cotizacion_id):
         """Eliminar una cotización y sus registros relacionados"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('DELETE FROM cotizacion_adjuntos WHERE cotizacion_id = ?', (cotizacion_id,))
-        cursor.execute('DELETE FROM cotizacion_items WHERE cotizacion_id = ?', (cotizacion_id,))
-        cursor.execute('DELETE FROM cotizaciones WHERE id = ?', (cotizacion_id,))
-        deleted = cursor.rowcount > 0
+        def _escribir(conn):
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM cotizacion_adjuntos WHERE cotizacion_id = ?', (cotizacion_id,))
+            cursor.execute('DELETE FROM cotizacion_items WHERE cotizacion_id = ?', (cotizacion_id,))
+            cursor.execute('DELETE FROM cotizaciones WHERE id = ?', (cotizacion_id,))
+            return cursor.rowcount > 0
 
-        conn.commit()
-        conn.close()
-
-        return deleted
+        return self._ejecutar_escritura(_escribir)
+    
+    # Recalcular de una sola vez las columnas de resumen que mantienen los
+    # triggers de cotizacion_items y cotizacion_adjuntos (migración 12); sólo
+    # toca las cotizaciones cuyo resumen no coincide
+    _SQL_REPARAR_RESUMEN = '''
+        WITH items AS (
+            SELECT cotizacion_id, COUNT(*) AS n
+            FROM cotizacion_items GROUP BY cotizacion_id
+        ),
+        adjuntos AS (
+            SELECT cotizacion_id, COUNT(*) AS n, COALESCE(SUM(tamano_bytes), 0) AS bytes
+            FROM cotizacion_adjuntos GROUP BY cotizacion_id
+        ),
+        real AS (
+            SELECT c.id, COALESCE(i.n, 0) AS items_count,
+                   COALESCE(a.n, 0) AS adjuntos_count, COALESCE(a.bytes, 0) AS adjuntos_bytes
+            FROM cotizaciones c
+            LEFT JOIN items i ON i.cotizacion_id = c.id
+            LEFT JOIN adjuntos a ON a.cotizacion_id = c.id
+        )
+        UPDATE cotizaciones
+        SET items_count = real.items_count,
+            adjuntos_count = real.adjuntos_count,
+            adjuntos_bytes = real.adjuntos_bytes
+        FROM real
+        WHERE real.id = cotizaciones.id
+          AND (cotizaciones.items_count <> real.items_count
+               OR cotizaciones.adjuntos_count <> real.adjuntos_count
+               OR cotizaciones.adjuntos_bytes <> real.adjuntos_bytes)
+    '''
+    
+    def reparar_resumen_cotizaciones(self):
+        """
+        Recalcular items_count, adjuntos_count y adjuntos_bytes de todas las
+        cotizaciones (p. ej. tras editar la base a mano con los triggers fuera).
+        
+        Returns:
+            int: cotizaciones corregidas
+        """
+        def _escribir(conn):
+            conn.execute(self._SQL_REPARAR_RESUMEN)
+            # rowcount no se reporta en sentencias que empiezan con WITH
+            return conn.execute('SELECT changes()').fetchone()[0]
+        
+        return self._ejecutar_escritura(_escribir)
     
     # ==========================================
     # FUNCIONES DE AUTENTICACIÓN Y USUARIOS
     # ==========================================
     
-    def _hash_password(self, password):
+    @staticmethod
+    def _hash_password(password):
         """Generar hash de contraseña con salt"""
         salt = secrets.token_hex(16)
         pwd_hash = hashlib.sha256((password + salt).encode()).hexdigest()
@@ -474,46 +899,38 @@ class Database:
         ''', (username,))
         
         usuario = cursor.fetchone()
+        conn.close()
         
         if usuario and self._verify_password(password, usuario['password_hash']):
             # Actualizar último acceso
-            cursor.execute('''
+            self._ejecutar_escritura(lambda conn: conn.execute('''
                 UPDATE usuarios SET ultimo_acceso = CURRENT_TIMESTAMP WHERE id = ?
-            ''', (usuario['id'],))
-            conn.commit()
-            conn.close()
+            ''', (usuario['id'],)))
             
             # Retornar datos del usuario (sin el hash)
             user_dict = dict(usuario)
             user_dict.pop('password_hash')
             return user_dict
         
-        conn.close()
         return None
     
     def crear_usuario(self, username, password, nombre_completo, email, rol='usuario'):
         """Crear un nuevo usuario"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Verificar si ya existe
-        cursor.execute('SELECT id FROM usuarios WHERE username = ?', (username,))
-        if cursor.fetchone():
-            conn.close()
-            return None
-        
         password_hash = self._hash_password(password)
         
-        cursor.execute('''
-            INSERT INTO usuarios (username, password_hash, nombre_completo, email, rol)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (username, password_hash, nombre_completo, email, rol))
-        
-        conn.commit()
-        usuario_id = cursor.lastrowid
-        conn.close()
+        def _escribir(conn):
+            # Verificar si ya existe
+            cursor = conn.execute('SELECT id FROM usuarios WHERE username = ?', (username,))
+            if cursor.fetchone():
+                return None
+            
+            cursor.execute('''
+                INSERT INTO usuarios (username, password_hash, nombre_completo, email, rol)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (username, password_hash, nombre_completo, email, rol))
+            return cursor.lastrowid
         
-        return usuario_id
+        return self._ejecutar_escritura(_escribir)
     
     def obtener_usuarios(self):
         """Obtener todos los usuarios"""
@@ -546,9 +963,6 @@ class Database:
     
     def actualizar_usuario(self, usuario_id, nombre_completo=None, email=None, rol=None, activo=None):
         """Actualizar datos de un usuario"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         updates = []
         params = []
         
@@ -569,74 +983,39 @@ class Database:
             params.append(activo)
         
         if not updates:
-            conn.close()
             return False
         
         params.append(usuario_id)
         query = f"UPDATE usuarios SET {', '.join(updates)} WHERE id = ?"
         
-        cursor.execute(query, params)
-        conn.commit()
-        conn.close()
-        
+        self._ejecutar_escritura(lambda conn: conn.execute(query, params))
         return True
     
     def cambiar_password(self, usuario_id, nueva_password):
         """Cambiar la contraseña de un usuario"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         password_hash = self._hash_password(nueva_password)
         
-        cursor.execute('''
+        self._ejecutar_escritura(lambda conn: conn.execute('''
             UPDATE usuarios SET password_hash = ? WHERE id = ?
-        ''', (password_hash, usuario_id))
-        
-        conn.commit()
-        conn.close()
+        ''', (password_hash, usuario_id)))
         
         return True
     
     def eliminar_usuario(self, usuario_id):
         """Eliminar un usuario (realmente lo desactiva)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self._ejecutar_escritura(lambda conn: conn.execute('''
             UPDATE usuarios SET activo = 0 WHERE id = ?
-        ''', (usuario_id,))
-        
-        conn.commit()
-        conn.close()
+        ''', (usuario_id,)))
         
         return True
-        
-        # Obtener items
-        cursor.execute('''
-            SELECT * FROM cotizacion_items
-            WHERE cotizacion_id = ?
-            ORDER BY id
-        ''', (cotizacion_id,))
-        
-        items = [dict(row) for row in cursor.fetchall()]
-        cotizacion_dict['items'] = items
-        
-        conn.close()
-        return cotizacion_dict
     
     def actualizar_estado_cotizacion(self, cotizacion_id, estado):
         """Actualizar el estado de una cotización"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self._ejecutar_escritura(lambda conn: conn.execute('''
             UPDATE cotizaciones
             SET estado = ?
             WHERE id = ?
-        ''', (estado, cotizacion_id))
-        
-        conn.commit()
-        conn.close()
+        ''', (estado, cotizacion_id)))
     
     # ==========================================
     # FUNCIONES DE PRODUCTOS Y SERVICIOS
@@ -644,40 +1023,58 @@ class Database:
     
     def crear_producto(self, codigo, nombre, descripcion, tipo, precio, unidad='pza', categoria='', imagen_url=None):
         """Crear un nuevo producto o servicio"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Verificar si el código ya existe
-        cursor.execute('SELECT id FROM productos WHERE codigo = ?', (codigo,))
-        if cursor.fetchone():
-            conn.close()
-            return None
-        
-        cursor.execute('''
-            INSERT INTO productos (codigo, nombre, descripcion, tipo, precio, unidad, categoria, imagen_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (codigo, nombre, descripcion, tipo, precio, unidad, categoria, imagen_url))
+        def _escribir(conn):
+            # Verificar si el código ya existe
+            cursor = conn.execute('SELECT id FROM productos WHERE codigo = ?', (codigo,))
+            if cursor.fetchone():
+                return None
+            
+            cursor.execute('''
+                INSERT INTO productos (codigo, nombre, descripcion, tipo, precio, unidad, categoria, imagen_url)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (codigo, nombre, descripcion, tipo, precio, unidad, categoria, imagen_url))
+            return cursor.lastrowid
         
-        conn.commit()
-        producto_id = cursor.lastrowid
-        conn.close()
+        producto_id = self._ejecutar_escritura(_escribir)
+        if producto_id is not None:
+            self._cache_catalogo.invalidar()
         
         return producto_id
     
-    def obtener_productos(self, incluir_inactivos=False):
-        """Obtener todos los productos y servicios"""
+    @staticmethod
+    def _cargar_catalogo(conn):
+        """Instantánea del catálogo activo: lista por nombre, categorías e índice por código"""
+        productos = consultar_filas(conn, 'SELECT * FROM productos WHERE activo = 1 ORDER BY nombre')
+        return {
+            'productos': productos,
+            'categorias': sorted({p['categoria'] for p in productos if p['categoria']}),
+            'por_codigo': {p['codigo']: p for p in productos},
+        }
+    
+    def _catalogo(self):
+        """Catálogo activo desde la caché del worker (se recarga si la tabla cambió)"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        try:
+            return self._cache_catalogo.obtener(conn, self._cargar_catalogo)
+        finally:
+            conn.close()
+    
+    def obtener_productos(self, incluir_inactivos=False):
+        """
+        Obtener todos los productos y servicios.
+        
+        Los activos salen de la caché del catálogo: las filas (FilaDict, de solo
+        lectura) se comparten entre peticiones; como_dict() da una copia modificable.
+        """
+        if not incluir_inactivos:
+            return list(self._catalogo()['productos'])
+        return list(self.iterar_productos(incluir_inactivos=True))
+    
+    def iterar_productos(self, incluir_inactivos=False):
+        """Productos por nombre leídos directo de SQLite, fila por fila (para exportar en streaming)"""
         if incluir_inactivos:
-            cursor.execute('SELECT * FROM productos ORDER BY nombre')
-        else:
-            cursor.execute('SELECT * FROM productos WHERE activo = 1 ORDER BY nombre')
-        
-        productos = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        return productos
+            return self._iterar_filas('SELECT * FROM productos ORDER BY nombre')
+        return self._iterar_filas('SELECT * FROM productos WHERE activo = 1 ORDER BY nombre')
     
     def obtener_producto(self, producto_id):
         """Obtener un producto por ID"""
@@ -692,32 +1089,51 @@ class Database:
         return dict(producto) if producto else None
     
     def buscar_producto_por_codigo(self, codigo):
-        """Buscar un producto por código"""
+        """Buscar un producto activo por código (desde la caché del catálogo)"""
+        producto = self._catalogo()['por_codigo'].get(codigo)
+        return dict(producto) if producto else None
+    
+    @staticmethod
+    def _consulta_fts(texto):
+        """
+        Convertir el texto del usuario en una consulta FTS5 segura.
+        
+        Cada palabra se entrecomilla (sin operadores ni sintaxis FTS5) y se
+        busca por prefijo; todas deben aparecer: "cam dom" -> "cam"* "dom"*
+        """
+        palabras = re.findall(r'\w+', texto or '')
+        return ' '.join(f'"{palabra}"*' for palabra in palabras)
+    
+    def buscar_productos(self, texto, limite=20, incluir_inactivos=False):
+        """Búsqueda de texto completo en código, nombre, descripción y categoría (ordenada por bm25)"""
+        consulta = self._consulta_fts(texto)
+        if not consulta:
+            return []
+        
         conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = cursor_tuplas(conn)
         
-        cursor.execute('SELECT * FROM productos WHERE codigo = ? AND activo = 1', (codigo,))
+        cursor.execute(f'''
+            SELECT p.*
+            FROM productos_fts f
+            JOIN productos p ON p.id = f.rowid
+            WHERE productos_fts MATCH ? {'' if incluir_inactivos else 'AND p.activo = 1'}
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (consulta, limite))
         
-        producto = cursor.fetchone()
-        conn.close()
+        productos = filas_dict(cursor, cursor.fetchall())
         
-        return dict(producto) if producto else None
+        conn.close()
+        return productos
     
     def actualizar_producto(self, producto_id, codigo=None, nombre=None, descripcion=None, 
                            tipo=None, precio=None, unidad=None, categoria=None, activo=None, imagen_url=None):
         """Actualizar un producto"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         updates = []
         params = []
         
         if codigo is not None:
-            # Verificar que el código no esté en uso por otro producto
-            cursor.execute('SELECT id FROM productos WHERE codigo = ? AND id != ?', (codigo, producto_id))
-            if cursor.fetchone():
-                conn.close()
-                return False
             updates.append('codigo = ?')
             params.append(codigo)
         
@@ -754,113 +1170,708 @@ class Database:
             params.append(imagen_url)
         
         if not updates:
-            conn.close()
             return False
         
         params.append(producto_id)
         query = f"UPDATE productos SET {', '.join(updates)} WHERE id = ?"
         
-        cursor.execute(query, params)
-        conn.commit()
-        conn.close()
+        def _escribir(conn):
+            if codigo is not None:
+                # Verificar que el código no esté en uso por otro producto
+                cursor = conn.execute('SELECT id FROM productos WHERE codigo = ? AND id != ?', (codigo, producto_id))
+                if cursor.fetchone():
+                    return False
+            conn.execute(query, params)
+            return True
         
-        return True
+        actualizado = self._ejecutar_escritura(_escribir)
+        if actualizado:
+            self._cache_catalogo.invalidar()
+        
+        return actualizado
     
-    def eliminar_producto(self, producto_id):
-        """Eliminar un producto (realmente lo desactiva)"""
+    COLUMNAS_IMPORTACION_PRODUCTOS = ('codigo', 'nombre', 'descripcion', 'tipo', 'precio', 'unidad', 'categoria')
+    
+    def importar_productos(self, columnas, productos, tamano_lote=1000):
+        """
+        Insertar o actualizar productos por código en lotes (INSERT ... ON CONFLICT).
+        
+        Args:
+            columnas: columnas presentes en el archivo (deben incluir codigo,
+                nombre y precio); las ausentes no se tocan al actualizar
+            productos: iterable de diccionarios ya validados
+            tamano_lote: filas por transacción
+        
+        Returns:
+            dict con insertados, actualizados, sin_cambios y duplicados
+            (códigos repetidos dentro de un mismo lote; gana la última fila)
+        """
+        columnas = tuple(c for c in self.COLUMNAS_IMPORTACION_PRODUCTOS if c in columnas)
+        actualizables = [c for c in columnas if c != 'codigo']
+        sql = f'''
+            INSERT INTO productos ({', '.join(columnas)})
+            VALUES ({', '.join('?' * len(columnas))})
+            ON CONFLICT (codigo) DO UPDATE SET
+                {', '.join(f'{c} = excluded.{c}' for c in actualizables)}
+            WHERE ({', '.join(f'productos.{c}' for c in actualizables)})
+                IS NOT ({', '.join(f'excluded.{c}' for c in actualizables)})
+        '''
+        
+        resultado = {'insertados': 0, 'actualizados': 0, 'sin_cambios': 0, 'duplicados': 0}
+        
+        def _escribir_lote(lote):
+            codigos = list(lote)
+            
+            # Una transacción (o una operación de la cola de escritura) por lote
+            def _escribir(conn):
+                cursor = conn.cursor()
+                existentes = 0
+                # Códigos ya registrados, en grupos para no exceder el límite de parámetros
+                for i in range(0, len(codigos), 500):
+                    grupo = codigos[i:i + 500]
+                    cursor.execute(
+                        f"SELECT COUNT(*) FROM productos WHERE codigo IN ({', '.join('?' * len(grupo))})", grupo
+                    )
+                    existentes += cursor.fetchone()[0]
+                
+                cursor.executemany(sql, [tuple(p[c] for c in columnas) for p in lote.values()])
+                # rowcount no cuenta lo que escriben los triggers (a diferencia de total_changes)
+                return existentes, cursor.rowcount
+            
+            existentes, escritos = self._ejecutar_escritura(_escribir)
+            insertados = len(codigos) - existentes
+            resultado['insertados'] += insertados
+            resultado['actualizados'] += escritos - insertados
+            resultado['sin_cambios'] += existentes - (escritos - insertados)
+        
+        try:
+            lote = {}
+            for producto in productos:
+                if producto['codigo'] in lote:
+                    resultado['duplicados'] += 1
+                lote[producto['codigo']] = producto
+                if len(lote) >= tamano_lote:
+                    _escribir_lote(lote)
+                    lote = {}
+            if lote:
+                _escribir_lote(lote)
+        finally:
+            self._cache_catalogo.invalidar()
+        
+        return resultado
+    
+    OPERACIONES_REPRECIO = {
+        'porcentaje': 'precio * (1 + ? / 100.0)',
+        'delta': 'precio + ?',
+        'factor': 'precio * ?',
+        # El precio tal cual: sólo se aplica el redondeo al múltiplo pedido
+        'redondeo': 'precio',
+    }
+    MUESTRA_REPRECIO = 200
+    
+    def _filtro_reprecio(self, categoria=None, tipo=None, prefijo_codigo=None, ids=None,
+                         incluir_inactivos=False, todos=False):
+        """WHERE y parámetros del conjunto de productos a repreciar"""
+        condiciones = []
+        params = []
+        if not incluir_inactivos:
+            condiciones.append('activo = 1')
+        if categoria:
+            condiciones.append('categoria = ?')
+            params.append(categoria)
+        if tipo:
+            condiciones.append('tipo = ?')
+            params.append(tipo)
+        if prefijo_codigo:
+            # Rango sobre el índice único de codigo en lugar de LIKE
+            condiciones.append('codigo >= ? AND codigo < ?')
+            params += [prefijo_codigo, prefijo_codigo[:-1] + chr(ord(prefijo_codigo[-1]) + 1)]
+        if ids:
+            condiciones.append(f"id IN ({', '.join('?' * len(ids))})")
+            params += [int(i) for i in ids]
+        
+        if not (categoria or tipo or prefijo_codigo or ids or todos):
+            raise ValueError('Indique al menos un filtro (categoría, tipo, prefijo o ids) o todos=True')
+        return ' AND '.join(condiciones) or '1', params
+    
+    def repreciar_productos(self, operacion, valor=0, redondeo=0.01, simular=False, usuario_id=None, **filtros):
+        """
+        Reprecio masivo por conjunto con una sola sentencia UPDATE.
+        
+        Args:
+            operacion: 'porcentaje' (+/-%), 'delta' (monto fijo), 'factor'
+                (p. ej. tipo de cambio) o 'redondeo' (sólo redondear)
+            valor: porcentaje, monto o factor según la operación
+            redondeo: múltiplo al que se redondea el precio nuevo (0.01, 1, 10, 0.5...)
+            simular: sólo calcular la vista previa, sin escribir
+            **filtros: categoria, tipo, prefijo_codigo, ids, incluir_inactivos, todos
+        
+        Returns:
+            dict con lote (None al simular), afectados y una muestra de
+            {id, codigo, nombre, precio_anterior, precio_nuevo}
+        """
+        if operacion not in self.OPERACIONES_REPRECIO:
+            raise ValueError(f'Operación de reprecio inválida: {operacion}')
+        valor = float(valor or 0)
+        redondeo = float(redondeo or 0.01)
+        if redondeo <= 0:
+            raise ValueError('El redondeo debe ser mayor que cero')
+        if operacion == 'factor' and valor <= 0:
+            raise ValueError('El factor debe ser mayor que cero')
+        
+        where, params_filtro = self._filtro_reprecio(**filtros)
+        # Nunca negativo; redondeado al múltiplo pedido y a centavos para evitar ruido de flotantes
+        expresion = self.OPERACIONES_REPRECIO[operacion]
+        nuevo = f'ROUND(ROUND(MAX({expresion}, 0) / ?) * ?, 2)'
+        params_nuevo = [valor] * expresion.count('?') + [redondeo, redondeo]
+        
+        def _muestra(cursor):
+            cursor.execute(f'''
+                SELECT id, codigo, nombre, precio AS precio_anterior, {nuevo} AS precio_nuevo
+                FROM productos
+                WHERE {where} AND precio != {nuevo}
+                LIMIT ?
+            ''', params_nuevo + params_filtro + params_nuevo + [self.MUESTRA_REPRECIO])
+            return [dict(row) for row in cursor.fetchall()]
+        
+        if simular:
+            # Sólo lectura: muestra y conteo de la misma instantánea
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            try:
+                cursor.execute('BEGIN')
+                muestra = _muestra(cursor)
+                cursor.execute(f'''
+                    SELECT COUNT(*) FROM productos WHERE {where} AND precio != {nuevo}
+                ''', params_filtro + params_nuevo)
+                afectados = cursor.fetchone()[0]
+                conn.rollback()
+            finally:
+                conn.close()
+            return {'lote': None, 'simulacion': True, 'afectados': afectados, 'muestra': muestra}
+        
+        def _escribir(conn):
+            cursor = conn.cursor()
+            muestra = _muestra(cursor)
+            lote = secrets.token_hex(8)
+            regla = json.dumps({'operacion': operacion, 'valor': valor, 'redondeo': redondeo, 'filtros': filtros},
+                               ensure_ascii=False)
+            # Antes/después se registran con el mismo cálculo y el UPDATE aplica lo registrado
+            cursor.execute(f'''
+                INSERT INTO historial_precios (lote, producto_id, precio_anterior, precio_nuevo, regla, usuario_id)
+                SELECT ?, id, precio, {nuevo}, ?, ?
+                FROM productos
+                WHERE {where} AND precio != {nuevo}
+            ''', [lote] + params_nuevo + [regla, usuario_id] + params_filtro + params_nuevo)
+            afectados = cursor.rowcount
+            
+            cursor.execute('''
+                UPDATE productos
+                SET precio = h.precio_nuevo
+                FROM historial_precios h
+                WHERE h.lote = ? AND h.producto_id = productos.id
+            ''', (lote,))
+            return {'lote': lote, 'simulacion': False, 'afectados': afectados, 'muestra': muestra}
+        
+        resultado = self._ejecutar_escritura(_escribir)
+        self._cache_catalogo.invalidar()
+        return resultado
+    
+    def obtener_historial_precios(self, lote=None, producto_id=None, limite=200):
+        """Cambios de precio registrados por los reprecios, del más reciente al más antiguo"""
+        if lote is None and producto_id is None:
+            raise ValueError('Indique el lote o el producto')
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            UPDATE productos SET activo = 0 WHERE id = ?
-        ''', (producto_id,))
+        condicion, valor = ('h.lote = ?', lote) if lote is not None else ('h.producto_id = ?', producto_id)
+        orden = 'h.producto_id' if lote is not None else 'h.fecha DESC'
+        cursor.execute(f'''
+            SELECT h.*, p.codigo, p.nombre
+            FROM historial_precios h
+            JOIN productos p ON p.id = h.producto_id
+            WHERE {condicion}
+            ORDER BY {orden}
+            LIMIT ?
+        ''', (valor, limite))
+        historial = [dict(row) for row in cursor.fetchall()]
         
-        conn.commit()
         conn.close()
+        return historial
+    
+    def eliminar_producto(self, producto_id):
+        """Eliminar un producto (realmente lo desactiva)"""
+        self._ejecutar_escritura(lambda conn: conn.execute('''
+            UPDATE productos SET activo = 0 WHERE id = ?
+        ''', (producto_id,)))
+        self._cache_catalogo.invalidar()
         
         return True
     
-    def obtener_cotizacion_por_token(self, token):
+    def obtener_cotizacion_por_token(self, token, include=None):
         """Obtener cotización por su token de aprobación"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT c.*, cl.nombre as cliente_nombre, cl.email as cliente_email,
-                   u.nombre_completo as creado_por_nombre, u.username as creado_por_username
-            FROM cotizaciones c
-            JOIN clientes cl ON c.cliente_id = cl.id
-            LEFT JOIN usuarios u ON c.creado_por = u.id
-            WHERE c.token_aprobacion = ?
-        ''', (token,))
-        
-        cotizacion = cursor.fetchone()
-        
-        if cotizacion:
-            cotizacion = dict(cotizacion)
-            
-            # Obtener items
-            cursor.execute('''
-                SELECT * FROM cotizacion_items WHERE cotizacion_id = ?
-            ''', (cotizacion['id'],))
-            cotizacion['items'] = [dict(row) for row in cursor.fetchall()]
-        
-        conn.close()
-        return cotizacion
+        return self._obtener_detalle_cotizacion('c.token_aprobacion = ?', token, include)
     
     def actualizar_estado_aprobacion(self, token, estado, comentarios=None):
         """Actualizar el estado de aprobación de una cotización"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        if comentarios:
-            cursor.execute('''
-                UPDATE cotizaciones 
-                SET estado_aprobacion = ?, fecha_aprobacion = CURRENT_TIMESTAMP, comentarios_cliente = ?
-                WHERE token_aprobacion = ?
-            ''', (estado, comentarios, token))
-        else:
-            cursor.execute('''
-                UPDATE cotizaciones 
-                SET estado_aprobacion = ?, fecha_aprobacion = CURRENT_TIMESTAMP
-                WHERE token_aprobacion = ?
-            ''', (estado, token))
-        
-        conn.commit()
-        affected = cursor.rowcount
-        conn.close()
-        
-        return affected > 0
+        def _escribir(conn):
+            if comentarios:
+                cursor = conn.execute('''
+                    UPDATE cotizaciones 
+                    SET estado_aprobacion = ?, fecha_aprobacion = CURRENT_TIMESTAMP, comentarios_cliente = ?
+                    WHERE token_aprobacion = ?
+                ''', (estado, comentarios, token))
+            else:
+                cursor = conn.execute('''
+                    UPDATE cotizaciones 
+                    SET estado_aprobacion = ?, fecha_aprobacion = CURRENT_TIMESTAMP
+                    WHERE token_aprobacion = ?
+                ''', (estado, token))
+            return cursor.rowcount > 0
+        
+        return self._ejecutar_escritura(_escribir)
     
     def actualizar_emails_destino(self, cotizacion_id, emails):
         """Actualizar los emails destino de una cotización"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self._ejecutar_escritura(lambda conn: conn.execute('''
             UPDATE cotizaciones 
-            SET emails_destino = ?
+            SET emails_destino = ?, ultimo_envio = CURRENT_TIMESTAMP
             WHERE id = ?
-        ''', (emails, cotizacion_id))
-        
-        conn.commit()
-        conn.close()
+        ''', (emails, cotizacion_id)))
         
         return True
     
     def obtener_categorias(self):
-        """Obtener lista única de categorías de productos"""
+        """Obtener lista única de categorías de productos activos (desde la caché del catálogo)"""
+        return list(self._catalogo()['categorias'])
+    
+    # ==========================================
+    # SINCRONIZACIÓN INCREMENTAL (BITÁCORA DE CAMBIOS)
+    # ==========================================
+    
+    TABLAS_SINCRONIZABLES = ('clientes', 'productos', 'cotizaciones')
+    
+    # Filas actuales de cada tabla, con las mismas columnas que sus listados
+    _SQL_FILAS_CAMBIOS = {
+        'clientes': 'SELECT * FROM clientes WHERE id IN ({ids})',
+        'productos': 'SELECT * FROM productos WHERE id IN ({ids})',
+        'cotizaciones': _SQL_COTIZACIONES_CON_CLIENTE + ' WHERE c.id IN ({ids})',
+    }
+    
+    def obtener_cambios(self, desde=None, tablas=None, limite=500):
+        """
+        Cambios posteriores al cursor `desde` para sincronizar por deltas.
+        
+        Returns:
+            {'cursor', 'cambios': {tabla: [filas]}, 'eliminados': {tabla: [ids]},
+             'archivados': {tabla: [ids]}, 'hay_mas', 'reiniciar'}. Sin `desde`
+            sólo se devuelve el cursor actual (para empezar después de una
+            carga completa). `archivados` son cotizaciones movidas al archivo:
+            salen del listado vigente pero siguen existiendo (archivo=True).
+            `reiniciar` indica que el cursor es anterior a lo compactado y el
+            cliente debe recargar las colecciones completas.
+        """
+        tablas = tuple(tablas or self.TABLAS_SINCRONIZABLES)
+        desconocidas = set(tablas) - set(self.TABLAS_SINCRONIZABLES)
+        if desconocidas:
+            raise ValueError(f"Tablas no sincronizables: {', '.join(sorted(desconocidas))}")
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT DISTINCT categoria 
-            FROM productos 
-            WHERE categoria IS NOT NULL AND categoria != '' AND activo = 1
-            ORDER BY categoria
-        ''')
+        # Cursor, bitácora y filas se leen en la misma instantánea
+        cursor.execute('BEGIN')
+        try:
+            cursor.execute("SELECT valor FROM secuencias WHERE nombre = 'cambios_purgados_hasta'")
+            row = cursor.fetchone()
+            purgados_hasta = row['valor'] if row else 0
+            # La última entrada nunca se compacta salvo que se purgue todo
+            cursor.execute('SELECT MAX(seq) AS ultimo FROM cambios')
+            ultimo = max(cursor.fetchone()['ultimo'] or 0, purgados_hasta)
+            
+            respuesta = {
+                'cursor': ultimo,
+                'cambios': {tabla: [] for tabla in tablas},
+                'eliminados': {tabla: [] for tabla in tablas},
+                'archivados': {tabla: [] for tabla in tablas},
+                'hay_mas': False,
+                'reiniciar': False,
+            }
+            if desde is None:
+                return respuesta
+            
+            if desde < purgados_hasta:
+                respuesta['reiniciar'] = True
+                return respuesta
+            
+            # "+tabla" evita idx_cambios_registro: el recorrido por seq ya sale ordenado
+            cursor.execute(f'''
+                SELECT seq, tabla, registro_id, operacion
+                FROM cambios
+                WHERE seq > ? AND +tabla IN ({', '.join('?' * len(tablas))})
+                ORDER BY seq
+                LIMIT ?
+            ''', (desde, *tablas, limite + 1))
+            entradas = cursor.fetchall()
+            
+            if len(entradas) > limite:
+                entradas = entradas[:limite]
+                respuesta['hay_mas'] = True
+                respuesta['cursor'] = entradas[-1]['seq']
+            
+            # Sólo cuenta la última operación de cada registro
+            ultima_operacion = {}
+            for entrada in entradas:
+                ultima_operacion[(entrada['tabla'], entrada['registro_id'])] = entrada['operacion']
+            
+            for tabla in tablas:
+                ids = [rid for (t, rid), op in ultima_operacion.items() if t == tabla and op == 'upsert']
+                eliminados = [rid for (t, rid), op in ultima_operacion.items() if t == tabla and op == 'delete']
+                if ids:
+                    filas = consultar_filas(
+                        conn, self._SQL_FILAS_CAMBIOS[tabla].format(ids=', '.join('?' * len(ids))), ids
+                    )
+                    encontrados = {fila['id'] for fila in filas}
+                    # Borrado entre la entrada de la bitácora y esta lectura
+                    eliminados.extend(rid for rid in ids if rid not in encontrados)
+                    respuesta['cambios'][tabla] = sorted(filas, key=lambda fila: fila['id'])
+                respuesta['eliminados'][tabla] = sorted(eliminados)
+                respuesta['archivados'][tabla] = sorted(
+                    rid for (t, rid), op in ultima_operacion.items() if t == tabla and op == 'archive'
+                )
+            
+            return respuesta
+        finally:
+            conn.commit()
+            conn.close()
+    
+    def compactar_cambios(self, dias=None):
+        """
+        Compactar la bitácora de cambios.
+        
+        1. Quita las entradas superadas por una posterior del mismo registro
+           (no cambia el resultado para ningún cursor).
+        2. Purga las entradas con más de `dias` días; los cursores anteriores
+           a lo purgado reciben `reiniciar` en obtener_cambios.
+        
+        Returns:
+            dict con las entradas eliminadas en cada paso y el nuevo límite purgado
+        """
+        dias = Config.CAMBIOS_RETENCION_DIAS if dias is None else dias
+        
+        def _escribir(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM cambios
+                WHERE seq NOT IN (SELECT MAX(seq) FROM cambios GROUP BY tabla, registro_id)
+            ''')
+            superadas = cursor.rowcount
+            
+            cursor.execute('''
+                SELECT MAX(seq) AS hasta FROM cambios WHERE fecha < datetime('now', ?)
+            ''', (f'{-int(dias)} days',))
+            hasta = cursor.fetchone()['hasta']
+            purgadas = 0
+            if hasta:
+                cursor.execute('DELETE FROM cambios WHERE seq <= ?', (hasta,))
+                purgadas = cursor.rowcount
+                cursor.execute('''
+                    UPDATE secuencias SET valor = MAX(valor, ?) WHERE nombre = 'cambios_purgados_hasta'
+                ''', (hasta,))
+            
+            cursor.execute("SELECT valor FROM secuencias WHERE nombre = 'cambios_purgados_hasta'")
+            purgados_hasta = cursor.fetchone()['valor']
+            return {'superadas': superadas, 'purgadas': purgadas, 'purgados_hasta': purgados_hasta}
         
-        categorias = [row['categoria'] for row in cursor.fetchall()]
+        return self._ejecutar_escritura(_escribir)
+    
+    # ==========================================
+    # IDEMPOTENCIA (Idempotency-Key)
+    # ==========================================
+    
+    def reservar_idempotencia(self, alcance, clave, huella, ttl_segundos, abandono_segundos=300):
+        """
+        Reservar una Idempotency-Key antes de ejecutar la petición.
+        
+        Purga de paso las claves vencidas y toma las reservas 'en_proceso'
+        con más de `abandono_segundos` (el worker que la tenía murió).
+        
+        Returns:
+            None si la reserva es de quien llama (debe ejecutar y luego
+            completar o liberar); si no, el registro existente (estado,
+            huella y, si está completada, la respuesta guardada)
+        """
+        def _escribir(conn):
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM claves_idempotencia WHERE expira < datetime('now')")
+            cursor.execute('''
+                DELETE FROM claves_idempotencia
+                WHERE alcance = ? AND clave = ? AND estado = 'en_proceso' AND creada < datetime('now', ?)
+            ''', (alcance, clave, f'{-int(abandono_segundos)} seconds'))
+            cursor.execute('''
+                INSERT INTO claves_idempotencia (alcance, clave, huella, creada, expira)
+                VALUES (?, ?, ?, datetime('now'), datetime('now', ?))
+                ON CONFLICT (alcance, clave) DO NOTHING
+            ''', (alcance, clave, huella, f'{int(ttl_segundos):+d} seconds'))
+            if cursor.rowcount == 1:
+                return None
+            cursor.execute('''
+                SELECT estado, huella, codigo, respuesta, tipo_contenido
+                FROM claves_idempotencia WHERE alcance = ? AND clave = ?
+            ''', (alcance, clave))
+            return dict(cursor.fetchone())
         
+        return self._ejecutar_escritura(_escribir)
+    
+    def consultar_idempotencia(self, alcance, clave):
+        """Registro vigente de una Idempotency-Key o None"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT estado, huella, codigo, respuesta, tipo_contenido
+            FROM claves_idempotencia
+            WHERE alcance = ? AND clave = ? AND expira >= datetime('now')
+        ''', (alcance, clave))
+        row = cursor.fetchone()
         conn.close()
-        return categorias
+        return dict(row) if row else None
+    
+    def completar_idempotencia(self, alcance, clave, codigo, respuesta, tipo_contenido):
+        """Guardar la respuesta de la petición original para repetirla"""
+        self._ejecutar_escritura(lambda conn: conn.execute('''
+            UPDATE claves_idempotencia
+            SET estado = 'completada', codigo = ?, respuesta = ?, tipo_contenido = ?
+            WHERE alcance = ? AND clave = ?
+        ''', (codigo, respuesta, tipo_contenido, alcance, clave)))
+    
+    def liberar_idempotencia(self, alcance, clave):
+        """Soltar una reserva sin respuesta (error del servidor): el reintento se ejecuta de nuevo"""
+        self._ejecutar_escritura(lambda conn: conn.execute('''
+            DELETE FROM claves_idempotencia WHERE alcance = ? AND clave = ? AND estado = 'en_proceso'
+        ''', (alcance, clave)))
+    
+    # ==========================================
+    # ARCHIVO DE COTIZACIONES (archive.db)
+    # ==========================================
+    
+    TABLAS_ARCHIVO = ('cotizaciones', 'cotizacion_items', 'cotizacion_adjuntos')
+    
+    def archivo_disponible(self):
+        """Si ya existe la base de archivo (se crea al archivar por primera vez)"""
+        return os.path.exists(self.archivo_path)
+    
+    def _cliente_en_archivo(self, cliente_id):
+        """
+        Si alguna cotización archivada es del cliente.
+        
+        Se lee archive.db con una conexión aparte (no se puede hacer ATTACH
+        dentro de la transacción de escritura). Llamada dentro de esa
+        transacción no hay carrera con archivar_cotizaciones: mientras la
+        cotización no se haya borrado de main (commit del archivado) sigue
+        contando allí.
+        """
+        if not self.archivo_disponible():
+            return False
+        conn = abrir_conexion(self.archivo_path, solo_lectura=True)
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cotizaciones'").fetchone() is None:
+                return False
+            return conn.execute(
+                'SELECT 1 FROM cotizaciones WHERE cliente_id = ? LIMIT 1', (cliente_id,)
+            ).fetchone() is not None
+        finally:
+            conn.close()
+    
+    @contextmanager
+    def _archivo_adjunto(self, conn):
+        """`conn` (sin transacción abierta) con la base de archivo adjunta como `archivo`"""
+        conn.execute('ATTACH DATABASE ? AS archivo', (self.archivo_path,))
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute('DETACH DATABASE archivo')
+    
+    @contextmanager
+    def _conexion_archivo(self):
+        """Conexión del pool con la base de archivo adjunta como `archivo` (lecturas)"""
+        conn = self.get_connection()
+        try:
+            with self._archivo_adjunto(conn):
+                yield conn
+        finally:
+            conn.close()
+    
+    def _preparar_archivo(self, conn):
+        """
+        Crear o completar en `archivo` las tablas de cotizaciones (mismas columnas
+        que en main, sin llaves foráneas) y sus índices. Las columnas que agreguen
+        migraciones futuras se agregan aquí también.
+        
+        Returns:
+            {tabla: [columnas de main]}
+        """
+        conn.execute('PRAGMA archivo.journal_mode = WAL')
+        columnas_por_tabla = {}
+        
+        conn.execute('BEGIN IMMEDIATE')
+        for tabla in self.TABLAS_ARCHIVO:
+            columnas = [(row['name'], row['type']) for row in conn.execute(f'PRAGMA main.table_info({tabla})')]
+            existentes = {row['name'] for row in conn.execute(f'PRAGMA archivo.table_info({tabla})')}
+            
+            if not existentes:
+                definicion = ', '.join(
+                    f'{nombre} {tipo} PRIMARY KEY' if nombre == 'id' else f'{nombre} {tipo}'
+                    for nombre, tipo in columnas
+                )
+                extra = ', archivada_en TIMESTAMP' if tabla == 'cotizaciones' else ''
+                conn.execute(f'CREATE TABLE archivo.{tabla} ({definicion}{extra})')
+            else:
+                for nombre, tipo in columnas:
+                    if nombre not in existentes:
+                        conn.execute(f'ALTER TABLE archivo.{tabla} ADD COLUMN {nombre} {tipo}')
+            
+            # Los mismos índices que en main para que las consultas tengan el mismo plan
+            for indice in conn.execute(f'PRAGMA main.index_list({tabla})').fetchall():
+                if indice['origin'] != 'c' or indice['partial']:
+                    continue
+                partes = [
+                    f"{row['name']}{' DESC' if row['desc'] else ''}"
+                    for row in conn.execute(f"PRAGMA main.index_xinfo({indice['name']})")
+                    if row['key'] and row['name']
+                ]
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS archivo.{indice['name']} ON {tabla} ({', '.join(partes)})"
+                )
+            columnas_por_tabla[tabla] = [nombre for nombre, _ in columnas]
+        conn.commit()
+        return columnas_por_tabla
+    
+    def _copiar_lote_archivo(self, cursor, columnas_por_tabla, ids):
+        """Reemplazar en `archivo` la copia de las cotizaciones `ids` (con items y adjuntos)"""
+        marcas = ', '.join('?' * len(ids))
+        
+        cursor.execute(f'DELETE FROM archivo.cotizacion_adjuntos WHERE cotizacion_id IN ({marcas})', ids)
+        cursor.execute(f'DELETE FROM archivo.cotizacion_items WHERE cotizacion_id IN ({marcas})', ids)
+        cursor.execute(f'DELETE FROM archivo.cotizaciones WHERE id IN ({marcas})', ids)
+        
+        columnas = ', '.join(columnas_por_tabla['cotizaciones'])
+        cursor.execute(f'''
+            INSERT INTO archivo.cotizaciones ({columnas}, archivada_en)
+            SELECT {columnas}, CURRENT_TIMESTAMP FROM main.cotizaciones WHERE id IN ({marcas})
+        ''', ids)
+        copiadas = cursor.rowcount
+        for tabla in ('cotizacion_items', 'cotizacion_adjuntos'):
+            columnas = ', '.join(columnas_por_tabla[tabla])
+            cursor.execute(f'''
+                INSERT INTO archivo.{tabla} ({columnas})
+                SELECT {columnas} FROM main.{tabla} WHERE cotizacion_id IN ({marcas})
+            ''', ids)
+        return copiadas
+    
+    def archivar_cotizaciones(self, dias=None, dias_estado_final=None, tamano_lote=100, max_lotes=None, pausa=0.0):
+        """
+        Mover cotizaciones viejas a la base de archivo, por lotes pequeños.
+        
+        Se archivan las cotizaciones creadas hace más de `dias` días y las que
+        están en un estado de aprobación final (Config.ARCHIVO_ESTADOS_FINALES)
+        desde hace más de `dias_estado_final` (según fecha_aprobacion; las que
+        no la tienen, según fecha_creacion). Cada lote usa dos transacciones
+        cortas sobre la base adjunta:
+        
+        1. Copia (INSERT ... SELECT) al archivo, sin tocar la base principal.
+        2. Vuelve a copiar el lote (por si cambió entre ambas) y lo borra de
+           la principal (items, adjuntos y encabezado). En la bitácora de
+           cambios el borrado queda como operación 'archive', no como baja:
+           /api/changes las entrega en `archivados`.
+        
+        Con WAL el COMMIT de dos bases no es atómico ante una caída del equipo;
+        la copia previa del paso 1 garantiza que nunca se borre de la principal
+        algo que no esté ya en el archivo.
+        
+        Returns:
+            dict con cotizaciones archivadas, lotes y si quedaron pendientes
+            (al llegar a `max_lotes`)
+        """
+        dias = Config.ARCHIVO_DIAS if dias is None else dias
+        dias_estado_final = Config.ARCHIVO_DIAS_ESTADO_FINAL if dias_estado_final is None else dias_estado_final
+        estados_finales = [e.strip() for e in Config.ARCHIVO_ESTADOS_FINALES.split(',') if e.strip()]
+        
+        # La aprobación nunca es anterior a la creación: el primer rango sobre
+        # fecha_creacion acota ambos casos y recorre idx_cotizaciones_fecha
+        consulta_lote = f'''
+            SELECT id FROM main.cotizaciones
+            WHERE fecha_creacion < datetime('now', ?)
+              AND (fecha_creacion < datetime('now', ?)
+                   OR (estado_aprobacion IN ({', '.join('?' * len(estados_finales)) or 'NULL'})
+                       AND COALESCE(fecha_aprobacion, fecha_creacion) < datetime('now', ?)))
+            ORDER BY fecha_creacion, id
+            LIMIT ?
+        '''
+        params_lote = (
+            f'{-int(min(dias, dias_estado_final))} days', f'{-int(dias)} days', *estados_finales,
+            f'{-int(dias_estado_final)} days', tamano_lote
+        )
+        
+        def _preparar(conn):
+            with self._archivo_adjunto(conn):
+                return self._preparar_archivo(conn)
+        
+        def _archivar_lote(conn):
+            """Un lote en sus dos transacciones; None si ya no hay qué archivar"""
+            with self._archivo_adjunto(conn):
+                cursor = conn.cursor()
+                
+                # 1. Copia previa: la principal sólo se lee
+                cursor.execute('BEGIN IMMEDIATE')
+                cursor.execute(consulta_lote, params_lote)
+                ids = [row['id'] for row in cursor.fetchall()]
+                if not ids:
+                    return None
+                self._copiar_lote_archivo(cursor, columnas_por_tabla, ids)
+                conn.commit()
+                
+                # 2. Copia definitiva y borrado en la principal
+                cursor.execute('BEGIN IMMEDIATE')
+                marcas = ', '.join('?' * len(ids))
+                copiadas = self._copiar_lote_archivo(cursor, columnas_por_tabla, ids)
+                cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM main.cambios')
+                seq_previa = cursor.fetchone()[0]
+                cursor.execute(f'DELETE FROM main.cotizacion_adjuntos WHERE cotizacion_id IN ({marcas})', ids)
+                cursor.execute(f'DELETE FROM main.cotizacion_items WHERE cotizacion_id IN ({marcas})', ids)
+                cursor.execute(f'DELETE FROM main.cotizaciones WHERE id IN ({marcas})', ids)
+                # Las bajas que acaba de registrar el trigger son archivados, no borrados
+                cursor.execute('''
+                    UPDATE main.cambios SET operacion = 'archive'
+                    WHERE seq > ? AND tabla = 'cotizaciones' AND operacion = 'delete'
+                ''', (seq_previa,))
+                conn.commit()
+                return copiadas
+        
+        archivadas = 0
+        lotes = 0
+        pendientes = False
+        # Cada lote es una escritura exclusiva: con la cola activa la hace el
+        # hilo escritor entre sus lotes, sin competir por el lock
+        columnas_por_tabla = self._ejecutar_escritura_exclusiva(_preparar)
+        while True:
+            if max_lotes is not None and lotes >= max_lotes:
+                conn = self.get_connection()
+                try:
+                    pendientes = conn.execute(consulta_lote, params_lote[:-1] + (1,)).fetchone() is not None
+                finally:
+                    conn.close()
+                break
+            
+            copiadas = self._ejecutar_escritura_exclusiva(_archivar_lote)
+            if copiadas is None:
+                break
+            archivadas += copiadas
+            lotes += 1
+            if pausa:
+                # Dejar pasar a otros escritores entre lotes
+                time.sleep(pausa)
+        
+        return {'cotizaciones': archivadas, 'lotes': lotes, 'pendientes': pendientes}
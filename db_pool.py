@@ -0,0 +1,296 @@
+"""
+Pool de conexiones SQLite por proceso (worker de Gunicorn)
+
+Cada conexión se abre una sola vez con los PRAGMA de rendimiento
+(WAL, synchronous=NORMAL, caché, mmap) y se reutiliza entre peticiones.
+Las primitivas de sincronización vienen de `threading`/`queue`, por lo que
+con los workers gevent (monkey patching) el pool bloquea greenlets y no
+el hilo completo.
+
+Cada base tiene dos pools: el de lectura/escritura y uno de solo lectura
+(URI `mode=ro` + `PRAGMA query_only`) para las peticiones que sólo leen.
+Los lectores WAL nunca toman ni esperan el lock de escritura, así que las
+ráfagas de escrituras no afectan la latencia de los listados. El carril se
+elige por contexto (ContextVar, válido por hilo y por greenlet) con
+`usar_carril_lectura()`; app.py lo activa en los GET/HEAD.
+"""
+import contextvars
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+from config import Config
+from filas import Fila
+from instrumentacion_sql import ConexionInstrumentada, registrar_conexion, registrar_devolucion
+
+# True mientras el contexto actual (petición, greenlet) sólo lee
+_carril_lectura = contextvars.ContextVar('carril_lectura', default=False)
+
+
+def usar_carril_lectura(activo=True):
+    """Enviar las conexiones del contexto actual al pool de solo lectura; devuelve el token para restaurar"""
+    return _carril_lectura.set(activo)
+
+
+def restaurar_carril(token):
+    """Deshacer un usar_carril_lectura()"""
+    _carril_lectura.reset(token)
+
+
+def en_carril_lectura():
+    """Si el contexto actual usa el pool de solo lectura"""
+    return _carril_lectura.get()
+
+
+@contextmanager
+def carril_lectura():
+    """Bloque cuyas conexiones de Database.get_connection() son de solo lectura"""
+    token = usar_carril_lectura()
+    try:
+        yield
+    finally:
+        restaurar_carril(token)
+
+
+class PoolAgotadoError(sqlite3.OperationalError):
+    """No se obtuvo una conexión libre dentro del tiempo de espera"""
+
+
+def abrir_conexion(db_path, solo_lectura=False):
+    """
+    Abrir una conexión con la misma configuración que las del pool (PRAGMA,
+    filas `Fila`, instrumentación de SQL), fuera de cualquier pool: para
+    quien la conserva toda la vida del proceso (hilo de la cola de escritura).
+    """
+    # Conexiones cuyos cursores miden el SQL de cada petición (instrumentacion_sql.py)
+    clase_conexion = ConexionInstrumentada if Config.SQL_INSTRUMENTACION else sqlite3.Connection
+    if solo_lectura:
+        # Lector WAL: el modo (journal_mode) ya lo fijaron las conexiones de escritura
+        conn = sqlite3.connect(
+            f'file:{pathname2url(os.path.abspath(db_path))}?mode=ro',
+            uri=True,
+            timeout=Config.DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            factory=clase_conexion
+        )
+    else:
+        conn = sqlite3.connect(
+            db_path,
+            timeout=Config.DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            factory=clase_conexion
+        )
+    conn.row_factory = Fila
+    if solo_lectura:
+        conn.execute('PRAGMA query_only = ON')
+    else:
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute(f'PRAGMA cache_size = -{int(Config.DB_CACHE_SIZE_KB)}')
+    conn.execute(f'PRAGMA mmap_size = {int(Config.DB_MMAP_SIZE)}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+
+class PooledConnection:
+    """Conexión prestada por el pool; `close()` la devuelve en lugar de cerrarla"""
+
+    __slots__ = ('_conn', '_pool', '_prestada_en')
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+        self._prestada_en = time.perf_counter()
+
+    def __getattr__(self, nombre):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('La conexión ya fue devuelta al pool')
+        return getattr(self._conn, nombre)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    @property
+    def raw(self):
+        """Conexión sqlite3 subyacente"""
+        return self._conn
+
+    def close(self):
+        """Devolver la conexión al pool (descarta transacciones abiertas)"""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool._devolver(conn, time.perf_counter() - self._prestada_en)
+
+    def __del__(self):
+        # Red de seguridad para métodos que olvidan cerrar la conexión
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Pool acotado de conexiones SQLite configuradas una sola vez"""
+
+    def __init__(self, db_path, max_size=None, timeout=None, solo_lectura=False):
+        self.db_path = db_path
+        self.solo_lectura = solo_lectura
+        self.max_size = max_size or (Config.DB_POOL_LECTURA_SIZE if solo_lectura else Config.DB_POOL_SIZE)
+        self.timeout = timeout if timeout is not None else Config.DB_POOL_TIMEOUT
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        """Estado vacío del pool (también tras un fork del proceso)"""
+        self._pid = os.getpid()
+        self._libres = queue.LifoQueue()
+        self._abiertas = 0
+        self._en_uso = 0
+        self._stats = {
+            'conexiones_abiertas_total': 0,
+            'prestamos': 0,
+            'esperas': 0,
+            'timeouts': 0,
+            'espera_total_ms': 0.0,
+            'espera_max_ms': 0.0,
+            'uso_total_ms': 0.0,
+            'uso_max_ms': 0.0,
+        }
+
+    def _crear_conexion(self):
+        """Abrir y configurar una conexión nueva"""
+        conn = abrir_conexion(self.db_path, self.solo_lectura)
+        with self._lock:
+            self._stats['conexiones_abiertas_total'] += 1
+        return conn
+
+    def acquire(self):
+        """Prestar una conexión; espera si el pool está lleno"""
+        if os.getpid() != self._pid:
+            # Proceso hijo tras fork: las conexiones heredadas no se reutilizan
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reiniciar()
+
+        inicio = time.perf_counter()
+        conn = None
+        try:
+            conn = self._libres.get_nowait()
+        except queue.Empty:
+            crear = False
+            with self._lock:
+                if self._abiertas < self.max_size:
+                    self._abiertas += 1
+                    crear = True
+            if crear:
+                try:
+                    conn = self._crear_conexion()
+                except Exception:
+                    with self._lock:
+                        self._abiertas -= 1
+                    raise
+            else:
+                with self._lock:
+                    self._stats['esperas'] += 1
+                try:
+                    conn = self._libres.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolAgotadoError(
+                        f'No hay conexiones libres después de {self.timeout}s '
+                        f'(pool de {self.max_size})'
+                    )
+
+        espera_ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self._en_uso += 1
+            self._stats['prestamos'] += 1
+            self._stats['espera_total_ms'] += espera_ms
+            self._stats['espera_max_ms'] = max(self._stats['espera_max_ms'], espera_ms)
+        registrar_conexion(conn)
+        return PooledConnection(conn, self)
+
+    def _devolver(self, conn, uso_s):
+        """Regresar una conexión al pool"""
+        uso_ms = uso_s * 1000
+        registrar_devolucion(conn, uso_s)
+        with self._lock:
+            self._en_uso -= 1
+            self._stats['uso_total_ms'] += uso_ms
+            self._stats['uso_max_ms'] = max(self._stats['uso_max_ms'], uso_ms)
+
+        if os.getpid() != self._pid:
+            return
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Conexión inservible: se descarta y se libera su lugar
+            with self._lock:
+                self._abiertas -= 1
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+
+        self._libres.put(conn)
+
+    def close_all(self):
+        """Cerrar las conexiones libres (las prestadas se cierran al devolverse)"""
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._abiertas -= 1
+            conn.close()
+
+    def stats(self):
+        """Métricas del pool para monitoreo"""
+        with self._lock:
+            datos = dict(self._stats)
+            datos.update({
+                'db_path': self.db_path,
+                'solo_lectura': self.solo_lectura,
+                'pid': self._pid,
+                'tamano_max': self.max_size,
+                'abiertas': self._abiertas,
+                'en_uso': self._en_uso,
+                'libres': self._libres.qsize(),
+            })
+        prestamos = datos['prestamos'] or 1
+        datos['espera_promedio_ms'] = round(datos['espera_total_ms'] / prestamos, 3)
+        datos['uso_promedio_ms'] = round(datos['uso_total_ms'] / prestamos, 3)
+        for clave in ('espera_total_ms', 'espera_max_ms', 'uso_total_ms', 'uso_max_ms'):
+            datos[clave] = round(datos[clave], 3)
+        return datos
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, solo_lectura=False):
+    """Pool compartido por todas las instancias de Database del proceso"""
+    clave = (os.path.abspath(db_path), solo_lectura)
+    pool = _pools.get(clave)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(clave)
+            if pool is None:
+                pool = ConnectionPool(db_path, solo_lectura=solo_lectura)
+                _pools[clave] = pool
+    return pool
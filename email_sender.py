@@ -5,6 +5,7 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from email.utils import formataddr
 from config import Config
+from metricas import medir_duracion
 
 class EmailSender:
     """Manejador de envío de correos electrónicos"""
@@ -32,6 +33,7 @@ class EmailSender:
 
         return True, "Configuración de email correcta"
     
+    @medir_duracion('cotizador_smtp_send_duration_seconds', kind='cotizacion')
     def enviar_cotizacion_email(self, destinatario, cotizacion_data, pdf_path=None, adjuntos=None):
         """
         Enviar cotización por correo electrónico
@@ -297,6 +299,7 @@ class EmailSender:
         
         return html
     
+    @medir_duracion('cotizador_smtp_send_duration_seconds', kind='confirmacion_aprobacion')
     def enviar_confirmacion_aprobacion(self, destinatario, cotizacion_data, estado, comentarios=''):
         """
         Enviar email de confirmación de aprobación/rechazo al cliente
@@ -0,0 +1,71 @@
+"""
+Filas de resultados de SQLite sin pasos intermedios por fila
+
+`Fila` es la row_factory de las conexiones del pool: una sqlite3.Row (los
+valores viven en la tupla de SQLite y los nombres de columna se comparten
+con el cursor) que además se comporta como un diccionario de solo lectura
+(get, `in` por nombre de columna).
+
+Los listados grandes devuelven `FilaDict`: se leen como tuplas (cursor sin
+row_factory) y se arman en una sola pasada con los nombres de columna de
+`cursor.description`, tomados una vez por consulta. Al ser un dict, orjson
+la codifica en C sin volver a Python por cada fila (sqlite3.Row necesita el
+hook `default` del proveedor JSON para cada una); y como es de solo lectura
+se puede compartir entre peticiones, como en la caché del catálogo.
+"""
+import sqlite3
+
+
+class Fila(sqlite3.Row):
+    """Fila de solo lectura con acceso por nombre o por posición"""
+
+    __slots__ = ()
+
+    def get(self, clave, defecto=None):
+        try:
+            return self[clave]
+        except (IndexError, KeyError):
+            return defecto
+
+    def __contains__(self, clave):
+        return clave in self.keys()
+
+    def como_dict(self):
+        """Copia modificable de la fila"""
+        return dict(zip(self.keys(), self))
+
+
+class FilaDict(dict):
+    """Fila de un listado: diccionario de solo lectura"""
+
+    __slots__ = ()
+
+    def _solo_lectura(self, *args, **kwargs):
+        raise TypeError('Fila de solo lectura; como_dict() da una copia modificable')
+
+    __setitem__ = __delitem__ = __ior__ = _solo_lectura
+    update = pop = popitem = clear = setdefault = _solo_lectura
+
+    def como_dict(self):
+        """Copia modificable de la fila"""
+        return dict(self)
+
+
+def cursor_tuplas(conn):
+    """Cursor de `conn` que entrega tuplas (sin la row_factory de la conexión)"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def filas_dict(cursor, tuplas):
+    """Tuplas leídas de `cursor` como FilaDict (nombres de columna tomados una sola vez)"""
+    claves = [columna[0] for columna in cursor.description]
+    return [FilaDict(zip(claves, tupla)) for tupla in tuplas]
+
+
+def consultar_filas(conn, sql, params=()):
+    """Todas las filas de `sql` como FilaDict"""
+    cursor = cursor_tuplas(conn)
+    cursor.execute(sql, params)
+    return filas_dict(cursor, cursor.fetchall())
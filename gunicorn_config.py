@@ -4,6 +4,17 @@ Sistema de Cotización - Integrational3
 """
 import multiprocessing
 import os
+import tempfile
+
+from dotenv import load_dotenv
+
+# Métricas de Prometheus sumadas entre workers (metricas.py): los workers
+# heredan METRICAS_DIR del master (el de .env o uno temporal)
+load_dotenv()
+if not os.environ.get('METRICAS_DIR'):
+    os.environ['METRICAS_DIR'] = os.path.join(tempfile.gettempdir(), 'cotizador_metricas')
+
+import metricas  # noqa: E402
 
 # Server Socket
 bind = '0.0.0.0:5000'
@@ -50,6 +61,8 @@ tmp_upload_dir = None
 
 def on_starting(server):
     """Llamado justo antes de que el master inicie"""
+    # Sin restos de una ejecución anterior (procesos que ya no existen)
+    metricas.limpiar_directorio(os.environ['METRICAS_DIR'])
     print("=" * 60)
     print("Sistema de Cotización - Integrational3")
     print("Iniciando servidor Gunicorn...")
@@ -73,3 +86,11 @@ def worker_int(worker):
 def worker_abort(worker):
     """Llamado cuando un worker recibe la señal SIGABRT"""
     print(f"Worker abortado: {worker.pid}")
+
+def worker_exit(server, worker):
+    """Llamado en el worker al terminar: vuelca sus últimas métricas"""
+    metricas.registro.escribir(os.environ['METRICAS_DIR'])
+
+def child_exit(server, worker):
+    """Llamado en el master cuando un worker termina: integra sus métricas al acumulado"""
+    metricas.proceso_terminado(worker.pid, os.environ['METRICAS_DIR'])
@@ -0,0 +1,271 @@
+"""
+Importación masiva de productos desde listas de precios CSV o XLSX
+
+Los archivos se leen fila por fila (CSV con el módulo csv; XLSX leyendo el
+XML de la hoja con iterparse, sin dependencias extra), se validan y se
+insertan o actualizan por `codigo` en lotes con Database.importar_productos.
+
+Uso:
+    python importar_productos.py lista_precios.xlsx [--lote 1000] [--encoding cp1252]
+"""
+import argparse
+import csv
+import io
+import math
+import os
+import re
+import time
+import unicodedata
+import zipfile
+import xml.etree.ElementTree as ET
+
+from database import Database
+
+# Encabezados aceptados (sin acentos, en minúsculas) -> columna de productos
+ALIAS_COLUMNAS = {
+    'codigo': 'codigo',
+    'clave': 'codigo',
+    'sku': 'codigo',
+    'nombre': 'nombre',
+    'producto': 'nombre',
+    'descripcion': 'descripcion',
+    'tipo': 'tipo',
+    'precio': 'precio',
+    'precio unitario': 'precio',
+    'precio_unitario': 'precio',
+    'unidad': 'unidad',
+    'categoria': 'categoria',
+}
+COLUMNAS_REQUERIDAS = ('codigo', 'nombre', 'precio')
+TIPOS_VALIDOS = ('producto', 'servicio')
+MAX_ERRORES_REPORTADOS = 100
+
+_NS_XLSX = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+class ImportacionError(ValueError):
+    """El archivo no se puede importar (formato o encabezados inválidos)"""
+
+
+def _normalizar_encabezado(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return ' '.join(texto.lower().split())
+
+
+# ==========================================
+# LECTORES (generadores de listas de celdas)
+# ==========================================
+
+def leer_csv(archivo, encoding='utf-8-sig'):
+    """Filas de un CSV binario; el delimitador (, ; tab |) se detecta con una muestra"""
+    texto = io.TextIOWrapper(archivo, encoding=encoding, newline='')
+    muestra = texto.read(8192)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t|')
+    except csv.Error:
+        dialecto = csv.excel
+    try:
+        yield from csv.reader(texto, dialecto)
+    finally:
+        texto.detach()
+
+
+def _columna_xlsx(referencia):
+    """'C7' -> 2"""
+    indice = 0
+    for letra in re.match(r'[A-Z]+', referencia).group():
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+def _ruta_primera_hoja(libro):
+    """Ruta dentro del zip de la primera hoja del libro"""
+    workbook = ET.fromstring(libro.read('xl/workbook.xml'))
+    hoja = workbook.find(f'{_NS_XLSX}sheets/{_NS_XLSX}sheet')
+    if hoja is None:
+        raise ImportacionError('El libro no tiene hojas')
+    rel_id = hoja.get(f'{_NS_REL}id')
+
+    relaciones = ET.fromstring(libro.read('xl/_rels/workbook.xml.rels'))
+    for relacion in relaciones:
+        if relacion.get('Id') == rel_id:
+            destino = relacion.get('Target').lstrip('/')
+            return destino if destino.startswith('xl/') else f'xl/{destino}'
+    raise ImportacionError('No se encontró la primera hoja del libro')
+
+
+def _cadenas_compartidas(libro):
+    if 'xl/sharedStrings.xml' not in libro.namelist():
+        return []
+    cadenas = []
+    with libro.open('xl/sharedStrings.xml') as xml:
+        for _, elemento in ET.iterparse(xml):
+            if elemento.tag == f'{_NS_XLSX}si':
+                cadenas.append(''.join(t.text or '' for t in elemento.iter(f'{_NS_XLSX}t')))
+                elemento.clear()
+    return cadenas
+
+
+def leer_xlsx(archivo):
+    """Filas de la primera hoja de un XLSX, leídas en streaming"""
+    try:
+        libro = zipfile.ZipFile(archivo)
+    except zipfile.BadZipFile:
+        raise ImportacionError('El archivo no es un XLSX válido')
+
+    with libro:
+        cadenas = _cadenas_compartidas(libro)
+        with libro.open(_ruta_primera_hoja(libro)) as xml:
+            for _, elemento in ET.iterparse(xml):
+                if elemento.tag != f'{_NS_XLSX}row':
+                    continue
+                fila = []
+                for celda in elemento.iter(f'{_NS_XLSX}c'):
+                    indice = _columna_xlsx(celda.get('r')) if celda.get('r') else len(fila)
+                    tipo = celda.get('t')
+                    valor = celda.find(f'{_NS_XLSX}v')
+                    if tipo == 'inlineStr':
+                        texto = ''.join(t.text or '' for t in celda.iter(f'{_NS_XLSX}t'))
+                    elif valor is None:
+                        texto = ''
+                    elif tipo == 's':
+                        texto = cadenas[int(valor.text)]
+                    else:
+                        texto = valor.text or ''
+                    fila.extend([''] * (indice - len(fila)))
+                    fila.append(texto)
+                yield fila
+                elemento.clear()
+
+
+def leer_filas(archivo, nombre_archivo, encoding='utf-8-sig'):
+    """Elegir el lector por la extensión del archivo"""
+    extension = os.path.splitext(nombre_archivo or '')[1].lower()
+    if extension == '.xlsx':
+        return leer_xlsx(archivo)
+    if extension in ('.csv', '.txt'):
+        return leer_csv(archivo, encoding)
+    raise ImportacionError('Formato no soportado: use CSV o XLSX')
+
+
+# ==========================================
+# VALIDACIÓN
+# ==========================================
+
+def _precio(texto):
+    """'$1,980.50' -> 1980.5"""
+    limpio = str(texto).replace('$', '').replace(',', '').strip()
+    precio = float(limpio)
+    # float() acepta 'nan' e 'inf'; NaN llegaría como NULL a precio NOT NULL
+    if not math.isfinite(precio):
+        raise ValueError('no finito')
+    if precio < 0:
+        raise ValueError('negativo')
+    return round(precio, 2)
+
+
+def validar_filas(filas, errores, max_errores=MAX_ERRORES_REPORTADOS):
+    """
+    Convertir las filas crudas (la primera es el encabezado) en productos válidos.
+
+    Returns:
+        (columnas, generador de diccionarios). Las filas rechazadas se agregan
+        a `errores` como {'fila', 'codigo', 'error'} (hasta `max_errores`) y se
+        cuentan en errores.total.
+    """
+    filas = iter(filas)
+    try:
+        encabezado = next(filas)
+    except StopIteration:
+        raise ImportacionError('El archivo está vacío')
+
+    posiciones = {}
+    for indice, nombre in enumerate(encabezado):
+        columna = ALIAS_COLUMNAS.get(_normalizar_encabezado(nombre))
+        if columna and columna not in posiciones:
+            posiciones[columna] = indice
+
+    faltantes = [c for c in COLUMNAS_REQUERIDAS if c not in posiciones]
+    if faltantes:
+        raise ImportacionError(f"Faltan columnas requeridas: {', '.join(faltantes)}")
+
+    columnas = tuple(posiciones)
+
+    def _productos():
+        for numero, fila in enumerate(filas, start=2):
+            if not any(str(celda).strip() for celda in fila):
+                continue
+            valores = {
+                columna: str(fila[indice]).strip() if indice < len(fila) else ''
+                for columna, indice in posiciones.items()
+            }
+            try:
+                if not valores['codigo']:
+                    raise ValueError('código vacío')
+                if not valores['nombre']:
+                    raise ValueError('nombre vacío')
+                try:
+                    valores['precio'] = _precio(valores['precio'])
+                except ValueError:
+                    raise ValueError(f"precio inválido: {valores['precio']!r}")
+                if 'tipo' in valores:
+                    valores['tipo'] = valores['tipo'].lower() or 'producto'
+                    if valores['tipo'] not in TIPOS_VALIDOS:
+                        raise ValueError(f"tipo inválido: {valores['tipo']!r}")
+                if 'unidad' in valores:
+                    valores['unidad'] = valores['unidad'] or 'pza'
+            except ValueError as e:
+                errores.total += 1
+                if len(errores) < max_errores:
+                    errores.append({'fila': numero, 'codigo': valores.get('codigo', ''), 'error': str(e)})
+                continue
+            yield valores
+
+    return columnas, _productos()
+
+
+class _Errores(list):
+    """Lista de errores reportados más el total (incluye los no listados)"""
+    total = 0
+
+
+def importar_archivo(db, archivo, nombre_archivo, tamano_lote=1000, encoding='utf-8-sig'):
+    """
+    Importar un archivo CSV/XLSX (objeto binario) de productos.
+
+    Returns:
+        dict con insertados, actualizados, sin_cambios, duplicados,
+        rechazados, errores (primeros MAX_ERRORES_REPORTADOS) y segundos
+    """
+    inicio = time.perf_counter()
+    errores = _Errores()
+    columnas, productos = validar_filas(leer_filas(archivo, nombre_archivo, encoding), errores)
+    resultado = db.importar_productos(columnas, productos, tamano_lote)
+    resultado.update({
+        'rechazados': errores.total,
+        'errores': list(errores),
+        'segundos': round(time.perf_counter() - inicio, 3),
+    })
+    return resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Importar productos desde CSV o XLSX')
+    parser.add_argument('archivo', help='lista de precios (.csv o .xlsx)')
+    parser.add_argument('--lote', type=int, default=1000, help='filas por transacción')
+    parser.add_argument('--encoding', default='utf-8-sig', help='codificación del CSV (p. ej. cp1252)')
+    args = parser.parse_args()
+
+    with open(args.archivo, 'rb') as archivo:
+        resultado = importar_archivo(Database(), archivo, args.archivo, args.lote, args.encoding)
+
+    print(f"✓ Insertados: {resultado['insertados']}")
+    print(f"✓ Actualizados: {resultado['actualizados']}")
+    print(f"  Sin cambios: {resultado['sin_cambios']}")
+    print(f"  Duplicados en el archivo: {resultado['duplicados']}")
+    print(f"✗ Rechazados: {resultado['rechazados']}")
+    for error in resultado['errores']:
+        print(f"    fila {error['fila']} ({error['codigo'] or 'sin código'}): {error['error']}")
+    print(f"Tiempo: {resultado['segundos']}s")
@@ -0,0 +1,205 @@
+"""
+Instrumentación de SQL por petición
+
+Las conexiones del pool se abren con `ConexionInstrumentada`, cuyos cursores
+miden cada execute/executemany (y el tiempo de los fetch). Mientras una
+petición de Flask está activa (ContextVar, válido por hilo y por greenlet)
+se acumulan en sus `EstadisticasSQL`: sentencias, tiempo total de SQL,
+conexiones prestadas por el pool, la sentencia más lenta y cuántas veces se
+ejecutó cada forma de sentencia. app.py las publica en la cabecera
+Server-Timing y, en modo debug, avisa de posibles N+1.
+
+Las sentencias que tardan más de Config.SQL_LENTA_MS se registran siempre
+(también fuera de peticiones) en el logger `instrumentacion_sql` con la forma
+de sus parámetros (tipos, no valores, para no llevar datos de clientes al log).
+
+Apagada por omisión (Config.SQL_INSTRUMENTACION): cada sentencia pasa por
+los envoltorios en Python de esta capa. Sin ellos cada petición sigue
+acumulando lo que publica /metrics a bajo costo: el tiempo con conexiones
+prestadas por el pool y el número de sentencias, contadas por SQLite con el
+trace callback de la conexión (sólo mientras está prestada a una petición).
+"""
+import contextvars
+import logging
+import sqlite3
+import time
+from functools import lru_cache
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_peticion = contextvars.ContextVar('estadisticas_sql', default=None)
+
+# Largo máximo de una sentencia en el log y en los avisos
+LARGO_MAX_SENTENCIA = 300
+
+
+class EstadisticasSQL:
+    """Acumulado de SQL de una petición"""
+
+    __slots__ = ('sentencias', 'tiempo_s', 'conexiones', 'conexion_s', 'lenta_s', 'lenta', 'formas')
+
+    def __init__(self):
+        self.sentencias = 0
+        self.tiempo_s = 0.0
+        self.conexiones = 0
+        self.conexion_s = 0.0
+        self.lenta_s = 0.0
+        self.lenta = None
+        self.formas = {}
+
+    def registrar(self, forma, duracion_s):
+        self.sentencias += 1
+        self.tiempo_s += duracion_s
+        self.formas[forma] = self.formas.get(forma, 0) + 1
+        if duracion_s > self.lenta_s:
+            self.lenta_s = duracion_s
+            self.lenta = forma
+
+    def server_timing(self, detalle=False):
+        """Valor de la cabecera Server-Timing (la sentencia más lenta sólo con detalle, en debug)"""
+        metricas = [
+            f'db;dur={self.tiempo_s * 1000:.2f};desc="{self.sentencias} sentencias, {self.conexiones} conexiones"'
+        ]
+        if self.lenta is not None:
+            desc = self.lenta[:120].replace('\\', '\\\\').replace('"', '\\"') if detalle else 'sentencia más lenta'
+            metricas.append(f'db-max;dur={self.lenta_s * 1000:.2f};desc="{desc}"')
+        return ', '.join(metricas)
+
+    def repetidas(self, umbral):
+        """Formas de sentencia ejecutadas más de `umbral` veces: [(forma, veces)] de mayor a menor"""
+        return sorted(
+            ((forma, veces) for forma, veces in self.formas.items() if veces > umbral),
+            key=lambda par: -par[1]
+        )
+
+
+def iniciar_peticion():
+    """Empezar a acumular el SQL del contexto actual; devuelve el token para finalizar"""
+    return _peticion.set(EstadisticasSQL())
+
+
+def finalizar_peticion(token):
+    _peticion.reset(token)
+
+
+def estadisticas_actuales():
+    """EstadisticasSQL de la petición en curso (None fuera de una petición)"""
+    return _peticion.get()
+
+
+def contar_sentencia(sql):
+    """Trace callback de las conexiones sin envoltorios: una sentencia más en la petición en curso"""
+    estadisticas = _peticion.get()
+    # Las sentencias de los triggers llegan como "-- TRIGGER nombre"
+    if estadisticas is not None and not sql.startswith('--'):
+        estadisticas.sentencias += 1
+
+
+def registrar_conexion(conn):
+    """Contar un préstamo de conexión del pool en la petición en curso"""
+    estadisticas = _peticion.get()
+    if estadisticas is not None:
+        estadisticas.conexiones += 1
+        if not isinstance(conn, ConexionInstrumentada):
+            conn.set_trace_callback(contar_sentencia)
+
+
+def registrar_devolucion(conn, uso_s):
+    """Sumar el tiempo que la petición en curso tuvo prestada la conexión y dejar de contar sus sentencias"""
+    estadisticas = _peticion.get()
+    if estadisticas is not None:
+        estadisticas.conexion_s += uso_s
+        if not isinstance(conn, ConexionInstrumentada):
+            conn.set_trace_callback(None)
+
+
+def tiempo_db_s(estadisticas):
+    """Tiempo de base de la petición: SQL medido si hay envoltorios, si no el de conexiones prestadas"""
+    return estadisticas.tiempo_s if Config.SQL_INSTRUMENTACION else estadisticas.conexion_s
+
+
+@lru_cache(maxsize=2048)
+def forma_sentencia(sql):
+    """SQL en una sola línea (los valores van como parámetros, así que es la forma de la sentencia)"""
+    return ' '.join(sql.split())
+
+
+def forma_parametros(parametros):
+    """Tipos de los parámetros ligados: (int, str, NoneType) o {nombre: tipo}"""
+    if isinstance(parametros, dict):
+        return '{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in parametros.items()) + '}'
+    return '(' + ', '.join(type(v).__name__ for v in parametros) + ')'
+
+
+def _registrar(sql, parametros, duracion_s, filas_lote=None):
+    forma = forma_sentencia(sql)
+    estadisticas = _peticion.get()
+    if estadisticas is not None:
+        estadisticas.registrar(forma, duracion_s)
+    if duracion_s * 1000 >= Config.SQL_LENTA_MS:
+        lote = f' x{filas_lote}' if filas_lote is not None else ''
+        logger.warning('Sentencia lenta (%.1f ms): %s params=%s%s', duracion_s * 1000,
+                       forma[:LARGO_MAX_SENTENCIA], forma_parametros(parametros), lote)
+
+
+def _sumar_tiempo(duracion_s):
+    estadisticas = _peticion.get()
+    if estadisticas is not None:
+        estadisticas.tiempo_s += duracion_s
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor que mide sus sentencias (execute) y lecturas (fetch)"""
+
+    def execute(self, sql, parameters=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _registrar(sql, parameters, time.perf_counter() - inicio)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Se materializa para registrar la forma y el tamaño del lote
+        lote = seq_of_parameters if isinstance(seq_of_parameters, (list, tuple)) else list(seq_of_parameters)
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, lote)
+        finally:
+            _registrar(sql, lote[0] if lote else (), time.perf_counter() - inicio, len(lote))
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            _sumar_tiempo(time.perf_counter() - inicio)
+
+    def fetchmany(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchmany(*args, **kwargs)
+        finally:
+            _sumar_tiempo(time.perf_counter() - inicio)
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            _sumar_tiempo(time.perf_counter() - inicio)
+
+
+class ConexionInstrumentada(sqlite3.Connection):
+    """Conexión cuyos cursores (también los de conn.execute) son CursorInstrumentado"""
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    # Los atajos de Connection crean su cursor en C sin pasar por cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
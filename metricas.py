@@ -0,0 +1,261 @@
+"""
+Métricas de la aplicación en formato de texto de Prometheus
+
+Cada proceso (worker de Gunicorn) acumula sus métricas en memoria y cada
+Config.METRICAS_INTERVALO_SEGUNDOS las vuelca a `proceso_<pid>.json` dentro
+de Config.METRICAS_DIR (escritura atómica con os.replace). /metrics suma los
+archivos de todos los procesos vivos más `acumulado.json`, donde el master
+(hook child_exit de gunicorn_config.py) integra los contadores e histogramas
+de los workers que terminan; los medidores (peticiones en curso) de un
+worker terminado se descartan. Sin METRICAS_DIR sólo se reporta el proceso
+actual.
+
+Sólo biblioteca estándar: no se depende de prometheus_client.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from functools import wraps
+
+from config import Config
+
+CUBETAS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CUBETAS_TAMANO = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+CUBETAS_LENTAS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# nombre: (tipo, ayuda, cubetas)
+METRICAS = {
+    'cotizador_http_requests_total': ('counter', 'Peticiones HTTP atendidas', None),
+    'cotizador_http_request_duration_seconds': ('histogram', 'Latencia de las peticiones HTTP', CUBETAS_LATENCIA),
+    'cotizador_http_response_size_bytes': ('histogram', 'Tamaño del cuerpo de las respuestas HTTP', CUBETAS_TAMANO),
+    'cotizador_http_requests_in_flight': ('gauge', 'Peticiones HTTP en curso', None),
+    'cotizador_db_request_duration_seconds': ('histogram', 'Tiempo de base por petición HTTP (SQL medido con SQL_INSTRUMENTACION; si no, conexiones prestadas)', CUBETAS_LATENCIA),
+    'cotizador_db_statements_total': ('counter', 'Sentencias SQL ejecutadas en peticiones HTTP', None),
+    'cotizador_pdf_render_duration_seconds': ('histogram', 'Duración de la generación de PDFs', CUBETAS_LENTAS),
+    'cotizador_smtp_send_duration_seconds': ('histogram', 'Duración de los envíos por SMTP', CUBETAS_LENTAS),
+}
+
+ARCHIVO_ACUMULADO = 'acumulado.json'
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted(etiquetas.items()))
+
+
+class Registro:
+    """Métricas del proceso actual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        """Registro vacío (también tras un fork del proceso)"""
+        self._pid = os.getpid()
+        self._id = uuid.uuid4().hex
+        self._series = {}
+        self._escrito_en = time.monotonic()
+
+    def _verificar_proceso(self):
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reiniciar()
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        """Sumar a un contador o medidor (valor negativo para bajar un medidor)"""
+        self._verificar_proceso()
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        """Registrar una observación en un histograma"""
+        self._verificar_proceso()
+        cubetas = METRICAS[nombre][2]
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                # Conteo por cubeta (no acumulado), +Inf, suma
+                serie = self._series[clave] = [0] * (len(cubetas) + 1) + [0.0]
+            indice = next((i for i, limite in enumerate(cubetas) if valor <= limite), len(cubetas))
+            serie[indice] += 1
+            serie[-1] += valor
+
+    def instantanea(self):
+        """Copia de las series: {(nombre, etiquetas): valor | [cubetas..., suma]}"""
+        self._verificar_proceso()
+        with self._lock:
+            return {clave: list(valor) if isinstance(valor, list) else valor
+                    for clave, valor in self._series.items()}
+
+    def escribir(self, directorio=None):
+        """Volcar las series del proceso a su archivo en el directorio de métricas"""
+        directorio = directorio or Config.METRICAS_DIR
+        if not directorio:
+            return
+        self._verificar_proceso()
+        self._escrito_en = time.monotonic()
+        _escribir_json(os.path.join(directorio, f'proceso_{self._pid}.json'),
+                       {'id': self._id, 'series': _serializar(self.instantanea())})
+
+    def tal_vez_escribir(self):
+        """Escribir si ya pasó el intervalo desde la última escritura"""
+        if Config.METRICAS_DIR and time.monotonic() - self._escrito_en >= Config.METRICAS_INTERVALO_SEGUNDOS:
+            self.escribir()
+
+
+def _serializar(series):
+    return [[nombre, [list(par) for par in etiquetas], valor] for (nombre, etiquetas), valor in series.items()]
+
+
+def _deserializar(datos):
+    return {(nombre, tuple(tuple(par) for par in etiquetas)): valor for nombre, etiquetas, valor in datos}
+
+
+def _escribir_json(ruta, datos):
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, separators=(',', ':'))
+    os.replace(temporal, ruta)
+
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        # Archivo borrado entre el listado y la lectura (worker integrado)
+        return None
+
+
+def _sumar(destino, series, incluir_medidores=True):
+    for clave, valor in series.items():
+        if not incluir_medidores and METRICAS.get(clave[0], ('gauge',))[0] == 'gauge':
+            continue
+        if isinstance(valor, list):
+            actual = destino.get(clave)
+            destino[clave] = [a + b for a, b in zip(actual, valor)] if actual else list(valor)
+        else:
+            destino[clave] = destino.get(clave, 0) + valor
+
+
+def combinar(directorio=None):
+    """Series de todos los procesos (vivos y terminados) sumadas"""
+    directorio = directorio or Config.METRICAS_DIR
+    if not directorio:
+        return registro.instantanea()
+    registro.escribir(directorio)
+
+    total = {}
+    acumulado = _leer_json(os.path.join(directorio, ARCHIVO_ACUMULADO)) or {}
+    integrados = set(acumulado.get('integrados', ()))
+    _sumar(total, _deserializar(acumulado.get('series', ())))
+    for nombre in os.listdir(directorio):
+        if not (nombre.startswith('proceso_') and nombre.endswith('.json')):
+            continue
+        datos = _leer_json(os.path.join(directorio, nombre))
+        if datos and datos['id'] not in integrados:
+            _sumar(total, _deserializar(datos['series']))
+    return total
+
+
+def proceso_terminado(pid, directorio=None):
+    """
+    Integrar en acumulado.json los contadores e histogramas de un worker que
+    terminó y borrar su archivo (lo llama el master de Gunicorn).
+
+    acumulado.json guarda el id del archivo integrado, así quien lea entre la
+    escritura del acumulado y el borrado no lo cuenta dos veces.
+    """
+    directorio = directorio or Config.METRICAS_DIR
+    if not directorio:
+        return
+    ruta = os.path.join(directorio, f'proceso_{pid}.json')
+    datos = _leer_json(ruta)
+    if datos is None:
+        return
+
+    ruta_acumulado = os.path.join(directorio, ARCHIVO_ACUMULADO)
+    acumulado = _leer_json(ruta_acumulado) or {}
+    series = _deserializar(acumulado.get('series', ()))
+    _sumar(series, _deserializar(datos['series']), incluir_medidores=False)
+    _escribir_json(ruta_acumulado, {'integrados': [datos['id']], 'series': _serializar(series)})
+    os.remove(ruta)
+
+
+def limpiar_directorio(directorio=None):
+    """Borrar los archivos de una ejecución anterior (al arrancar el master)"""
+    directorio = directorio or Config.METRICAS_DIR
+    if not directorio:
+        return
+    os.makedirs(directorio, exist_ok=True)
+    for nombre in os.listdir(directorio):
+        if nombre.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directorio, nombre))
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{_escapar(v)}"' for k, v in pares) + '}'
+
+
+def _numero(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+def exposicion(series):
+    """Texto de exposición de Prometheus (versión 0.0.4)"""
+    lineas = []
+    for nombre, (tipo, ayuda, cubetas) in METRICAS.items():
+        propias = sorted((etiquetas, valor) for (n, etiquetas), valor in series.items() if n == nombre)
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        for etiquetas, valor in propias:
+            if tipo != 'histogram':
+                lineas.append(f'{nombre}{_etiquetas(etiquetas)} {_numero(valor)}')
+                continue
+            acumulado = 0
+            for limite, cuenta in zip(cubetas + ('+Inf',), valor[:-1]):
+                acumulado += cuenta
+                lineas.append(f'{nombre}_bucket{_etiquetas(etiquetas + (("le", _numero(limite)),))} {acumulado}')
+            lineas.append(f'{nombre}_sum{_etiquetas(etiquetas)} {_numero(valor[-1])}')
+            lineas.append(f'{nombre}_count{_etiquetas(etiquetas)} {acumulado}')
+    return '\n'.join(lineas) + '\n'
+
+
+def _exitoso(valor):
+    """Resultado de funciones que devuelven bool o (éxito, mensaje)"""
+    if isinstance(valor, tuple):
+        return bool(valor and valor[0])
+    return bool(valor)
+
+
+def medir_duracion(nombre, **etiquetas):
+    """Decorador: observar la duración de la función en el histograma `nombre` con result=ok|error"""
+    def decorador(fn):
+        @wraps(fn)
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            resultado = 'error'
+            try:
+                valor = fn(*args, **kwargs)
+                resultado = 'ok' if _exitoso(valor) else 'error'
+                return valor
+            finally:
+                registro.observar(nombre, time.perf_counter() - inicio, result=resultado, **etiquetas)
+        return envoltura
+    return decorador
+
+
+registro = Registro()
@@ -0,0 +1,639 @@
+"""
+Migraciones versionadas del esquema SQLite
+
+La versión del esquema se guarda en `PRAGMA user_version`. Cada migración
+es una función que recibe la conexión y se aplica en orden dentro de una
+sola transacción; un lock de archivo garantiza que sólo un proceso
+(worker o script) migre a la vez. Si la base ya está en la última versión
+no se escribe nada.
+
+Uso manual:
+    python migrations.py [ruta_db]
+"""
+import os
+import secrets
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _columnas(conn, tabla):
+    """Nombres de columnas de una tabla"""
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({tabla})')}
+
+
+def _agregar_columna(conn, tabla, columna, tipo):
+    """ALTER TABLE ADD COLUMN sólo si la columna no existe (bases antiguas)"""
+    if columna in _columnas(conn, tabla):
+        return False
+    conn.execute(f'ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}')
+    return True
+
+
+# ==========================================
+# MIGRACIONES
+# ==========================================
+
+def _m001_esquema_base(conn):
+    """Tablas base, columnas agregadas históricamente y usuario admin"""
+    from database import Database
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS clientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            email TEXT NOT NULL,
+            telefono TEXT,
+            direccion TEXT,
+            rfc TEXT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cotizaciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero_cotizacion TEXT UNIQUE NOT NULL,
+            cliente_id INTEGER NOT NULL,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_validez DATE,
+            subtotal REAL NOT NULL,
+            iva REAL DEFAULT 0,
+            total REAL NOT NULL,
+            notas TEXT,
+            condiciones_comerciales TEXT,
+            estado TEXT DEFAULT 'pendiente',
+            token_aprobacion TEXT UNIQUE,
+            estado_aprobacion TEXT DEFAULT 'pendiente',
+            fecha_aprobacion TIMESTAMP,
+            comentarios_cliente TEXT,
+            creado_por INTEGER,
+            FOREIGN KEY (cliente_id) REFERENCES clientes (id)
+        )
+    ''')
+
+    # Bases creadas antes de que existieran estas columnas
+    _agregar_columna(conn, 'cotizaciones', 'condiciones_comerciales', 'TEXT')
+    if _agregar_columna(conn, 'cotizaciones', 'token_aprobacion', 'TEXT'):
+        # SQLite no permite ADD COLUMN ... UNIQUE; se usa un índice único
+        conn.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_cotizaciones_token
+            ON cotizaciones (token_aprobacion)
+        ''')
+    _agregar_columna(conn, 'cotizaciones', 'estado_aprobacion', "TEXT DEFAULT 'pendiente'")
+    _agregar_columna(conn, 'cotizaciones', 'fecha_aprobacion', 'TIMESTAMP')
+    _agregar_columna(conn, 'cotizaciones', 'comentarios_cliente', 'TEXT')
+    _agregar_columna(conn, 'cotizaciones', 'creado_por', 'INTEGER')
+
+    # Cotizaciones antiguas sin token de aprobación
+    sin_token = conn.execute(
+        'SELECT id FROM cotizaciones WHERE token_aprobacion IS NULL'
+    ).fetchall()
+    conn.executemany(
+        'UPDATE cotizaciones SET token_aprobacion = ? WHERE id = ?',
+        [(secrets.token_urlsafe(32), row[0]) for row in sin_token]
+    )
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS productos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo TEXT UNIQUE NOT NULL,
+            nombre TEXT NOT NULL,
+            descripcion TEXT,
+            tipo TEXT NOT NULL DEFAULT 'producto',
+            precio REAL NOT NULL,
+            unidad TEXT DEFAULT 'pza',
+            categoria TEXT,
+            imagen_url TEXT,
+            activo INTEGER DEFAULT 1,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    _agregar_columna(conn, 'productos', 'imagen_url', 'TEXT')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cotizacion_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cotizacion_id INTEGER NOT NULL,
+            producto_id INTEGER,
+            concepto TEXT NOT NULL,
+            descripcion TEXT,
+            cantidad INTEGER NOT NULL,
+            precio_unitario REAL NOT NULL,
+            subtotal REAL NOT NULL,
+            FOREIGN KEY (cotizacion_id) REFERENCES cotizaciones (id) ON DELETE CASCADE,
+            FOREIGN KEY (producto_id) REFERENCES productos (id) ON DELETE SET NULL
+        )
+    ''')
+    _agregar_columna(conn, 'cotizacion_items', 'producto_id', 'INTEGER')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cotizacion_adjuntos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cotizacion_id INTEGER NOT NULL,
+            nombre_original TEXT NOT NULL,
+            nombre_archivo TEXT NOT NULL,
+            ruta_archivo TEXT NOT NULL,
+            mime_tipo TEXT,
+            tamano_bytes INTEGER,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cotizacion_id) REFERENCES cotizaciones (id) ON DELETE CASCADE
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            nombre_completo TEXT NOT NULL,
+            email TEXT NOT NULL,
+            rol TEXT DEFAULT 'usuario',
+            activo INTEGER DEFAULT 1,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ultimo_acceso TIMESTAMP
+        )
+    ''')
+
+    # Usuario admin por defecto
+    existe_admin = conn.execute(
+        'SELECT 1 FROM usuarios WHERE username = ?', ('admin',)
+    ).fetchone()
+    if not existe_admin:
+        conn.execute('''
+            INSERT INTO usuarios (username, password_hash, nombre_completo, email, rol)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ('admin', Database._hash_password('admin123'), 'Administrador',
+              'admin@integrational3.com.mx', 'admin'))
+
+
+def _m002_emails_destino(conn):
+    """Emails a los que se envió la cotización (antes sólo vía script aparte)"""
+    _agregar_columna(conn, 'cotizaciones', 'emails_destino', 'TEXT')
+
+
+def _m003_secuencias(conn):
+    """Secuencias atómicas para numerar cotizaciones sin COUNT(*)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS secuencias (
+            nombre TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    # Continuar después del consecutivo más alto ya emitido (INT-AAAAMMDD-NNNN)
+    conn.execute('''
+        INSERT OR IGNORE INTO secuencias (nombre, valor)
+        SELECT 'cotizaciones', COALESCE(MAX(CAST(substr(numero_cotizacion, 14) AS INTEGER)), 0)
+        FROM cotizaciones
+    ''')
+
+
+def _m004_indices_listado_cotizaciones(conn):
+    """Índices compuestos para el listado paginado y filtrado de cotizaciones"""
+    # El rowid (id) va implícito al final de cada índice, así que todos
+    # sirven para ORDER BY fecha_creacion DESC, id DESC con cursor keyset
+    indices = {
+        'idx_cotizaciones_fecha': '(fecha_creacion)',
+        'idx_cotizaciones_estado_fecha': '(estado, fecha_creacion)',
+        'idx_cotizaciones_aprobacion_fecha': '(estado_aprobacion, fecha_creacion)',
+        'idx_cotizaciones_cliente_fecha': '(cliente_id, fecha_creacion)',
+        'idx_cotizaciones_creador_fecha': '(creado_por, fecha_creacion)',
+        'idx_cotizaciones_total': '(total)',
+    }
+    for nombre, columnas in indices.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {nombre} ON cotizaciones {columnas}')
+
+
+def _m005_indices_consultas(conn):
+    """Índices de llaves foráneas y ordenamientos de los listados"""
+    indices = {
+        'idx_items_cotizacion': 'cotizacion_items (cotizacion_id)',
+        'idx_items_producto': 'cotizacion_items (producto_id)',
+        'idx_adjuntos_cotizacion': 'cotizacion_adjuntos (cotizacion_id, fecha_creacion)',
+        'idx_productos_activo_nombre': 'productos (activo, nombre)',
+        'idx_productos_activo_categoria': 'productos (activo, categoria)',
+        'idx_productos_nombre': 'productos (nombre)',
+        'idx_clientes_nombre': 'clientes (nombre)',
+        'idx_usuarios_nombre': 'usuarios (nombre_completo)',
+    }
+    for nombre, definicion in indices.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {nombre} ON {definicion}')
+
+
+def _m006_busqueda_productos(conn):
+    """Índice FTS5 de productos (contenido externo) sincronizado por triggers"""
+    # remove_diacritics 2: "camara" encuentra "Cámara"; prefix acelera las búsquedas "cam*"
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+            codigo, nombre, descripcion, categoria,
+            content='productos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS productos_fts_ai AFTER INSERT ON productos BEGIN
+            INSERT INTO productos_fts (rowid, codigo, nombre, descripcion, categoria)
+            VALUES (new.id, new.codigo, new.nombre, new.descripcion, new.categoria);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS productos_fts_ad AFTER DELETE ON productos BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, codigo, nombre, descripcion, categoria)
+            VALUES ('delete', old.id, old.codigo, old.nombre, old.descripcion, old.categoria);
+        END
+    ''')
+    # Sólo cambios en columnas indexadas (precio, activo, imagen no tocan el índice)
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS productos_fts_au
+        AFTER UPDATE OF codigo, nombre, descripcion, categoria ON productos BEGIN
+            INSERT INTO productos_fts (productos_fts, rowid, codigo, nombre, descripcion, categoria)
+            VALUES ('delete', old.id, old.codigo, old.nombre, old.descripcion, old.categoria);
+            INSERT INTO productos_fts (rowid, codigo, nombre, descripcion, categoria)
+            VALUES (new.id, new.codigo, new.nombre, new.descripcion, new.categoria);
+        END
+    ''')
+    # Pesos de bm25 por columna: código y nombre pesan más que la descripción
+    conn.execute('''
+        INSERT INTO productos_fts (productos_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 2.0)')
+    ''')
+    conn.execute("INSERT INTO productos_fts (productos_fts) VALUES ('rebuild')")
+
+
+def _contador_cambios(conn, tabla):
+    """Registrar `tabla` en versiones_tabla e incrementar su versión en cada escritura"""
+    conn.execute('INSERT OR IGNORE INTO versiones_tabla (tabla, version) VALUES (?, 0)', (tabla,))
+    for evento in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {tabla}_version_{evento.lower()}
+            AFTER {evento} ON {tabla} BEGIN
+                UPDATE versiones_tabla SET version = version + 1 WHERE tabla = '{tabla}';
+            END
+        ''')
+
+
+def _m007_versiones_tabla(conn):
+    """Contadores de cambios por tabla para validar las cachés de cada worker"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS versiones_tabla (
+            tabla TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    _contador_cambios(conn, 'productos')
+
+
+def _m008_contadores_listados(conn):
+    """Contadores de cambios de las tablas que alimentan los listados (ETag)"""
+    for tabla in ('clientes', 'cotizaciones', 'usuarios'):
+        _contador_cambios(conn, tabla)
+
+
+def _m009_bitacora_cambios(conn):
+    """updated_at y bitácora de cambios (con bajas) para la sincronización incremental"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cambios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            registro_id INTEGER NOT NULL,
+            operacion TEXT NOT NULL,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cambios_registro ON cambios (tabla, registro_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_cambios_fecha ON cambios (fecha)')
+    # Hasta dónde se purgó la bitácora: cursores anteriores deben resincronizar
+    conn.execute("INSERT OR IGNORE INTO secuencias (nombre, valor) VALUES ('cambios_purgados_hasta', 0)")
+
+    for tabla in ('clientes', 'productos', 'cotizaciones'):
+        # ADD COLUMN no admite DEFAULT CURRENT_TIMESTAMP: lo ponen los triggers
+        _agregar_columna(conn, tabla, 'updated_at', 'TIMESTAMP')
+        conn.execute(f'UPDATE {tabla} SET updated_at = fecha_creacion WHERE updated_at IS NULL')
+
+        # Los productos desactivados salen del catálogo: se registran como baja
+        operacion = "CASE WHEN new.activo = 0 THEN 'delete' ELSE 'upsert' END" if tabla == 'productos' else "'upsert'"
+
+        # El UPDATE de updated_at dentro de cada trigger no lo vuelve a disparar
+        # (recursive_triggers está apagado); el de alta no entra al de cambios
+        # porque old.updated_at todavía es NULL.
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {tabla}_cambios_insert AFTER INSERT ON {tabla} BEGIN
+                UPDATE {tabla} SET updated_at = CURRENT_TIMESTAMP WHERE id = new.id AND new.updated_at IS NULL;
+                INSERT INTO cambios (tabla, registro_id, operacion) VALUES ('{tabla}', new.id, {operacion});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {tabla}_cambios_update AFTER UPDATE ON {tabla}
+            WHEN old.updated_at IS NOT NULL BEGIN
+                UPDATE {tabla} SET updated_at = CURRENT_TIMESTAMP WHERE id = new.id;
+                INSERT INTO cambios (tabla, registro_id, operacion) VALUES ('{tabla}', new.id, {operacion});
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {tabla}_cambios_delete AFTER DELETE ON {tabla} BEGIN
+                INSERT INTO cambios (tabla, registro_id, operacion) VALUES ('{tabla}', old.id, 'delete');
+            END
+        ''')
+
+
+def _m010_historial_precios(conn):
+    """Historial de precios de los reprecios masivos (antes/después por producto)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS historial_precios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lote TEXT NOT NULL,
+            producto_id INTEGER NOT NULL,
+            precio_anterior REAL NOT NULL,
+            precio_nuevo REAL NOT NULL,
+            regla TEXT,
+            usuario_id INTEGER,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (producto_id) REFERENCES productos (id)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_historial_precios_lote ON historial_precios (lote, producto_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_historial_precios_producto ON historial_precios (producto_id, fecha)')
+
+
+def _m011_claves_idempotencia(conn):
+    """Respuestas guardadas por Idempotency-Key para los POST de creación"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS claves_idempotencia (
+            alcance TEXT NOT NULL,
+            clave TEXT NOT NULL,
+            huella TEXT NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'en_proceso',
+            codigo INTEGER,
+            respuesta TEXT,
+            tipo_contenido TEXT,
+            creada TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expira TIMESTAMP NOT NULL,
+            PRIMARY KEY (alcance, clave)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_claves_idempotencia_expira ON claves_idempotencia (expira)')
+
+
+def _m012_resumen_cotizaciones(conn):
+    """Columnas de resumen del listado (conceptos, adjuntos, último envío) mantenidas por triggers"""
+    for columna in ('items_count', 'adjuntos_count', 'adjuntos_bytes'):
+        _agregar_columna(conn, 'cotizaciones', columna, 'INTEGER NOT NULL DEFAULT 0')
+    # La pone actualizar_emails_destino al enviar; las enviadas antes quedan en NULL
+    _agregar_columna(conn, 'cotizaciones', 'ultimo_envio', 'TIMESTAMP')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS cotizacion_items_resumen_insert AFTER INSERT ON cotizacion_items BEGIN
+            UPDATE cotizaciones SET items_count = items_count + 1 WHERE id = new.cotizacion_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS cotizacion_items_resumen_delete AFTER DELETE ON cotizacion_items BEGIN
+            UPDATE cotizaciones SET items_count = items_count - 1 WHERE id = old.cotizacion_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS cotizacion_items_resumen_update
+        AFTER UPDATE OF cotizacion_id ON cotizacion_items
+        WHEN old.cotizacion_id IS NOT new.cotizacion_id BEGIN
+            UPDATE cotizaciones SET items_count = items_count - 1 WHERE id = old.cotizacion_id;
+            UPDATE cotizaciones SET items_count = items_count + 1 WHERE id = new.cotizacion_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS cotizacion_adjuntos_resumen_insert AFTER INSERT ON cotizacion_adjuntos BEGIN
+            UPDATE cotizaciones
+            SET adjuntos_count = adjuntos_count + 1,
+                adjuntos_bytes = adjuntos_bytes + COALESCE(new.tamano_bytes, 0)
+            WHERE id = new.cotizacion_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS cotizacion_adjuntos_resumen_delete AFTER DELETE ON cotizacion_adjuntos BEGIN
+            UPDATE cotizaciones
+            SET adjuntos_count = adjuntos_count - 1,
+                adjuntos_bytes = adjuntos_bytes - COALESCE(old.tamano_bytes, 0)
+            WHERE id = old.cotizacion_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS cotizacion_adjuntos_resumen_update
+        AFTER UPDATE OF cotizacion_id, tamano_bytes ON cotizacion_adjuntos BEGIN
+            UPDATE cotizaciones
+            SET adjuntos_count = adjuntos_count - 1,
+                adjuntos_bytes = adjuntos_bytes - COALESCE(old.tamano_bytes, 0)
+            WHERE id = old.cotizacion_id;
+            UPDATE cotizaciones
+            SET adjuntos_count = adjuntos_count + 1,
+                adjuntos_bytes = adjuntos_bytes + COALESCE(new.tamano_bytes, 0)
+            WHERE id = new.cotizacion_id;
+        END
+    ''')
+
+    # Valores iniciales de las cotizaciones existentes (copia fija de la
+    # reparación: la migración no cambia si cambia Database)
+    conn.execute('''
+        WITH items AS (
+            SELECT cotizacion_id, COUNT(*) AS n
+            FROM cotizacion_items GROUP BY cotizacion_id
+        ),
+        adjuntos AS (
+            SELECT cotizacion_id, COUNT(*) AS n, COALESCE(SUM(tamano_bytes), 0) AS bytes
+            FROM cotizacion_adjuntos GROUP BY cotizacion_id
+        ),
+        real AS (
+            SELECT c.id, COALESCE(i.n, 0) AS items_count,
+                   COALESCE(a.n, 0) AS adjuntos_count, COALESCE(a.bytes, 0) AS adjuntos_bytes
+            FROM cotizaciones c
+            LEFT JOIN items i ON i.cotizacion_id = c.id
+            LEFT JOIN adjuntos a ON a.cotizacion_id = c.id
+        )
+        UPDATE cotizaciones
+        SET items_count = real.items_count,
+            adjuntos_count = real.adjuntos_count,
+            adjuntos_bytes = real.adjuntos_bytes
+        FROM real
+        WHERE real.id = cotizaciones.id
+          AND (cotizaciones.items_count <> real.items_count
+               OR cotizaciones.adjuntos_count <> real.adjuntos_count
+               OR cotizaciones.adjuntos_bytes <> real.adjuntos_bytes)
+    ''')
+
+
+# Columnas que entregan /api/changes y los listados: sólo sus cambios cuentan
+# como escritura (bitácora y versiones_tabla). Quedan fuera updated_at, las de
+# uso interno (token_aprobacion, creado_por) y las de resumen de la migración 12.
+_COLUMNAS_SINCRONIZADAS = {
+    'clientes': ('nombre', 'email', 'telefono', 'direccion', 'rfc'),
+    'productos': ('codigo', 'nombre', 'descripcion', 'tipo', 'precio', 'unidad', 'categoria',
+                  'imagen_url', 'activo'),
+    'cotizaciones': ('numero_cotizacion', 'cliente_id', 'fecha_validez', 'subtotal', 'iva', 'total', 'notas',
+                     'condiciones_comerciales', 'estado', 'estado_aprobacion', 'fecha_aprobacion',
+                     'comentarios_cliente', 'emails_destino'),
+}
+
+
+def _m013_triggers_cambios_por_columna(conn):
+    """Bitácora y versiones sólo por cambios en columnas sincronizadas; updated_at sin contar doble"""
+    for tabla, columnas in _COLUMNAS_SINCRONIZADAS.items():
+        lista = ', '.join(columnas)
+        operacion = "CASE WHEN new.activo = 0 THEN 'delete' ELSE 'upsert' END" if tabla == 'productos' else "'upsert'"
+
+        # El UPDATE de updated_at de los triggers de bitácora ya no incrementa
+        # la versión: antes cada alta o cambio la subía dos veces
+        conn.execute(f'DROP TRIGGER IF EXISTS {tabla}_version_update')
+        conn.execute(f'''
+            CREATE TRIGGER {tabla}_version_update
+            AFTER UPDATE OF {lista} ON {tabla} BEGIN
+                UPDATE versiones_tabla SET version = version + 1 WHERE tabla = '{tabla}';
+            END
+        ''')
+
+        # updated_at no está en la lista: el UPDATE anidado no dispara ningún
+        # trigger de la tabla. Si la propia sentencia ya movió updated_at se respeta.
+        conn.execute(f'DROP TRIGGER IF EXISTS {tabla}_cambios_update')
+        conn.execute(f'''
+            CREATE TRIGGER {tabla}_cambios_update
+            AFTER UPDATE OF {lista} ON {tabla} BEGIN
+                UPDATE {tabla} SET updated_at = CURRENT_TIMESTAMP
+                WHERE id = new.id AND new.updated_at IS old.updated_at;
+                INSERT INTO cambios (tabla, registro_id, operacion) VALUES ('{tabla}', new.id, {operacion});
+            END
+        ''')
+
+
+def _m014_resumen_por_sentencia(conn):
+    """Quitar los triggers por fila del resumen: Database lo recalcula una vez por escritura"""
+    # Un UPDATE de cotizaciones por cada item insertado o borrado
+    for trigger in ('cotizacion_items_resumen_insert', 'cotizacion_items_resumen_delete',
+                    'cotizacion_items_resumen_update', 'cotizacion_adjuntos_resumen_insert',
+                    'cotizacion_adjuntos_resumen_delete', 'cotizacion_adjuntos_resumen_update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+
+
+def _m015_restaurar_triggers_resumen(conn):
+    """Volver a los triggers del resumen: también cuadra con escrituras fuera de Database"""
+    # Con la migración 13 las columnas de resumen no tocan la bitácora ni
+    # versiones_tabla, así que los triggers por fila ya no cuentan como cambio
+    # de la cotización. Recrea los seis triggers (IF NOT EXISTS) y recalcula
+    # los conteos que hayan quedado desfasados mientras no existían.
+    _m012_resumen_cotizaciones(conn)
+
+
+def _m016_version_usuarios_por_columna(conn):
+    """La versión de usuarios sólo cambia con las columnas que muestra el listado de cotizaciones"""
+    # El UPDATE de ultimo_acceso en cada inicio de sesión invalidaba los ETag del listado
+    conn.execute('DROP TRIGGER IF EXISTS usuarios_version_update')
+    conn.execute('''
+        CREATE TRIGGER usuarios_version_update
+        AFTER UPDATE OF username, nombre_completo ON usuarios BEGIN
+            UPDATE versiones_tabla SET version = version + 1 WHERE tabla = 'usuarios';
+        END
+    ''')
+
+
+# (versión, descripción, función) en orden estricto
+MIGRACIONES = [
+    (1, 'Esquema base', _m001_esquema_base),
+    (2, 'Columna cotizaciones.emails_destino', _m002_emails_destino),
+    (3, 'Tabla secuencias para numero_cotizacion', _m003_secuencias),
+    (4, 'Índices del listado de cotizaciones', _m004_indices_listado_cotizaciones),
+    (5, 'Índices de llaves foráneas y listados', _m005_indices_consultas),
+    (6, 'Búsqueda de texto completo de productos (FTS5)', _m006_busqueda_productos),
+    (7, 'Contadores de cambios por tabla (versiones_tabla)', _m007_versiones_tabla),
+    (8, 'Contadores de cambios de clientes, cotizaciones y usuarios', _m008_contadores_listados),
+    (9, 'updated_at y bitácora de cambios para /api/changes', _m009_bitacora_cambios),
+    (10, 'Historial de precios de reprecios masivos', _m010_historial_precios),
+    (11, 'Almacén de Idempotency-Key', _m011_claves_idempotencia),
+    (12, 'Columnas de resumen de cotizaciones mantenidas por triggers', _m012_resumen_cotizaciones),
+    (13, 'Bitácora y versiones sólo por columnas sincronizadas', _m013_triggers_cambios_por_columna),
+    (14, 'Resumen de cotizaciones por sentencia en lugar de por fila', _m014_resumen_por_sentencia),
+    (15, 'Triggers del resumen de cotizaciones restaurados', _m015_restaurar_triggers_resumen),
+    (16, 'Versión de usuarios sólo por columnas del listado', _m016_version_usuarios_por_columna),
+]
+
+ULTIMA_VERSION = MIGRACIONES[-1][0]
+
+
+# ==========================================
+# MOTOR DE MIGRACIONES
+# ==========================================
+
+@contextmanager
+def _lock_migracion(db_path):
+    """Lock de archivo exclusivo entre procesos mientras se migra"""
+    lock_path = f'{os.path.abspath(db_path)}.migrate.lock'
+    with open(lock_path, 'a+') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def version_actual(conn):
+    """Versión del esquema registrada en la base"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(db_path=None):
+    """
+    Aplicar las migraciones pendientes.
+
+    Returns:
+        tuple: (versión_inicial, versión_final)
+    """
+    db_path = db_path or Config.DATABASE_PATH
+    conn = sqlite3.connect(db_path, timeout=Config.DB_BUSY_TIMEOUT, isolation_level=None)
+    try:
+        inicial = version_actual(conn)
+        if inicial >= ULTIMA_VERSION:
+            return inicial, inicial
+
+        with _lock_migracion(db_path):
+            # Otro proceso pudo haber migrado mientras esperábamos el lock
+            inicial = version_actual(conn)
+            if inicial >= ULTIMA_VERSION:
+                return inicial, inicial
+
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for version, _descripcion, aplicar in MIGRACIONES:
+                    if version > inicial:
+                        aplicar(conn)
+                conn.execute(f'PRAGMA user_version = {ULTIMA_VERSION}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        return inicial, ULTIMA_VERSION
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    ruta = sys.argv[1] if len(sys.argv) > 1 else Config.DATABASE_PATH
+    desde, hasta = migrate(ruta)
+    if desde == hasta:
+        print(f'✓ Esquema al día (versión {hasta})')
+    else:
+        for version, descripcion, _ in MIGRACIONES:
+            if desde < version <= hasta:
+                print(f'  → {version:03d} {descripcion}')
+        print(f'✓ Esquema migrado de la versión {desde} a la {hasta}')
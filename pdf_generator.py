@@ -15,6 +15,7 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from xml.sax.saxutils import escape
 from config import Config
+from metricas import medir_duracion
 
 
 class FixedSizeImage(Flowable):
@@ -180,6 +181,7 @@ class PDFGenerator:
             print(f"Error al cargar y redimensionar imagen: {e}")
             return None
     
+    @medir_duracion('cotizador_pdf_render_duration_seconds')
     def generar_cotizacion_pdf(self, cotizacion_data, filename=None):
         """
         Generar PDF de cotización con formato Integrational3
@@ -0,0 +1,61 @@
+"""
+Proveedor JSON de Flask basado en orjson
+
+Las respuestas se codifican con orjson (en C, directo a bytes). Los
+listados de Database ya llegan como `filas.FilaDict` (dicts armados en una
+sola pasada desde el cursor), que orjson codifica sin volver a Python por
+fila; el hook `default` sólo convierte filas sueltas (`filas.Fila` /
+sqlite3.Row) y los tipos de Flask. La salida es la misma que la del
+proveedor por omisión de Flask: llaves ordenadas, fechas en formato HTTP,
+compacta fuera de modo debug. orjson es opcional: sin él se usa el `json`
+de la biblioteca estándar con el mismo soporte de filas.
+"""
+import sqlite3
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Sin orjson: json de la biblioteca estándar
+    orjson = None
+
+
+def _por_defecto(o):
+    """Tipos que ni json ni orjson conocen: filas de SQLite y los de Flask (fechas, UUID, ...)"""
+    if isinstance(o, sqlite3.Row):
+        return dict(zip(o.keys(), o))
+    return DefaultJSONProvider.default(o)
+
+
+class ProveedorJSON(DefaultJSONProvider):
+    """DefaultJSONProvider con orjson y soporte de filas de SQLite"""
+
+    default = staticmethod(_por_defecto)
+
+    def _opciones(self, indentar=False):
+        # Fechas por _por_defecto (formato HTTP, igual que Flask); llaves no str como json
+        opciones = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        if indentar:
+            opciones |= orjson.OPT_INDENT_2
+        return opciones
+
+    def dumps(self, obj, **kwargs):
+        # Argumentos propios de json.dumps (indent, separators, ...): biblioteca estándar
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._opciones()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indentar = (self.compact is None and self._app.debug) or self.compact is False
+        cuerpo = orjson.dumps(obj, default=self.default, option=self._opciones(indentar))
+        return self._app.response_class(cuerpo + b'\n', mimetype=self.mimetype)
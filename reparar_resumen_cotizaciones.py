@@ -0,0 +1,23 @@
+"""
+Recalcular las columnas de resumen de cotizaciones (items_count,
+adjuntos_count, adjuntos_bytes) a partir de sus items y adjuntos
+
+Los triggers de la migración 12 las mantienen exactas; este comando sólo
+hace falta si la base se editó con los triggers fuera (restauraciones
+parciales, herramientas externas). Es una sola sentencia sobre todo el
+conjunto y sólo escribe las cotizaciones cuyo resumen no coincide.
+
+Uso:
+    python reparar_resumen_cotizaciones.py [ruta_db]
+"""
+import sys
+import time
+
+from database import Database
+
+db = Database(sys.argv[1] if len(sys.argv) > 1 else None)
+inicio = time.perf_counter()
+corregidas = db.reparar_resumen_cotizaciones()
+
+print(f"✓ Cotizaciones con resumen corregido: {corregidas}")
+print(f"Tiempo: {time.perf_counter() - inicio:.3f}s")
@@ -0,0 +1,53 @@
+"""
+Reprecio masivo de productos (por ejemplo al moverse el tipo de cambio)
+
+Sin --aplicar sólo muestra la vista previa. Ejemplos:
+    python repreciar_productos.py --porcentaje 4.5 --categoria SDI
+    python repreciar_productos.py --factor 1.032 --redondeo 1 --prefijo DET- --aplicar
+    python repreciar_productos.py --delta -50 --ids 3,7,9 --aplicar
+"""
+import argparse
+
+from database import Database
+
+parser = argparse.ArgumentParser(description='Reprecio masivo de productos')
+operacion = parser.add_mutually_exclusive_group(required=True)
+operacion.add_argument('--porcentaje', type=float, help='porcentaje a sumar (negativo para bajar)')
+operacion.add_argument('--delta', type=float, help='monto fijo a sumar (negativo para restar)')
+operacion.add_argument('--factor', type=float, help='factor multiplicador (p. ej. tipo de cambio)')
+operacion.add_argument('--solo-redondeo', action='store_true', help='sólo aplicar el redondeo')
+parser.add_argument('--redondeo', type=float, default=0.01, help='múltiplo de redondeo (0.01, 1, 10...)')
+parser.add_argument('--categoria')
+parser.add_argument('--tipo', choices=['producto', 'servicio'])
+parser.add_argument('--prefijo', dest='prefijo_codigo', help='prefijo del código')
+parser.add_argument('--ids', help='ids separados por coma')
+parser.add_argument('--incluir-inactivos', action='store_true')
+parser.add_argument('--todos', action='store_true', help='permitir repreciar sin filtros')
+parser.add_argument('--aplicar', action='store_true', help='escribir los cambios (por omisión sólo vista previa)')
+args = parser.parse_args()
+
+if args.porcentaje is not None:
+    nombre_operacion, valor = 'porcentaje', args.porcentaje
+elif args.delta is not None:
+    nombre_operacion, valor = 'delta', args.delta
+elif args.factor is not None:
+    nombre_operacion, valor = 'factor', args.factor
+else:
+    nombre_operacion, valor = 'redondeo', 0
+
+resultado = Database().repreciar_productos(
+    nombre_operacion, valor, args.redondeo, simular=not args.aplicar,
+    categoria=args.categoria, tipo=args.tipo, prefijo_codigo=args.prefijo_codigo,
+    ids=[int(i) for i in args.ids.split(',')] if args.ids else None,
+    incluir_inactivos=args.incluir_inactivos, todos=args.todos
+)
+
+for fila in resultado['muestra']:
+    print(f"{fila['codigo']:<20} {fila['precio_anterior']:>12,.2f} → {fila['precio_nuevo']:>12,.2f}  {fila['nombre'][:40]}")
+if resultado['afectados'] > len(resultado['muestra']):
+    print(f"... y {resultado['afectados'] - len(resultado['muestra'])} más")
+
+if resultado['simulacion']:
+    print(f"\nVista previa: {resultado['afectados']} productos cambiarían de precio (use --aplicar)")
+else:
+    print(f"\n✓ {resultado['afectados']} productos repreciados (lote {resultado['lote']})")
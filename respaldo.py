@@ -0,0 +1,380 @@
+"""
+Respaldo en caliente de las bases SQLite y respaldo incremental de archivos
+
+- Bases (cotizaciones.db y archive.db): API de backup de sqlite3 por pasos de
+  N páginas con una pausa entre pasos. La copia se hace desde una transacción
+  de lectura abierta (instantánea fija en WAL), así los workers siguen
+  escribiendo y el respaldo no se reinicia con cada escritura. Cada copia se
+  verifica con PRAGMA integrity_check antes de darla por buena.
+- Archivos (uploads/ y pdfs/): almacén por contenido (objetos/<sha256>) más un
+  manifiesto por respaldo; sólo se copian los archivos nuevos o modificados.
+- Retención: se borran los respaldos con más de N días (conservando siempre
+  los más recientes) y los objetos que ya no usa ningún manifiesto.
+
+Cada respaldo queda en <destino>/<AAAAMMDD_HHMMSS>/ (bases/ y manifiesto.json)
+y sólo aparece con ese nombre cuando terminó y pasó la verificación.
+
+Sólo usa la biblioteca estándar (backup.sh lo ejecuta desde el host).
+
+Uso:
+    python respaldo.py respaldar --destino /backups/cotizador --base data/cotizaciones.db \\
+        [--base data/archive.db] [--carpeta uploads --carpeta pdfs] [--retencion-dias 30]
+    python respaldo.py verificar /backups/cotizador/20250101_020000 [--rehash]
+    python respaldo.py restaurar /backups/cotizador/20250101_020000 --en /tmp/restaurado
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+FORMATO_FECHA = '%Y%m%d_%H%M%S'
+MANIFIESTO = 'manifiesto.json'
+PAGINAS_POR_PASO = 1024
+PAUSA_ENTRE_PASOS = 0.005
+RETENCION_DIAS = 30
+RESPALDOS_MINIMOS = 3
+TAMANO_BLOQUE = 1024 * 1024
+
+
+class RespaldoError(Exception):
+    """El respaldo o su verificación falló"""
+
+
+# ==========================================
+# BASES DE DATOS
+# ==========================================
+
+def verificar_base(ruta):
+    """PRAGMA integrity_check sobre una copia; RespaldoError si no responde 'ok'"""
+    conn = sqlite3.connect(f'file:{os.path.abspath(ruta)}?mode=ro', uri=True)
+    try:
+        resultado = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    finally:
+        conn.close()
+    if resultado != ['ok']:
+        raise RespaldoError(f"{ruta}: integrity_check -> {'; '.join(resultado[:5])}")
+    return 'ok'
+
+
+def respaldar_base(origen, destino, paginas_por_paso=PAGINAS_POR_PASO, pausa=PAUSA_ENTRE_PASOS):
+    """
+    Copiar una base en uso con la API de backup de sqlite3.
+
+    Returns:
+        dict con páginas, pasos, user_version, tamaño, sha256 e integridad
+    """
+    fuente = sqlite3.connect(origen, timeout=30, isolation_level=None)
+    copia = sqlite3.connect(destino)
+    pasos = [0]
+
+    def _progreso(_estado, _restantes, _total):
+        pasos[0] += 1
+        if pausa:
+            # Ceder el disco y el GIL a los workers entre pasos
+            time.sleep(pausa)
+
+    try:
+        # Instantánea fija: en WAL los escritores no esperan y el backup no se reinicia
+        fuente.execute('BEGIN')
+        user_version = fuente.execute('PRAGMA user_version').fetchone()[0]
+        paginas = fuente.execute('PRAGMA page_count').fetchone()[0]
+        fuente.backup(copia, pages=paginas_por_paso, progress=_progreso)
+        fuente.execute('COMMIT')
+        # La copia queda autocontenida (sin -wal/-shm)
+        copia.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        copia.close()
+        fuente.close()
+
+    return {
+        'paginas': paginas,
+        'pasos': pasos[0],
+        'user_version': user_version,
+        'tamano': os.path.getsize(destino),
+        'sha256': _sha256(destino),
+        'integridad': verificar_base(destino),
+    }
+
+
+# ==========================================
+# ARCHIVOS (ALMACÉN POR CONTENIDO)
+# ==========================================
+
+def _sha256(ruta):
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def _ruta_objeto(objetos_dir, sha256):
+    return os.path.join(objetos_dir, sha256[:2], sha256)
+
+
+def _guardar_objeto(ruta, objetos_dir):
+    """Copiar un archivo al almacén calculando su hash en la misma lectura"""
+    os.makedirs(objetos_dir, exist_ok=True)
+    temporal = os.path.join(objetos_dir, f'.tmp-{os.getpid()}')
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as entrada, open(temporal, 'wb') as salida:
+        for bloque in iter(lambda: entrada.read(TAMANO_BLOQUE), b''):
+            digest.update(bloque)
+            salida.write(bloque)
+
+    sha256 = digest.hexdigest()
+    final = _ruta_objeto(objetos_dir, sha256)
+    if os.path.exists(final):
+        os.remove(temporal)
+        return sha256, False
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    os.replace(temporal, final)
+    return sha256, True
+
+
+def respaldar_carpetas(carpetas, raiz, objetos_dir, anterior=None):
+    """
+    Respaldar incrementalmente las carpetas (rutas relativas a `raiz`).
+
+    Un archivo con el mismo tamaño y mtime que en el manifiesto anterior
+    reutiliza su hash sin leerse; los demás se leen una vez y se copian al
+    almacén sólo si su contenido no estaba ya.
+
+    Returns:
+        (archivos {ruta_relativa: {sha256, tamano, mtime_ns}}, copiados, bytes_copiados)
+    """
+    anterior = anterior or {}
+    archivos = {}
+    copiados = 0
+    bytes_copiados = 0
+
+    for carpeta in carpetas:
+        base = os.path.join(raiz, carpeta)
+        for directorio, _subdirs, nombres in os.walk(base):
+            for nombre in sorted(nombres):
+                ruta = os.path.join(directorio, nombre)
+                relativa = os.path.relpath(ruta, raiz).replace(os.sep, '/')
+                info = os.stat(ruta)
+                previo = anterior.get(relativa)
+
+                if (previo and previo['tamano'] == info.st_size and previo['mtime_ns'] == info.st_mtime_ns
+                        and os.path.exists(_ruta_objeto(objetos_dir, previo['sha256']))):
+                    sha256 = previo['sha256']
+                else:
+                    sha256, nuevo = _guardar_objeto(ruta, objetos_dir)
+                    if nuevo:
+                        copiados += 1
+                        bytes_copiados += info.st_size
+
+                archivos[relativa] = {'sha256': sha256, 'tamano': info.st_size, 'mtime_ns': info.st_mtime_ns}
+
+    return archivos, copiados, bytes_copiados
+
+
+# ==========================================
+# RESPALDOS COMPLETOS
+# ==========================================
+
+def listar_respaldos(destino):
+    """Respaldos terminados en `destino`, del más antiguo al más reciente: [(fecha, ruta)]"""
+    respaldos = []
+    if not os.path.isdir(destino):
+        return respaldos
+    for nombre in os.listdir(destino):
+        ruta = os.path.join(destino, nombre)
+        if not os.path.exists(os.path.join(ruta, MANIFIESTO)):
+            continue
+        try:
+            fecha = datetime.strptime(nombre[:15], FORMATO_FECHA)
+        except ValueError:
+            continue
+        respaldos.append((fecha, ruta))
+    return sorted(respaldos)
+
+
+def _leer_manifiesto(ruta_respaldo):
+    with open(os.path.join(ruta_respaldo, MANIFIESTO), encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def respaldar(destino, bases, carpetas=(), raiz='.', paginas_por_paso=PAGINAS_POR_PASO,
+              pausa=PAUSA_ENTRE_PASOS, retencion_dias=RETENCION_DIAS, minimos=RESPALDOS_MINIMOS):
+    """
+    Respaldo completo: bases (las que existan), carpetas y retención.
+
+    Returns:
+        dict con la ruta del respaldo, el manifiesto y lo eliminado por retención
+    """
+    inicio = time.perf_counter()
+    os.makedirs(destino, exist_ok=True)
+    objetos_dir = os.path.join(destino, 'objetos')
+
+    nombre = datetime.now().strftime(FORMATO_FECHA)
+    sufijo = 1
+    while os.path.exists(os.path.join(destino, nombre)):
+        sufijo += 1
+        nombre = f'{datetime.now().strftime(FORMATO_FECHA)}_{sufijo}'
+    final = os.path.join(destino, nombre)
+    temporal = os.path.join(destino, f'.{nombre}.tmp')
+    os.makedirs(os.path.join(temporal, 'bases'))
+
+    try:
+        manifiesto = {'fecha': datetime.now().isoformat(timespec='seconds'), 'bases': {}, 'archivos': {}}
+        for base in bases:
+            if not os.path.exists(base):
+                continue
+            copia = os.path.join(temporal, 'bases', os.path.basename(base))
+            manifiesto['bases'][os.path.basename(base)] = respaldar_base(base, copia, paginas_por_paso, pausa)
+
+        respaldos = listar_respaldos(destino)
+        anterior = _leer_manifiesto(respaldos[-1][1])['archivos'] if respaldos else {}
+        archivos, copiados, bytes_copiados = respaldar_carpetas(carpetas, raiz, objetos_dir, anterior)
+        manifiesto.update({
+            'archivos': archivos,
+            'archivos_copiados': copiados,
+            'bytes_copiados': bytes_copiados,
+            'segundos': round(time.perf_counter() - inicio, 3),
+        })
+
+        with open(os.path.join(temporal, MANIFIESTO), 'w', encoding='utf-8') as archivo:
+            json.dump(manifiesto, archivo, indent=1, sort_keys=True)
+        os.replace(temporal, final)
+    except Exception:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+
+    return {'ruta': final, 'manifiesto': manifiesto, 'retencion': aplicar_retencion(destino, retencion_dias, minimos)}
+
+
+def aplicar_retencion(destino, dias=RETENCION_DIAS, minimos=RESPALDOS_MINIMOS):
+    """
+    Borrar los respaldos con más de `dias` días (siempre quedan los `minimos`
+    más recientes) y los objetos que ningún manifiesto restante usa.
+    """
+    respaldos = listar_respaldos(destino)
+    limite = datetime.now() - timedelta(days=dias)
+    borrar = [ruta for fecha, ruta in respaldos[:max(len(respaldos) - minimos, 0)] if fecha < limite]
+    for ruta in borrar:
+        shutil.rmtree(ruta)
+
+    en_uso = set()
+    for _fecha, ruta in listar_respaldos(destino):
+        en_uso.update(info['sha256'] for info in _leer_manifiesto(ruta)['archivos'].values())
+
+    objetos_borrados = 0
+    objetos_dir = os.path.join(destino, 'objetos')
+    if os.path.isdir(objetos_dir):
+        for directorio, _subdirs, nombres in os.walk(objetos_dir):
+            for nombre in nombres:
+                if nombre not in en_uso:
+                    os.remove(os.path.join(directorio, nombre))
+                    objetos_borrados += 1
+
+    return {'respaldos_borrados': len(borrar), 'objetos_borrados': objetos_borrados}
+
+
+def verificar_respaldo(ruta_respaldo, rehash=False):
+    """
+    Verificar que un respaldo se puede restaurar: integrity_check y hash de
+    cada base, y existencia (o hash con `rehash`) de cada archivo.
+
+    Returns:
+        lista de problemas (vacía si todo está bien)
+    """
+    manifiesto = _leer_manifiesto(ruta_respaldo)
+    objetos_dir = os.path.join(os.path.dirname(os.path.abspath(ruta_respaldo)), 'objetos')
+    problemas = []
+
+    for nombre, info in manifiesto['bases'].items():
+        copia = os.path.join(ruta_respaldo, 'bases', nombre)
+        try:
+            verificar_base(copia)
+            if _sha256(copia) != info['sha256']:
+                problemas.append(f'{nombre}: el hash no coincide con el manifiesto')
+        except (RespaldoError, sqlite3.Error, OSError) as e:
+            problemas.append(f'{nombre}: {e}')
+
+    for relativa, info in manifiesto['archivos'].items():
+        objeto = _ruta_objeto(objetos_dir, info['sha256'])
+        if not os.path.exists(objeto):
+            problemas.append(f'{relativa}: falta el objeto {info["sha256"]}')
+        elif rehash and _sha256(objeto) != info['sha256']:
+            problemas.append(f'{relativa}: objeto dañado')
+
+    return problemas
+
+
+def restaurar(ruta_respaldo, en):
+    """
+    Restaurar un respaldo en el directorio `en` (bases/ y las carpetas de
+    archivos con sus rutas originales). No toca la instalación en uso.
+    """
+    problemas = verificar_respaldo(ruta_respaldo)
+    if problemas:
+        raise RespaldoError('Respaldo inválido:\n  ' + '\n  '.join(problemas))
+
+    manifiesto = _leer_manifiesto(ruta_respaldo)
+    objetos_dir = os.path.join(os.path.dirname(os.path.abspath(ruta_respaldo)), 'objetos')
+    os.makedirs(os.path.join(en, 'bases'), exist_ok=True)
+    for nombre in manifiesto['bases']:
+        shutil.copy2(os.path.join(ruta_respaldo, 'bases', nombre), os.path.join(en, 'bases', nombre))
+    for relativa, info in manifiesto['archivos'].items():
+        destino = os.path.join(en, *relativa.split('/'))
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        shutil.copyfile(_ruta_objeto(objetos_dir, info['sha256']), destino)
+    return {'bases': len(manifiesto['bases']), 'archivos': len(manifiesto['archivos'])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Respaldo en caliente del cotizador')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    p_respaldar = comandos.add_parser('respaldar', help='crear un respaldo')
+    p_respaldar.add_argument('--destino', required=True, help='directorio de respaldos')
+    p_respaldar.add_argument('--base', action='append', default=[], help='base SQLite (repetible)')
+    p_respaldar.add_argument('--carpeta', action='append', default=[], help='carpeta de archivos (repetible)')
+    p_respaldar.add_argument('--raiz', default='.', help='directorio de la aplicación')
+    p_respaldar.add_argument('--paginas-por-paso', type=int, default=PAGINAS_POR_PASO)
+    p_respaldar.add_argument('--pausa', type=float, default=PAUSA_ENTRE_PASOS, help='segundos entre pasos')
+    p_respaldar.add_argument('--retencion-dias', type=int, default=RETENCION_DIAS)
+    p_respaldar.add_argument('--minimos', type=int, default=RESPALDOS_MINIMOS, help='respaldos que siempre se conservan')
+
+    p_verificar = comandos.add_parser('verificar', help='verificar un respaldo')
+    p_verificar.add_argument('respaldo')
+    p_verificar.add_argument('--rehash', action='store_true', help='recalcular el hash de cada archivo')
+
+    p_restaurar = comandos.add_parser('restaurar', help='restaurar un respaldo en un directorio')
+    p_restaurar.add_argument('respaldo')
+    p_restaurar.add_argument('--en', required=True, help='directorio donde restaurar')
+
+    args = parser.parse_args()
+
+    if args.comando == 'respaldar':
+        bases = [os.path.join(args.raiz, base) for base in args.base]
+        resultado = respaldar(args.destino, bases, args.carpeta, args.raiz, args.paginas_por_paso,
+                              args.pausa, args.retencion_dias, args.minimos)
+        manifiesto = resultado['manifiesto']
+        for nombre, info in manifiesto['bases'].items():
+            print(f"✓ {nombre}: {info['paginas']} páginas en {info['pasos']} pasos, integridad {info['integridad']}")
+        print(f"✓ Archivos: {len(manifiesto['archivos'])} ({manifiesto['archivos_copiados']} copiados, "
+              f"{manifiesto['bytes_copiados'] / 1024 / 1024:.1f} MB)")
+        print(f"✓ Retención: {resultado['retencion']['respaldos_borrados']} respaldos y "
+              f"{resultado['retencion']['objetos_borrados']} objetos eliminados")
+        print(f"Respaldo: {resultado['ruta']} ({manifiesto['segundos']}s)")
+
+    elif args.comando == 'verificar':
+        problemas = verificar_respaldo(args.respaldo, args.rehash)
+        for problema in problemas:
+            print(f'✗ {problema}')
+        if problemas:
+            sys.exit(1)
+        print('✓ Respaldo verificado')
+
+    else:
+        resultado = restaurar(args.respaldo, args.en)
+        print(f"✓ Restauradas {resultado['bases']} bases y {resultado['archivos']} archivos en {args.en}")
@@ -179,8 +179,7 @@ function ocultarFormularioCliente() {
 
 async function cargarClientes() {
     try {
-        const response = await fetch('/api/clientes');
-        clientes = await response.json();
+        clientes = await obtenerColeccion('clientes', '/api/clientes');
         
         // Actualizar badge
         const badgeClientes = document.getElementById('badge-clientes');
@@ -316,15 +315,71 @@ async function eliminarCliente(clienteId) {
 }
 
 // Gestión de Cotizaciones
-async function cargarCotizaciones() {
+const COTIZACIONES_POR_PAGINA = 50;
+let cotizacionesCursor = null;
+
+function renderFilaCotizacion(cot) {
+    const estadoAprobacion = cot.estado_aprobacion || 'pendiente';
+    const iconoEstado = estadoAprobacion === 'aprobado' ? '✅' : 
+                       estadoAprobacion === 'rechazado' ? '❌' : '⏳';
+    const colorEstado = estadoAprobacion === 'aprobado' ? '#28a745' : 
+                       estadoAprobacion === 'rechazado' ? '#dc3545' : '#ffc107';
+    
+    // Resumen precalculado en la base (items_count, adjuntos_count, ultimo_envio)
+    const resumen = [`${cot.items_count || 0} concepto${cot.items_count === 1 ? '' : 's'}`];
+    if (cot.adjuntos_count) {
+        resumen.push(`📎 ${cot.adjuntos_count} (${formatearTamano(cot.adjuntos_bytes)})`);
+    }
+    if (cot.ultimo_envio) {
+        resumen.push(`✉️ ${formatearFecha(cot.ultimo_envio)}`);
+    }
+    
+    return `
+    <tr>
+        <td><strong>${cot.numero_cotizacion}</strong><br><small style="color: #6c757d;">${resumen.join(' · ')}</small></td>
+        <td>${cot.cliente_nombre}</td>
+        <td>${formatearFecha(cot.fecha_creacion)}</td>
+        <td><strong>$${parseFloat(cot.total).toFixed(2)}</strong></td>
+        <td>
+            <span style="display: inline-flex; align-items: center; padding: 5px 10px; background: ${colorEstado}20; color: ${colorEstado}; border-radius: 5px; font-weight: 600;">
+                ${iconoEstado} ${estadoAprobacion.charAt(0).toUpperCase() + estadoAprobacion.slice(1)}
+            </span>
+        </td>
+        <td>
+            <button class="btn btn-primary btn-sm" onclick="verCotizacion(${cot.id})">Ver</button>
+            <button class="btn btn-warning btn-sm" onclick="editarCotizacion(${cot.id})">Editar</button>
+            <button class="btn btn-success btn-sm" onclick="descargarPDF(${cot.id})">PDF</button>
+            <button class="btn btn-secondary btn-sm" onclick="enviarEmail(${cot.id})">Email</button>
+            <button class="btn btn-danger btn-sm" onclick="eliminarCotizacion(${cot.id})">Eliminar</button>
+        </td>
+    </tr>
+    `;
+}
+
+async function cargarCotizaciones(cargarMas = false) {
     try {
-        const response = await fetch('/api/cotizaciones');
-        cotizaciones = await response.json();
+        // Paginación por cursor: sólo se piden las cotizaciones que se muestran
+        const params = new URLSearchParams({ limite: COTIZACIONES_POR_PAGINA });
+        if (cargarMas && cotizacionesCursor) {
+            params.set('cursor', cotizacionesCursor);
+        } else {
+            params.set('con_total', 'true');
+        }
+        
+        const pagina = await fetchJSONCondicional(`/api/cotizaciones?${params}`);
+        
+        cotizaciones = cargarMas ? cotizaciones.concat(pagina.cotizaciones) : pagina.cotizaciones;
+        cotizacionesCursor = pagina.siguiente_cursor;
         
         // Actualizar badge
         const badgeCotizaciones = document.getElementById('badge-cotizaciones');
-        if (badgeCotizaciones) {
-            badgeCotizaciones.textContent = cotizaciones.length;
+        if (badgeCotizaciones && pagina.total !== undefined) {
+            badgeCotizaciones.textContent = pagina.total;
+        }
+        
+        const botonMas = document.getElementById('cotizaciones-cargar-mas');
+        if (botonMas) {
+            botonMas.style.display = cotizacionesCursor ? 'block' : 'none';
         }
         
         const tbody = document.getElementById('cotizaciones-tbody');
@@ -334,34 +389,11 @@ async function cargarCotizaciones() {
             return;
         }
         
-        tbody.innerHTML = cotizaciones.map(cot => {
-            const estadoAprobacion = cot.estado_aprobacion || 'pendiente';
-            const iconoEstado = estadoAprobacion === 'aprobado' ? '✅' : 
-                               estadoAprobacion === 'rechazado' ? '❌' : '⏳';
-            const colorEstado = estadoAprobacion === 'aprobado' ? '#28a745' : 
-                               estadoAprobacion === 'rechazado' ? '#dc3545' : '#ffc107';
-            
-            return `
-            <tr>
-                <td><strong>${cot.numero_cotizacion}</strong></td>
-                <td>${cot.cliente_nombre}</td>
-                <td>${formatearFecha(cot.fecha_creacion)}</td>
-                <td><strong>$${parseFloat(cot.total).toFixed(2)}</strong></td>
-                <td>
-                    <span style="display: inline-flex; align-items: center; padding: 5px 10px; background: ${colorEstado}20; color: ${colorEstado}; border-radius: 5px; font-weight: 600;">
-                        ${iconoEstado} ${estadoAprobacion.charAt(0).toUpperCase() + estadoAprobacion.slice(1)}
-                    </span>
-                </td>
-                <td>
-                    <button class="btn btn-primary btn-sm" onclick="verCotizacion(${cot.id})">Ver</button>
-                    <button class="btn btn-warning btn-sm" onclick="editarCotizacion(${cot.id})">Editar</button>
-                    <button class="btn btn-success btn-sm" onclick="descargarPDF(${cot.id})">PDF</button>
-                    <button class="btn btn-secondary btn-sm" onclick="enviarEmail(${cot.id})">Email</button>
-                    <button class="btn btn-danger btn-sm" onclick="eliminarCotizacion(${cot.id})">Eliminar</button>
-                </td>
-            </tr>
-            `;
-        }).join('');
+        if (cargarMas) {
+            tbody.insertAdjacentHTML('beforeend', pagina.cotizaciones.map(renderFilaCotizacion).join(''));
+        } else {
+            tbody.innerHTML = cotizaciones.map(renderFilaCotizacion).join('');
+        }
         
     } catch (error) {
         console.error('Error al cargar cotizaciones:', error);
@@ -372,8 +404,7 @@ async function cargarCotizaciones() {
 async function cargarClientesSelect() {
     try {
         if (clientes.length === 0) {
-            const response = await fetch('/api/clientes');
-            clientes = await response.json();
+            clientes = await obtenerColeccion('clientes', '/api/clientes');
         }
         
         const select = document.getElementById('cotizacion-cliente');
@@ -390,8 +421,7 @@ async function cargarClientesSelect() {
 // Cargar productos
 async function cargarProductos() {
     try {
-        const response = await fetch('/api/productos');
-        productos = await response.json();
+        productos = await fetchJSONCondicional('/api/productos');
         console.log('Productos cargados:', productos.length);
     } catch (error) {
         console.error('Error al cargar productos:', error);
@@ -811,8 +841,8 @@ async function descargarPDF(cotizacionId) {
     try {
         showNotification('Generando PDF...', 'info');
         
-        // Obtener datos de la cotización para el nombre del archivo
-        const cotizacionResponse = await fetch(`/api/cotizaciones/${cotizacionId}`);
+        // Obtener datos de la cotización para el nombre del archivo (sólo encabezado)
+        const cotizacionResponse = await fetch(`/api/cotizaciones/${cotizacionId}?include=`);
         const cotizacion = await cotizacionResponse.json();
         
         const response = await fetch(`/api/cotizaciones/${cotizacionId}/pdf`);
@@ -926,6 +956,12 @@ function formatearFecha(fecha) {
     });
 }
 
+function formatearTamano(bytes) {
+    if (!bytes) return '0 KB';
+    if (bytes < 1024 * 1024) return `${Math.max(1, Math.round(bytes / 1024))} KB`;
+    return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+}
+
 function showNotification(message, type = 'info') {
     const notification = document.getElementById('notification');
     notification.textContent = message;
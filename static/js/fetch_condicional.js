@@ -0,0 +1,25 @@
+// GET condicional para listados: se guarda la última respuesta de cada URL con
+// su ETag y se reenvía en If-None-Match; un 304 reutiliza los datos guardados.
+const respuestasConETag = new Map();
+
+async function fetchJSONCondicional(url) {
+    const previa = respuestasConETag.get(url);
+    const response = await fetch(url, {
+        // Los validadores se manejan aquí, no en la caché HTTP del navegador
+        cache: 'no-store',
+        headers: previa ? { 'If-None-Match': previa.etag } : {}
+    });
+    
+    if (response.status === 304 && previa) {
+        return previa.datos;
+    }
+    
+    const datos = await response.json();
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) {
+        respuestasConETag.set(url, { etag, datos });
+    } else {
+        respuestasConETag.delete(url);
+    }
+    return datos;
+}
@@ -111,8 +111,7 @@ function volverAlInicio() {
 
 async function cargarProductos() {
     try {
-        const response = await fetch('/api/productos');
-        productosCotizacion = await response.json();
+        productosCotizacion = await fetchJSONCondicional('/api/productos');
     } catch (error) {
         console.error('Error al cargar productos:', error);
     }
@@ -120,8 +119,7 @@ async function cargarProductos() {
 
 async function cargarClientesSelect() {
     try {
-        const response = await fetch('/api/clientes');
-        const clientes = await response.json();
+        const clientes = await obtenerColeccion('clientes', '/api/clientes');
         
         const select = document.getElementById('cotizacion-cliente');
         select.innerHTML = '<option value="">Seleccione un cliente...</option>';
@@ -223,6 +221,20 @@ function calcularTotales() {
     document.getElementById('total-display').textContent = `$${total.toFixed(2)}`;
 }
 
+// Misma clave para reintentar el mismo cuerpo tras un fallo de red o un 5xx (el
+// servidor repite la respuesta original); con respuesta definitiva se descarta
+let ultimaCreacion = { cuerpo: null, clave: null };
+
+function claveIdempotencia(cuerpo) {
+    if (ultimaCreacion.cuerpo !== cuerpo) {
+        const clave = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+        ultimaCreacion = { cuerpo, clave };
+    }
+    return ultimaCreacion.clave;
+}
+
 async function crearCotizacion(e) {
     e.preventDefault();
 
@@ -236,6 +248,7 @@ async function crearCotizacion(e) {
         
         if (cantidad > 0 && precio >= 0) {
             items.push({
+                id: itemDiv.dataset.itemId || null,
                 producto_id: productoSelect.value || null,
                 concepto: productoSelect.options[productoSelect.selectedIndex].text,
                 descripcion: itemDiv.querySelector('.item-descripcion').value,
@@ -268,12 +281,17 @@ async function crearCotizacion(e) {
                 body: JSON.stringify(data)
             });
         } else {
-            // Crear nueva cotización
+            // Crear nueva cotización (un doble clic o reintento con los mismos datos no la duplica)
+            const cuerpo = JSON.stringify(data);
             response = await fetch('/api/cotizaciones', {
                 method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify(data)
+                headers: {'Content-Type': 'application/json', 'Idempotency-Key': claveIdempotencia(cuerpo)},
+                body: cuerpo
             });
+            if (response.status < 500) {
+                // Creada (o rechazada): otra cotización igual a propósito lleva clave nueva
+                ultimaCreacion = { cuerpo: null, clave: null };
+            }
         }
         
         if (response.ok) {
@@ -546,7 +564,7 @@ document.addEventListener('DOMContentLoaded', function() {
 // Cargar cotización para editar
 async function cargarCotizacionParaEditar(cotizacionId) {
     try {
-        const response = await fetch(`/api/cotizaciones/${cotizacionId}`);
+        const response = await fetch(`/api/cotizaciones/${cotizacionId}?include=items,adjuntos`);
         const cotizacion = await response.json();
         
         // Guardar ID de cotización en edición
@@ -578,6 +596,9 @@ async function cargarCotizacionParaEditar(cotizacionId) {
             
             const itemDiv = document.getElementById(`item-${itemCounterCotizacion}`);
             if (itemDiv) {
+                // Conservar el id para que el servidor sólo guarde los cambios
+                itemDiv.dataset.itemId = item.id;
+                
                 const productoSelect = itemDiv.querySelector('.item-producto');
                 const conceptoInput = itemDiv.querySelector('.item-concepto');
                 const descripcionInput = itemDiv.querySelector('.item-descripcion');
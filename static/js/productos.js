@@ -3,6 +3,9 @@ let productos = [];
 let categorias = [];
 let modoEdicion = false;
 let usuarioActual = null;
+let busquedaTimeout = null;
+
+const LIMITE_BUSQUEDA_PRODUCTOS = 100;
 
 // Inicialización
 document.addEventListener('DOMContentLoaded', function() {
@@ -74,8 +77,7 @@ async function cerrarSesion() {
 // Cargar categorías
 async function cargarCategorias() {
     try {
-        const response = await fetch('/api/categorias');
-        categorias = await response.json();
+        categorias = await fetchJSONCondicional('/api/categorias');
         
         // Actualizar select de filtro
         const selectFiltro = document.getElementById('filtroCategoria');
@@ -102,9 +104,13 @@ async function cargarProductos() {
         const incluirInactivos = document.getElementById('mostrarInactivos').checked;
         const filtroTipo = document.getElementById('filtroTipo').value;
         const filtroCategoria = document.getElementById('filtroCategoria').value;
+        const buscar = document.getElementById('filtroBuscar').value.trim();
         
-        const response = await fetch(`/api/productos?incluir_inactivos=${incluirInactivos}`);
-        productos = await response.json();
+        // Con texto de búsqueda el servidor filtra y ordena por relevancia (FTS5)
+        const url = buscar
+            ? `/api/productos/search?q=${encodeURIComponent(buscar)}&limite=${LIMITE_BUSQUEDA_PRODUCTOS}&incluir_inactivos=${incluirInactivos}`
+            : `/api/productos?incluir_inactivos=${incluirInactivos}`;
+        productos = await fetchJSONCondicional(url);
         
         // Aplicar filtros
         let productosFiltrados = productos;
@@ -170,21 +176,10 @@ async function cargarProductos() {
     }
 }
 
-// Filtrar tabla en tiempo real
+// Filtrar tabla en tiempo real (búsqueda en el servidor al dejar de escribir)
 function filtrarTabla() {
-    const buscar = document.getElementById('filtroBuscar').value.toLowerCase();
-    const filas = document.querySelectorAll('#tablaProductos tr');
-    
-    filas.forEach(fila => {
-        const codigo = fila.getAttribute('data-codigo') || '';
-        const nombre = fila.getAttribute('data-nombre') || '';
-        
-        if (codigo.toLowerCase().includes(buscar) || nombre.includes(buscar)) {
-            fila.style.display = '';
-        } else {
-            fila.style.display = 'none';
-        }
-    });
+    clearTimeout(busquedaTimeout);
+    busquedaTimeout = setTimeout(cargarProductos, 250);
 }
 
 // Abrir modal para nuevo producto
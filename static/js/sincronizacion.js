@@ -0,0 +1,47 @@
+// Colecciones sincronizadas por deltas con /api/changes: la primera vez se
+// descarga el listado completo; después sólo las filas cambiadas, las bajas
+// y las archivadas.
+const coleccionesSincronizadas = {};
+
+function ordenarPorNombre(a, b) {
+    return a.nombre < b.nombre ? -1 : a.nombre > b.nombre ? 1 : 0;
+}
+
+async function cargarColeccionCompleta(tabla, urlCompleta) {
+    // El cursor se toma antes del listado: un cambio intermedio llega dos veces, no se pierde
+    const inicio = await (await fetch(`/api/changes?tablas=${tabla}`)).json();
+    const filas = await (await fetch(urlCompleta)).json();
+    coleccionesSincronizadas[tabla] = {
+        cursor: inicio.cursor,
+        filas: new Map(filas.map(fila => [fila.id, fila]))
+    };
+}
+
+async function obtenerColeccion(tabla, urlCompleta, ordenar = ordenarPorNombre) {
+    let estado = coleccionesSincronizadas[tabla];
+    
+    if (!estado) {
+        await cargarColeccionCompleta(tabla, urlCompleta);
+    } else {
+        let hayMas = true;
+        while (hayMas) {
+            const response = await fetch(`/api/changes?since=${estado.cursor}&tablas=${tabla}`);
+            const delta = await response.json();
+            
+            if (!response.ok || delta.reiniciar) {
+                // Cursor anterior a la compactación de la bitácora
+                await cargarColeccionCompleta(tabla, urlCompleta);
+                break;
+            }
+            
+            delta.cambios[tabla].forEach(fila => estado.filas.set(fila.id, fila));
+            delta.eliminados[tabla].forEach(id => estado.filas.delete(id));
+            // Archivadas: salen del listado vigente (se consultan con ?archivo=1)
+            delta.archivados[tabla].forEach(id => estado.filas.delete(id));
+            estado.cursor = delta.cursor;
+            hayMas = delta.hay_mas;
+        }
+    }
+    
+    return Array.from(coleccionesSincronizadas[tabla].filas.values()).sort(ordenar);
+}
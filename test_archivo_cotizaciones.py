@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas del archivo de cotizaciones (archive.db adjunta con ATTACH)
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+import app as aplicacion
+from database import Database
+
+
+ITEMS = [
+    {'concepto': 'Detector', 'cantidad': 2, 'precio_unitario': 100.0},
+    {'concepto': 'Instalación', 'cantidad': 1, 'precio_unitario': 50.0},
+]
+
+
+def _antiguedad(db, cotizacion_id, dias, columna='fecha_creacion'):
+    conn = sqlite3.connect(db.db_path)
+    conn.execute(f"UPDATE cotizaciones SET {columna} = datetime('now', ?) WHERE id = ?",
+                 (f'-{dias} days', cotizacion_id))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'principal.db'))
+    cliente_id = db.crear_cliente('Cliente', 'c@test.com')
+    ids = [db.crear_cotizacion(cliente_id, ITEMS)[0] for _ in range(5)]
+
+    for cotizacion_id in ids[:3]:
+        _antiguedad(db, cotizacion_id, 800)
+    # Aprobada hace 200 días (estado final)
+    token = db.obtener_cotizacion(ids[3])['token_aprobacion']
+    db.actualizar_estado_aprobacion(token, 'aprobado')
+    _antiguedad(db, ids[3], 250)
+    _antiguedad(db, ids[3], 200, 'fecha_aprobacion')
+    db.agregar_adjuntos(ids[0], [{
+        'nombre_original': 'plano.pdf', 'nombre_archivo': 'x_plano.pdf', 'ruta_archivo': 'uploads/x_plano.pdf'
+    }])
+    db.ids = ids
+    return db
+
+
+def test_archiva_viejas_y_cerradas_por_lotes(db):
+    """Se mueven las viejas y las cerradas; la reciente abierta se queda"""
+    assert not db.archivo_disponible()
+    resultado = db.archivar_cotizaciones(dias=730, dias_estado_final=180, tamano_lote=2)
+
+    assert resultado == {'cotizaciones': 4, 'lotes': 2, 'pendientes': False}
+    assert db.archivo_disponible()
+    assert [c['id'] for c in db.obtener_cotizaciones()] == [db.ids[4]]
+
+    conn = sqlite3.connect(db.db_path)
+    assert conn.execute('SELECT COUNT(*) FROM cotizacion_items').fetchone()[0] == 2
+    assert conn.execute('SELECT COUNT(*) FROM cotizacion_adjuntos').fetchone()[0] == 0
+    conn.close()
+
+    # Una segunda corrida no encuentra nada ni duplica
+    assert db.archivar_cotizaciones(dias=730, dias_estado_final=180)['cotizaciones'] == 0
+    conn = sqlite3.connect(db.archivo_path)
+    assert conn.execute('SELECT COUNT(*) FROM cotizaciones').fetchone()[0] == 4
+    assert conn.execute('SELECT COUNT(*) FROM cotizacion_items').fetchone()[0] == 8
+    conn.close()
+
+
+def test_estado_final_cuenta_desde_la_aprobacion(db):
+    """Una cotización vieja pero aprobada hace poco no se archiva todavía"""
+    cotizacion_id, _ = db.crear_cotizacion(1, ITEMS)
+    db.actualizar_estado_aprobacion(db.obtener_cotizacion(cotizacion_id)['token_aprobacion'], 'aprobado')
+    _antiguedad(db, cotizacion_id, 400)
+    _antiguedad(db, cotizacion_id, 1, 'fecha_aprobacion')
+
+    db.archivar_cotizaciones(dias=730, dias_estado_final=180)
+    assert sorted(c['id'] for c in db.obtener_cotizaciones()) == [db.ids[4], cotizacion_id]
+
+    _antiguedad(db, cotizacion_id, 181, 'fecha_aprobacion')
+    assert db.archivar_cotizaciones(dias=730, dias_estado_final=180)['cotizaciones'] == 1
+
+
+def test_archivadas_no_son_bajas_en_la_bitacora(db):
+    """/api/changes entrega las archivadas en `archivados`, no como eliminadas"""
+    cursor = db.obtener_cambios()['cursor']
+    db.archivar_cotizaciones(dias=730, dias_estado_final=180)
+    db.eliminar_cotizacion(db.ids[4])
+
+    delta = db.obtener_cambios(cursor)
+    assert delta['archivados']['cotizaciones'] == db.ids[:4]
+    assert delta['eliminados']['cotizaciones'] == [db.ids[4]]
+    assert delta['cambios']['cotizaciones'] == []
+
+
+def test_archivadas_se_leen_solo_si_se_piden(db):
+    """obtener_cotizacion y listar_cotizaciones leen el archivo con archivo=True"""
+    db.archivar_cotizaciones(dias=730, dias_estado_final=180)
+
+    assert db.obtener_cotizacion(db.ids[0]) is None
+    archivada = db.obtener_cotizacion(db.ids[0], archivo=True)
+    assert archivada['archivada'] is True
+    assert archivada['nombre'] == 'Cliente'
+    assert [i['concepto'] for i in archivada['items']] == ['Detector', 'Instalación']
+    assert [a['nombre_original'] for a in archivada['adjuntos']] == ['plano.pdf']
+    # Las vigentes no se marcan
+    assert 'archivada' not in db.obtener_cotizacion(db.ids[4], archivo=True)
+
+    pagina = db.listar_cotizaciones(archivo=True, con_total=True, limite=3)
+    assert pagina['total'] == 4 and len(pagina['cotizaciones']) == 3
+    siguiente = db.listar_cotizaciones(archivo=True, cursor=pagina['siguiente_cursor'])
+    assert len(siguiente['cotizaciones']) == 1
+    assert db.listar_cotizaciones(archivo=True, estado_aprobacion='aprobado')['cotizaciones'][0]['id'] == db.ids[3]
+
+
+def test_cliente_con_cotizaciones_archivadas_no_se_elimina(tmp_path):
+    """Un cliente cuyas cotizaciones están todas en el archivo no se puede eliminar"""
+    db = Database(str(tmp_path / 'clientes.db'))
+    cliente_id = db.crear_cliente('Archivado', 'a@test.com')
+    libre_id = db.crear_cliente('Sin cotizaciones', 'l@test.com')
+    cotizacion_id, _ = db.crear_cotizacion(cliente_id, ITEMS)
+    db.archivar_cotizaciones(dias=-1, dias_estado_final=-1)
+    assert db.obtener_cotizaciones() == []
+
+    with pytest.raises(ValueError):
+        db.eliminar_cliente(cliente_id)
+    assert db.obtener_cotizacion(cotizacion_id, archivo=True)['cliente_nombre'] == 'Archivado'
+    assert [c['id'] for c in db.listar_cotizaciones(archivo=True)['cotizaciones']] == [cotizacion_id]
+    assert db.eliminar_cliente(libre_id)
+
+
+def test_sin_archivo_y_max_lotes(tmp_path, db):
+    """Sin archive.db las lecturas devuelven vacío; max_lotes deja pendientes"""
+    assert db.listar_cotizaciones(archivo=True, con_total=True) == {
+        'cotizaciones': [], 'siguiente_cursor': None, 'total': 0
+    }
+    assert db.obtener_cotizacion(999, archivo=True) is None
+
+    resultado = db.archivar_cotizaciones(dias=730, dias_estado_final=180, tamano_lote=1, max_lotes=2)
+    assert resultado == {'cotizaciones': 2, 'lotes': 2, 'pendientes': True}
+
+
+def test_columnas_nuevas_se_agregan_al_archivo(db):
+    """Una columna agregada en la principal aparece en el archivo en la siguiente corrida"""
+    db.archivar_cotizaciones(dias=730, dias_estado_final=10000, max_lotes=1, tamano_lote=1)
+    conn = sqlite3.connect(db.db_path)
+    conn.execute('ALTER TABLE cotizaciones ADD COLUMN referencia TEXT')
+    conn.execute("UPDATE cotizaciones SET referencia = 'OC-1'")
+    conn.commit()
+    conn.close()
+
+    db.archivar_cotizaciones(dias=730, dias_estado_final=10000)
+    conn = sqlite3.connect(db.archivo_path)
+    referencias = [row[0] for row in conn.execute('SELECT referencia FROM cotizaciones ORDER BY id')]
+    conn.close()
+    assert referencias == [None, 'OC-1', 'OC-1']
+
+
+def test_endpoints_con_archivo(db, monkeypatch):
+    """?archivo=1 en el detalle y el listado de la API"""
+    db.archivar_cotizaciones(dias=730, dias_estado_final=180)
+    monkeypatch.setattr(aplicacion, 'db', db)
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['rol'] = 'admin'
+
+    assert cliente.get(f'/api/cotizaciones/{db.ids[1]}').status_code == 404
+    assert cliente.get(f'/api/cotizaciones/{db.ids[1]}?archivo=1').get_json()['archivada'] is True
+    assert len(cliente.get('/api/cotizaciones?archivo=1').get_json()['cotizaciones']) == 4
+    assert os.path.basename(db.archivo_path) == 'archive.db'
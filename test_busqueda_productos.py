@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la búsqueda de texto completo de productos (FTS5)
+"""
+
+from database import Database
+
+
+def _preparar(tmp_path):
+    db = Database(str(tmp_path / 'busqueda.db'))
+    ids = {
+        'cam': db.crear_producto('CAM-01', 'Cámara domo', 'Cámara IP de interior', 'producto', 1500.0,
+                                 categoria='Videovigilancia'),
+        'nvr': db.crear_producto('NVR-08', 'Grabador de video', 'Soporta ocho cámaras', 'producto', 4000.0,
+                                 categoria='Videovigilancia'),
+        'inst': db.crear_producto('INST-01', 'Instalación', 'Montaje y configuración en sitio', 'servicio', 800.0,
+                                  categoria='Servicios'),
+    }
+    for i in range(20):
+        db.crear_producto(f'CAB-{i:02d}', f'Cable UTP {i}', 'Bobina de cable', 'producto', 10.0, categoria='Cableado')
+    return db, ids
+
+
+def _codigos(productos):
+    return [producto['codigo'] for producto in productos]
+
+
+def test_sin_acentos_prefijos_y_ranking(tmp_path):
+    """'camara' encuentra 'Cámara'; el nombre pesa más que la descripción"""
+    db, _ = _preparar(tmp_path)
+
+    assert _codigos(db.buscar_productos('camara')) == ['CAM-01', 'NVR-08']
+    assert _codigos(db.buscar_productos('INSTALACION')) == ['INST-01']
+    assert _codigos(db.buscar_productos('config')) == ['INST-01']
+    assert _codigos(db.buscar_productos('cam-01')) == ['CAM-01']
+    assert _codigos(db.buscar_productos('video camaras')) == ['NVR-08']
+    assert len(db.buscar_productos('cable', limite=5)) == 5
+
+
+def test_texto_vacio_o_con_sintaxis_fts(tmp_path):
+    """Operadores y comillas del usuario no rompen la consulta"""
+    db, _ = _preparar(tmp_path)
+
+    assert db.buscar_productos('') == []
+    assert db.buscar_productos('  "* -') == []
+    assert _codigos(db.buscar_productos('"domo" OR')) == []
+    assert _codigos(db.buscar_productos('domo (')) == ['CAM-01']
+
+
+def test_triggers_mantienen_el_indice(tmp_path):
+    """Altas, cambios y desactivaciones se reflejan sin reconstruir el índice"""
+    db, ids = _preparar(tmp_path)
+
+    db.actualizar_producto(ids['cam'], nombre='Bala exterior', descripcion='IP67')
+    assert db.buscar_productos('domo') == []
+    assert _codigos(db.buscar_productos('bala')) == ['CAM-01']
+
+    db.eliminar_producto(ids['inst'])
+    assert db.buscar_productos('instalacion') == []
+    assert _codigos(db.buscar_productos('instalacion', incluir_inactivos=True)) == ['INST-01']
+
+    db.crear_producto('SW-01', 'Switch PoE', 'Alimenta cámaras', 'producto', 2500.0)
+    assert 'SW-01' in _codigos(db.buscar_productos('poe'))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la caché del catálogo de productos por worker
+"""
+
+import sqlite3
+
+from database import Database
+
+
+def _preparar(tmp_path):
+    db = Database(str(tmp_path / 'cache.db'))
+    db.crear_producto('CAM-01', 'Cámara', 'Domo', 'producto', 1500.0, categoria='Video')
+    db.crear_producto('INST', 'Instalación', '', 'servicio', 800.0, categoria='Servicios')
+    return db
+
+
+def test_lecturas_repetidas_usan_la_cache(tmp_path):
+    """Sólo la primera lectura carga; productos, categorías y códigos comparten instantánea"""
+    db = _preparar(tmp_path)
+    antes = db.cache_stats()
+
+    assert [p['codigo'] for p in db.obtener_productos()] == ['CAM-01', 'INST']
+    assert db.obtener_categorias() == ['Servicios', 'Video']
+    assert db.buscar_producto_por_codigo('INST')['precio'] == 800.0
+    assert db.buscar_producto_por_codigo('NO-EXISTE') is None
+
+    stats = db.cache_stats()
+    assert stats['misses'] - antes['misses'] == 1
+    assert stats['hits'] - antes['hits'] == 3
+
+
+def test_escrituras_propias_invalidan(tmp_path):
+    """crear/actualizar/eliminar producto se ven en la siguiente lectura"""
+    db = _preparar(tmp_path)
+    db.obtener_productos()
+
+    nuevo = db.crear_producto('NVR', 'Grabador', '', 'producto', 4000.0, categoria='Video')
+    assert 'NVR' in [p['codigo'] for p in db.obtener_productos()]
+
+    db.actualizar_producto(nuevo, precio=3900.0)
+    assert db.buscar_producto_por_codigo('NVR')['precio'] == 3900.0
+
+    db.eliminar_producto(nuevo)
+    assert db.buscar_producto_por_codigo('NVR') is None
+    assert db.cache_stats()['invalidaciones'] >= 3
+
+
+def test_cambios_de_otro_proceso_se_detectan(tmp_path):
+    """Una escritura fuera de este worker sube el contador de la tabla y fuerza la recarga"""
+    db = _preparar(tmp_path)
+    assert db.obtener_categorias() == ['Servicios', 'Video']
+
+    otra = sqlite3.connect(db.db_path)
+    otra.execute("UPDATE productos SET categoria = 'Cableado' WHERE codigo = 'INST'")
+    otra.commit()
+    otra.close()
+
+    assert db.obtener_categorias() == ['Cableado', 'Video']
+    assert db.buscar_producto_por_codigo('INST')['categoria'] == 'Cableado'
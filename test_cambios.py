@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la bitácora de cambios y la sincronización incremental (/api/changes)
+"""
+
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / 'cambios.db'))
+
+
+def test_altas_cambios_y_bajas_desde_un_cursor(db):
+    """Sólo lo modificado después del cursor; borrados y desactivaciones como bajas"""
+    cliente_a = db.crear_cliente('A', 'a@test.com')
+    cliente_b = db.crear_cliente('B', 'b@test.com')
+    producto = db.crear_producto('P-1', 'Producto', '', 'producto', 10.0)
+    cursor = db.obtener_cambios()['cursor']
+
+    db.actualizar_cliente(cliente_a, 'A2', 'a@test.com')
+    db.eliminar_cliente(cliente_b)
+    db.eliminar_producto(producto)
+    cotizacion_id, _ = db.crear_cotizacion(cliente_a, [])
+
+    delta = db.obtener_cambios(cursor)
+    assert [c['nombre'] for c in delta['cambios']['clientes']] == ['A2']
+    assert delta['eliminados']['clientes'] == [cliente_b]
+    assert delta['cambios']['productos'] == [] and delta['eliminados']['productos'] == [producto]
+    assert delta['cambios']['cotizaciones'][0]['id'] == cotizacion_id
+    assert delta['cambios']['cotizaciones'][0]['cliente_nombre'] == 'A2'
+    assert delta['cursor'] > cursor and not delta['hay_mas'] and not delta['reiniciar']
+
+    vacio = db.obtener_cambios(delta['cursor'])
+    assert vacio['cambios']['clientes'] == [] and vacio['cursor'] == delta['cursor']
+
+
+def test_updated_at_y_una_entrada_por_escritura(db):
+    """updated_at se llena en altas y cambios; cada escritura deja una sola entrada"""
+    cliente_id = db.crear_cliente('A', 'a@test.com')
+    assert db.obtener_cliente(cliente_id)['updated_at']
+
+    cursor = db.obtener_cambios()['cursor']
+    db.actualizar_cliente(cliente_id, 'A2', 'a@test.com')
+    assert db.obtener_cambios()['cursor'] == cursor + 1
+
+
+def test_paginacion_y_filtro_de_tablas(db):
+    """limite corta la bitácora; el cursor devuelto continúa donde se quedó"""
+    for i in range(5):
+        db.crear_cliente(f'C{i}', f'c{i}@test.com')
+    db.crear_producto('P-1', 'Producto', '', 'producto', 10.0)
+
+    vistos = []
+    cursor = 0
+    while True:
+        delta = db.obtener_cambios(cursor, tablas=['clientes'], limite=2)
+        vistos += [c['nombre'] for c in delta['cambios']['clientes']]
+        assert 'productos' not in delta['cambios']
+        cursor = delta['cursor']
+        if not delta['hay_mas']:
+            break
+    assert vistos == ['C0', 'C1', 'C2', 'C3', 'C4']
+
+    with pytest.raises(ValueError):
+        db.obtener_cambios(0, tablas=['usuarios'])
+
+
+def test_compactacion_y_reinicio(db):
+    """Compactar quita entradas superadas; purgar obliga a resincronizar cursores viejos"""
+    cliente_id = db.crear_cliente('A', 'a@test.com')
+    for i in range(3):
+        db.actualizar_cliente(cliente_id, f'A{i}', 'a@test.com')
+
+    resultado = db.compactar_cambios(dias=30)
+    assert resultado['superadas'] == 3 and resultado['purgadas'] == 0
+    assert [c['nombre'] for c in db.obtener_cambios(0)['cambios']['clientes']] == ['A2']
+
+    resultado = db.compactar_cambios(dias=-1)
+    assert resultado['purgadas'] == 1
+    assert db.obtener_cambios(0)['reiniciar']
+    actual = db.obtener_cambios()['cursor']
+    assert actual == resultado['purgados_hasta']
+    assert not db.obtener_cambios(actual)['reiniciar']
+
+
+def test_versiones_y_bitacora_solo_por_columnas_sincronizadas(db):
+    """Altas y cambios suben la versión una vez; columnas internas no dejan entrada ni mueven updated_at"""
+    cliente_id = db.crear_cliente('A', 'a@test.com')
+    assert db.versiones_tablas('clientes') == (1,)
+    db.actualizar_cliente(cliente_id, 'A2', 'a@test.com')
+    assert db.versiones_tablas('clientes') == (2,)
+
+    cotizacion_id, _ = db.crear_cotizacion(cliente_id, [])
+    cursor = db.obtener_cambios()['cursor']
+    version = db.versiones_tablas('cotizaciones')
+    conn = db._conexion_escritura()
+    conn.execute("UPDATE cotizaciones SET updated_at = '2000-01-01 00:00:00' WHERE id = ?", (cotizacion_id,))
+    conn.execute("UPDATE cotizaciones SET token_aprobacion = 'otro' WHERE id = ?", (cotizacion_id,))
+    conn.commit()
+    updated_at = conn.execute('SELECT updated_at FROM cotizaciones WHERE id = ?', (cotizacion_id,)).fetchone()[0]
+    conn.close()
+
+    assert db.obtener_cambios()['cursor'] == cursor
+    assert db.versiones_tablas('cotizaciones') == version
+    assert updated_at == '2000-01-01 00:00:00'
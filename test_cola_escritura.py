@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la cola de escritura con commit agrupado
+"""
+
+import threading
+
+import pytest
+
+from cola_escritura import ColaEscritura
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / 'cola.db'), cola_escritura=True)
+
+
+def test_escrituras_concurrentes_se_agrupan(db):
+    """Muchos hilos escribiendo a la vez comparten commits y nadie pierde su resultado"""
+    db._cola.max_espera = 0.02
+    ids = []
+    errores = []
+
+    def escribir(n):
+        try:
+            ids.append(db.crear_cliente(f'Cliente {n}', f'c{n}@test.com'))
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=escribir, args=(n,)) for n in range(40)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == []
+    assert sorted(ids) == list(range(1, 41))
+    assert len(db.obtener_clientes()) == 40
+
+    stats = db.cola_stats()
+    assert stats['operaciones'] == 40
+    assert stats['lote_max'] > 1
+    assert stats['commits'] < 40
+    assert sum(stats['histograma_lotes'].values()) == stats['commits']
+
+
+def test_error_de_una_operacion_no_afecta_al_lote(tmp_path):
+    """Una operación que falla se revierte sola; las demás del mismo lote se confirman"""
+    db = Database(str(tmp_path / 'cola.db'), cola_escritura=False)
+    cola = ColaEscritura(db.db_path, max_espera_ms=50)
+    resultados = {}
+
+    def fallar(conn):
+        conn.execute("INSERT INTO clientes (nombre, email) VALUES ('Fallida', 'f@test.com')")
+        raise ValueError('rechazada')
+
+    def insertar(nombre):
+        return lambda conn: conn.execute(
+            'INSERT INTO clientes (nombre, email) VALUES (?, ?)', (nombre, 'ok@test.com')
+        ).lastrowid
+
+    def correr(nombre, fn):
+        try:
+            resultados[nombre] = cola.ejecutar(fn)
+        except ValueError as e:
+            resultados[nombre] = e
+
+    hilos = [threading.Thread(target=correr, args=args) for args in
+             [('a', insertar('A')), ('error', fallar), ('b', insertar('B'))]]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert isinstance(resultados['error'], ValueError)
+    assert sorted(c['nombre'] for c in db.obtener_clientes()) == ['A', 'B']
+    stats = cola.stats()
+    assert stats['operaciones'] == 3 and stats['errores'] == 1
+    assert stats['commits_fallidos'] == 0
+
+
+def test_excepciones_de_negocio_llegan_a_quien_llama(db):
+    """Las validaciones dentro de la escritura se relanzan igual que sin cola"""
+    cliente_id = db.crear_cliente('Cliente', 'c@test.com')
+    db.crear_cotizacion(cliente_id, [{'concepto': 'X', 'cantidad': 1, 'precio_unitario': 10.0}])
+
+    with pytest.raises(ValueError):
+        db.eliminar_cliente(cliente_id)
+    assert db.obtener_cliente(cliente_id) is not None
+
+
+def test_sin_cola_escribe_directo(tmp_path):
+    """Con la cola desactivada las escrituras usan el pool y no hay estadísticas"""
+    db = Database(str(tmp_path / 'directo.db'), cola_escritura=False)
+    cliente_id = db.crear_cliente('Cliente', 'c@test.com')
+
+    assert db.actualizar_cliente(cliente_id, 'Renombrado', 'c@test.com')
+    assert db.obtener_cliente(cliente_id)['nombre'] == 'Renombrado'
+    assert db.cola_stats() is None
+
+
+def test_falla_del_hilo_escritor_deja_traza(db, monkeypatch, capsys):
+    """Un error inesperado del lote se reporta con su traza y llega a quien encoló"""
+    db.crear_cliente('Cliente', 'c@test.com')
+
+    def confirmar_roto(lote):
+        raise RuntimeError('estado inconsistente')
+
+    monkeypatch.setattr(db._cola, '_confirmar', confirmar_roto)
+    with pytest.raises(RuntimeError, match='estado inconsistente'):
+        db.crear_cliente('Otro', 'o@test.com')
+
+    salida = capsys.readouterr()
+    assert '[DB] Error en la cola de escritura' in salida.out
+    assert 'Traceback' in salida.err and 'confirmar_roto' in salida.err
+
+
+def test_escrituras_masivas_pasan_por_la_cola(db, monkeypatch):
+    """Importación, reprecio, compactación y archivo usan el hilo escritor, junto con escrituras concurrentes"""
+    cliente_id = db.crear_cliente('Base', 'b@test.com')
+    cotizacion_id, _ = db.crear_cotizacion(cliente_id, [{'concepto': 'Item', 'cantidad': 1, 'precio_unitario': 10.0}])
+
+    def _sin_cola():
+        raise AssertionError('escritura fuera de la cola')
+
+    monkeypatch.setattr(db, '_conexion_escritura', _sin_cola)
+    errores = []
+    detener = threading.Event()
+
+    def escribir():
+        n = 0
+        while not detener.is_set():
+            try:
+                db.crear_cliente(f'Concurrente {n}', f'k{n}@test.com')
+            except Exception as e:
+                errores.append(e)
+            n += 1
+
+    hilos = [threading.Thread(target=escribir) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    try:
+        importados = db.importar_productos(
+            ('codigo', 'nombre', 'precio'),
+            ({'codigo': f'P-{i:04d}', 'nombre': f'Producto {i}', 'precio': 10.0} for i in range(300)),
+            tamano_lote=50,
+        )
+        simulado = db.repreciar_productos('porcentaje', 10, prefijo_codigo='P-', simular=True)
+        repreciado = db.repreciar_productos('porcentaje', 10, prefijo_codigo='P-')
+        compactado = db.compactar_cambios()
+        archivado = db.archivar_cotizaciones(dias=-1, dias_estado_final=-1, max_lotes=1)
+    finally:
+        detener.set()
+        for hilo in hilos:
+            hilo.join()
+
+    assert errores == []
+    assert importados['insertados'] == 300
+    assert simulado['afectados'] == repreciado['afectados'] == 300
+    assert db.buscar_producto_por_codigo('P-0001')['precio'] == 11.0
+    assert compactado['superadas'] >= 0
+    assert archivado == {'cotizaciones': 1, 'lotes': 1, 'pendientes': False}
+    assert db.obtener_cotizacion(cotizacion_id, archivo=True)['id'] == cotizacion_id
+    # Preparar el archivo y el lote: operaciones exclusivas del hilo escritor
+    assert db.cola_stats()['exclusivas'] == 2
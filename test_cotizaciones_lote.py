@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la creación de cotizaciones en lote
+"""
+
+import pytest
+
+import app as aplicacion
+from database import Database
+
+
+ITEM = {'concepto': 'Instalación', 'cantidad': 2, 'precio_unitario': 100.0}
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'lote.db'))
+    db.crear_cliente('Cliente', 'c@test.com')
+    return db
+
+
+def test_atomico_crea_todas_con_consecutivos(db):
+    """Todas las cotizaciones y sus items se guardan con números consecutivos"""
+    resultado = db.crear_cotizaciones_lote([
+        {'cliente_id': 1, 'items': [ITEM, ITEM]},
+        {'cliente_id': 1, 'items': [ITEM], 'iva_porcentaje': 0, 'notas': 'Sin IVA'},
+    ], creado_por=1)
+
+    assert resultado['errores'] == []
+    assert [c['indice'] for c in resultado['creadas']] == [0, 1]
+    consecutivos = [int(c['numero_cotizacion'].rsplit('-', 1)[1]) for c in resultado['creadas']]
+    assert consecutivos[1] == consecutivos[0] + 1
+
+    primera = db.obtener_cotizacion(resultado['creadas'][0]['id'])
+    segunda = db.obtener_cotizacion(resultado['creadas'][1]['id'])
+    assert len(primera['items']) == 2 and primera['total'] == pytest.approx(464.0)
+    assert len(segunda['items']) == 1 and segunda['total'] == 200.0 and segunda['notas'] == 'Sin IVA'
+
+
+def test_atomico_no_guarda_nada_si_una_es_invalida(db):
+    """Un solo error (cliente inexistente o item inválido) cancela el lote"""
+    resultado = db.crear_cotizaciones_lote([
+        {'cliente_id': 1, 'items': [ITEM]},
+        {'cliente_id': 99, 'items': [ITEM]},
+        {'cliente_id': 1, 'items': [{'concepto': 'X', 'cantidad': -1, 'precio_unitario': 1}]},
+    ])
+
+    assert resultado['creadas'] == []
+    assert [e['indice'] for e in resultado['errores']] == [1, 2]
+    assert 'no existe' in resultado['errores'][0]['error']
+    assert db.obtener_cotizaciones() == []
+
+
+def test_parcial_guarda_las_validas(db):
+    """En modo parcial las filas válidas se guardan y las inválidas se reportan"""
+    resultado = db.crear_cotizaciones_lote([
+        {'cliente_id': 1, 'items': [ITEM]},
+        {'items': [ITEM]},
+        {'cliente_id': 1, 'items': [ITEM]},
+    ], modo='parcial')
+
+    assert [c['indice'] for c in resultado['creadas']] == [0, 2]
+    assert resultado['errores'] == [{'indice': 1, 'error': 'cliente_id inválido'}]
+    assert len(db.obtener_cotizaciones()) == 2
+
+
+@pytest.mark.parametrize('modo', ['atomico', 'parcial'])
+def test_error_de_sqlite_como_error_de_fila(db, modo):
+    """Un fallo de SQLite al insertar (producto inexistente) se reporta en la fila, no como excepción"""
+    huerfano = dict(ITEM, producto_id=999)
+    resultado = db.crear_cotizaciones_lote([
+        {'cliente_id': 1, 'items': [ITEM, ITEM]},
+        {'cliente_id': 1, 'items': [ITEM, huerfano]},
+        {'cliente_id': 1, 'items': [ITEM]},
+    ], modo=modo)
+
+    assert [e['indice'] for e in resultado['errores']] == [1]
+    assert 'FOREIGN KEY' in resultado['errores'][0]['error']
+    if modo == 'atomico':
+        assert resultado['creadas'] == [] and db.obtener_cotizaciones() == []
+    else:
+        assert [c['indice'] for c in resultado['creadas']] == [0, 2]
+        assert sorted(c['items_count'] for c in db.obtener_cotizaciones()) == [1, 2]
+
+
+def test_endpoint_bulk(tmp_path, monkeypatch):
+    """POST /api/cotizaciones/bulk: 201 completo, 207 parcial, 400 atómico con error"""
+    db = Database(str(tmp_path / 'bulk.db'))
+    db.crear_cliente('Cliente', 'c@test.com')
+    monkeypatch.setattr(aplicacion, 'db', db)
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['rol'] = 'admin'
+
+    completo = cliente.post('/api/cotizaciones/bulk', json={'cotizaciones': [{'cliente_id': 1, 'items': [ITEM]}] * 3})
+    assert completo.status_code == 201
+    assert len(completo.get_json()['creadas']) == 3
+
+    lote = [{'cliente_id': 1, 'items': [ITEM]}, {'cliente_id': 5, 'items': [ITEM]}]
+    parcial = cliente.post('/api/cotizaciones/bulk', json={'cotizaciones': lote, 'modo': 'parcial'})
+    assert parcial.status_code == 207
+    assert [e['indice'] for e in parcial.get_json()['errores']] == [1]
+
+    atomico = cliente.post('/api/cotizaciones/bulk', json={'cotizaciones': lote})
+    assert atomico.status_code == 400
+    assert len(db.obtener_cotizaciones()) == 4
+
+    assert cliente.post('/api/cotizaciones/bulk', json={'cotizaciones': []}).status_code == 400
+    assert cliente.post('/api/cotizaciones/bulk', json={'cotizaciones': lote, 'modo': 'otro'}).status_code == 400
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas del pool de conexiones SQLite (db_pool.py)
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import app as aplicacion
+from database import Database
+from db_pool import carril_lectura
+
+
+def test_conexiones_reutilizadas(tmp_path):
+    """Las llamadas sucesivas reutilizan la misma conexión del pool"""
+    db = Database(str(tmp_path / 'pool.db'))
+    for i in range(20):
+        db.crear_cliente(f'Cliente {i}', f'c{i}@test.com')
+        db.obtener_clientes()
+
+    stats = db.pool_stats()
+    assert stats['conexiones_abiertas_total'] == 1
+    assert stats['en_uso'] == 0
+    assert stats['prestamos'] >= 40
+
+
+def test_pragmas_configurados(tmp_path):
+    """Cada conexión se abre en modo WAL con foreign keys activas"""
+    db = Database(str(tmp_path / 'pragmas.db'))
+    conn = db.get_connection()
+    try:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+        assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2  # MEMORY
+    finally:
+        conn.close()
+
+
+def test_transaccion_abierta_se_descarta(tmp_path):
+    """Una conexión devuelta con transacción pendiente se revierte"""
+    db = Database(str(tmp_path / 'rollback.db'))
+    conn = db.get_connection()
+    conn.execute("INSERT INTO clientes (nombre, email) VALUES ('X', 'x@test.com')")
+    conn.close()
+
+    assert db.obtener_clientes() == []
+
+
+def test_espera_cuando_el_pool_esta_lleno(tmp_path):
+    """Con el pool agotado se espera y se contabiliza la espera"""
+    db = Database(str(tmp_path / 'espera.db'))
+    pool = db._pool
+    prestadas = [pool.acquire() for _ in range(pool.max_size)]
+
+    resultado = []
+    hilo = threading.Thread(target=lambda: resultado.append(db.obtener_clientes()))
+    hilo.start()
+    time.sleep(0.2)
+    prestadas.pop().close()
+    hilo.join(timeout=5)
+
+    for conn in prestadas:
+        conn.close()
+
+    assert resultado == [[]]
+    assert pool.stats()['esperas'] >= 1
+
+
+def test_carril_lectura_no_escribe(tmp_path):
+    """En el carril de lectura get_connection() es mode=ro con query_only"""
+    db = Database(str(tmp_path / 'lectura.db'))
+    with carril_lectura():
+        conn = db.get_connection()
+        try:
+            assert conn.execute('PRAGMA query_only').fetchone()[0] == 1
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute("INSERT INTO clientes (nombre, email) VALUES ('X', 'x@test.com')")
+        finally:
+            conn.close()
+        # Los métodos que escriben siguen usando el pool de escritura
+        cliente_id = db.crear_cliente('Cliente', 'c@test.com')
+        assert db.obtener_cliente(cliente_id)['nombre'] == 'Cliente'
+
+    assert db.pool_stats()['lectura']['prestamos'] >= 2
+
+
+def test_lecturas_no_esperan_al_escritor(tmp_path):
+    """Con una transacción de escritura abierta, las lecturas ven el último commit sin bloquearse"""
+    db = Database(str(tmp_path / 'wal.db'))
+    db.crear_cliente('Confirmado', 'c@test.com')
+
+    escritor = db._pool.acquire()
+    try:
+        escritor.execute('BEGIN IMMEDIATE')
+        escritor.execute("INSERT INTO clientes (nombre, email) VALUES ('Pendiente', 'p@test.com')")
+        inicio = time.perf_counter()
+        with carril_lectura():
+            clientes = db.obtener_clientes()
+        assert time.perf_counter() - inicio < 1
+        assert [c['nombre'] for c in clientes] == ['Confirmado']
+    finally:
+        escritor.close()
+
+
+def test_peticiones_get_usan_el_carril_de_lectura(tmp_path, monkeypatch):
+    """Los GET de la API leen por el pool de solo lectura y los POST por el de escritura"""
+    db = Database(str(tmp_path / 'rutas.db'))
+    monkeypatch.setattr(aplicacion, 'db', db)
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['rol'] = 'admin'
+
+    respuesta = cliente.post('/api/clientes', json={'nombre': 'Cliente', 'email': 'c@test.com'})
+    assert respuesta.status_code < 300
+    lecturas = db.pool_stats()['lectura']['prestamos']
+
+    respuesta = cliente.get('/api/clientes')
+    assert respuesta.status_code == 200
+    assert [c['nombre'] for c in respuesta.get_json()] == ['Cliente']
+    assert db.pool_stats()['lectura']['prestamos'] > lecturas
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas del detalle de cotización en una sola consulta (obtener_cotizacion)
+"""
+
+import pytest
+
+from database import Database
+
+
+def _preparar(tmp_path):
+    db = Database(str(tmp_path / 'detalle.db'))
+    # Varios clientes para que el id del cliente no coincida con el de la cotización
+    for i in range(3):
+        db.crear_cliente(f'Otro {i}', f'otro{i}@test.com')
+    cliente_id = db.crear_cliente('Cliente Ñandú', 'cliente@test.com', '449 000 0000', 'Aguascalientes', 'XAXX010101000')
+    producto_id = db.crear_producto('CAM-01', 'Cámara', 'Domo IP', 'producto', 1500.0, imagen_url='/uploads/productos/cam.png')
+    items = [
+        {'producto_id': producto_id, 'concepto': 'Cámara', 'descripcion': 'Domo IP', 'cantidad': 2, 'precio_unitario': 1500.0},
+        {'concepto': 'Instalación', 'cantidad': 1, 'precio_unitario': 800.5},
+    ]
+    cotizacion_id, numero = db.crear_cotizacion(cliente_id, items, notas='Nota')
+    return db, cliente_id, cotizacion_id, numero
+
+
+def test_columnas_de_cotizacion_no_se_pisan(tmp_path):
+    """id y fecha_creacion son los de la cotización; el cliente va aparte"""
+    db, cliente_id, cotizacion_id, numero = _preparar(tmp_path)
+    cotizacion = db.obtener_cotizacion(cotizacion_id)
+
+    assert cotizacion['id'] == cotizacion_id != cliente_id
+    assert cotizacion['numero_cotizacion'] == numero
+    assert cotizacion['cliente']['id'] == cotizacion['cliente_id'] == cliente_id
+    assert cotizacion['nombre'] == cotizacion['cliente_nombre'] == 'Cliente Ñandú'
+    assert cotizacion['rfc'] == 'XAXX010101000'
+
+
+def test_items_y_adjuntos_en_orden(tmp_path):
+    """Items con datos del producto y adjuntos vienen en la misma respuesta"""
+    db, _, cotizacion_id, _ = _preparar(tmp_path)
+    db.agregar_adjuntos(cotizacion_id, [{
+        'nombre_original': 'plano.pdf', 'nombre_archivo': 'x_plano.pdf',
+        'ruta_archivo': 'uploads/x_plano.pdf', 'mime_tipo': 'application/pdf', 'tamano_bytes': 1234
+    }])
+    cotizacion = db.obtener_cotizacion(cotizacion_id)
+
+    items = cotizacion['items']
+    assert [item['concepto'] for item in items] == ['Cámara', 'Instalación']
+    assert items[0]['producto_codigo'] == 'CAM-01'
+    assert items[0]['subtotal'] == 3000.0
+    assert items[1]['producto_id'] is None
+    assert cotizacion['adjuntos'][0]['tamano_bytes'] == 1234
+
+
+def test_una_sola_sentencia(tmp_path):
+    """El detalle se resuelve con una única sentencia SQL"""
+    db, _, cotizacion_id, _ = _preparar(tmp_path)
+    sentencias = []
+    conn = db.get_connection()
+    conn.set_trace_callback(sentencias.append)
+    conn.close()
+
+    db.obtener_cotizacion(cotizacion_id)
+
+    conn = db.get_connection()
+    conn.set_trace_callback(None)
+    conn.close()
+    assert len(sentencias) == 1
+
+
+def test_por_token_y_sin_items(tmp_path):
+    """La búsqueda por token usa el mismo detalle; listas vacías si no hay filas"""
+    db, cliente_id, _, _ = _preparar(tmp_path)
+    vacia_id, _ = db.crear_cotizacion(cliente_id, [])
+    vacia = db.obtener_cotizacion(vacia_id)
+    assert vacia['items'] == [] and vacia['adjuntos'] == []
+
+    por_token = db.obtener_cotizacion_por_token(vacia['token_aprobacion'])
+    assert por_token['id'] == vacia_id
+    assert db.obtener_cotizacion(9999) is None
+
+
+def test_proyeccion_include(tmp_path):
+    """include limita las partes cargadas; valores desconocidos son error"""
+    db, cliente_id, cotizacion_id, numero = _preparar(tmp_path)
+
+    encabezado = db.obtener_cotizacion(cotizacion_id, include=())
+    assert encabezado['numero_cotizacion'] == numero
+    assert not {'items', 'adjuntos', 'cliente', 'nombre'} & set(encabezado)
+
+    solo_items = db.obtener_cotizacion(cotizacion_id, include='items')
+    assert len(solo_items['items']) == 2 and 'adjuntos' not in solo_items
+
+    con_cliente = db.obtener_cotizacion(cotizacion_id, include='cliente, adjuntos')
+    assert con_cliente['cliente']['id'] == cliente_id and con_cliente['adjuntos'] == []
+    assert 'items' not in con_cliente
+
+    with pytest.raises(ValueError, match='historial'):
+        db.obtener_cotizacion(cotizacion_id, include='items,historial')
+
+    assert db.existe_cotizacion(cotizacion_id)
+    assert not db.existe_cotizacion(9999)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de GET condicional (ETag / If-None-Match) en los listados
+"""
+
+import pytest
+
+import app as aplicacion
+from database import Database
+
+
+@pytest.fixture
+def cliente_http(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'etag.db'))
+    monkeypatch.setattr(aplicacion, 'db', db)
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['rol'] = 'admin'
+    return cliente, db
+
+
+def test_304_sin_cambios_y_200_tras_escritura(cliente_http):
+    """Mismo ETag -> 304 vacío; una escritura en la tabla cambia el ETag"""
+    cliente, db = cliente_http
+    db.crear_cliente('Cliente', 'c@test.com')
+
+    primera = cliente.get('/api/clientes')
+    etag = primera.headers['ETag']
+    assert primera.status_code == 200 and etag.startswith('W/')
+
+    repetida = cliente.get('/api/clientes', headers={'If-None-Match': etag})
+    assert repetida.status_code == 304
+    assert repetida.data == b''
+    assert repetida.headers['ETag'] == etag
+
+    db.crear_cliente('Otro', 'o@test.com')
+    cambiada = cliente.get('/api/clientes', headers={'If-None-Match': etag})
+    assert cambiada.status_code == 200
+    assert cambiada.headers['ETag'] != etag
+    assert len(cambiada.get_json()) == 2
+
+
+def test_304_no_ejecuta_la_consulta(cliente_http, monkeypatch):
+    """Con validador vigente el listado no se consulta"""
+    cliente, db = cliente_http
+    etag = cliente.get('/api/productos').headers['ETag']
+
+    def _no_debe_llamarse(*args, **kwargs):
+        raise AssertionError('el listado no debe consultarse')
+
+    monkeypatch.setattr(db, 'obtener_productos', _no_debe_llamarse)
+    assert cliente.get('/api/productos', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_etag_depende_de_parametros_y_tablas(cliente_http):
+    """Cada URL tiene su ETag; el listado de cotizaciones cambia con sus clientes"""
+    cliente, db = cliente_http
+    cliente_id = db.crear_cliente('Cliente', 'c@test.com')
+    db.crear_cotizacion(cliente_id, [{'concepto': 'Item', 'cantidad': 1, 'precio_unitario': 10.0}])
+
+    activos = cliente.get('/api/productos').headers['ETag']
+    todos = cliente.get('/api/productos?incluir_inactivos=true').headers['ETag']
+    assert activos != todos
+
+    etag = cliente.get('/api/cotizaciones?limite=10').headers['ETag']
+    db.actualizar_cliente(cliente_id, 'Renombrado', 'c@test.com')
+    respuesta = cliente.get('/api/cotizaciones?limite=10', headers={'If-None-Match': etag})
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['cotizaciones'][0]['cliente_nombre'] == 'Renombrado'
+
+
+def test_inicio_de_sesion_no_invalida_el_listado(cliente_http):
+    """ultimo_acceso no cambia el ETag de cotizaciones; renombrar al usuario sí"""
+    cliente, db = cliente_http
+    usuario_id = db.crear_usuario('vendedor', 'secreto123', 'Vendedor Uno', 'v@test.com')
+
+    etag = cliente.get('/api/cotizaciones?limite=10').headers['ETag']
+    assert db.autenticar_usuario('vendedor', 'secreto123')
+    assert cliente.get('/api/cotizaciones?limite=10', headers={'If-None-Match': etag}).status_code == 304
+
+    db.actualizar_usuario(usuario_id, nombre_completo='Vendedor Dos')
+    assert cliente.get('/api/cotizaciones?limite=10', headers={'If-None-Match': etag}).status_code == 200
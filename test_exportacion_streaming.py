@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la exportación en streaming (NDJSON / arreglo JSON por bloques)
+"""
+
+import json
+
+import pytest
+
+import app as aplicacion
+from database import Database
+
+
+@pytest.fixture
+def cliente_http(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'streaming.db'))
+    monkeypatch.setattr(aplicacion, 'db', db)
+    monkeypatch.setattr(aplicacion, 'FILAS_POR_BLOQUE_STREAMING', 7)
+    for i in range(30):
+        db.crear_producto(f'P-{i:03d}', f'Producto {i:03d}', 'Descripción «larga»', 'producto', 10.0 + i)
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['rol'] = 'admin'
+    return cliente, db
+
+
+def test_iterador_devuelve_la_conexion(tmp_path):
+    """Agotar o cerrar el generador regresa la conexión al pool"""
+    db = Database(str(tmp_path / 'iterar.db'))
+    for i in range(5):
+        db.crear_cliente(f'C{i}', f'c{i}@test.com')
+
+    filas = db.iterar_clientes()
+    assert next(filas)['nombre'] == 'C0'
+    assert db.pool_stats()['en_uso'] == 1
+    filas.close()
+    assert db.pool_stats()['en_uso'] == 0
+
+    assert [c['nombre'] for c in db.iterar_clientes()] == [c['nombre'] for c in db.obtener_clientes()]
+
+
+def test_ndjson_por_parametro_y_por_accept(cliente_http):
+    """?format=ndjson y Accept: application/x-ndjson producen una fila JSON por línea"""
+    cliente, db = cliente_http
+
+    respuesta = cliente.get('/api/productos?format=ndjson')
+    assert respuesta.mimetype == 'application/x-ndjson'
+    assert respuesta.is_streamed
+    filas = [json.loads(linea) for linea in respuesta.get_data(as_text=True).splitlines()]
+    assert [f['codigo'] for f in filas] == [p['codigo'] for p in db.obtener_productos()]
+
+    por_accept = cliente.get('/api/productos', headers={'Accept': 'application/x-ndjson'})
+    assert por_accept.mimetype == 'application/x-ndjson'
+    assert por_accept.get_data() == respuesta.get_data()
+    assert por_accept.headers['ETag'] != cliente.get('/api/productos').headers['ETag']
+
+
+def test_arreglo_json_por_bloques(cliente_http):
+    """?format=json-stream entrega el mismo arreglo que la respuesta normal"""
+    cliente, _ = cliente_http
+    cliente_id = cliente.post('/api/clientes', json={'nombre': 'Cliente', 'email': 'c@test.com'}).get_json()['cliente_id']
+    aplicacion.db.crear_cotizacion(cliente_id, [])
+
+    for url in ('/api/productos', '/api/clientes', '/api/cotizaciones'):
+        normal = cliente.get(url).get_json()
+        streaming = cliente.get(f'{url}?format=json-stream')
+        assert streaming.mimetype == 'application/json'
+        assert json.loads(streaming.get_data(as_text=True)) == normal
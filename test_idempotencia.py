@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de Idempotency-Key en los POST de creación
+"""
+
+import hashlib
+import threading
+import time
+
+import pytest
+
+import app as aplicacion
+from config import Config
+from database import Database
+
+
+@pytest.fixture
+def cliente_http(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / 'idempotencia.db'))
+    monkeypatch.setattr(aplicacion, 'db', db)
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['rol'] = 'admin'
+    return cliente, db
+
+
+def _post_cotizacion(cliente, clave, cantidad=1):
+    return cliente.post('/api/cotizaciones', headers={'Idempotency-Key': clave}, json={
+        'cliente_id': 1,
+        'items': [{'concepto': 'Servicio', 'cantidad': cantidad, 'precio_unitario': 100.0}],
+    })
+
+
+def test_reintento_repite_la_respuesta_sin_escribir(cliente_http):
+    """El mismo POST con la misma clave devuelve la respuesta original"""
+    cliente, db = cliente_http
+    db.crear_cliente('Cliente', 'c@test.com')
+
+    original = _post_cotizacion(cliente, 'clave-1')
+    reintento = _post_cotizacion(cliente, 'clave-1')
+
+    assert original.status_code == reintento.status_code == 201
+    assert reintento.get_json() == original.get_json()
+    assert reintento.headers['Idempotent-Replayed'] == 'true'
+    assert len(db.obtener_cotizaciones()) == 1
+
+    # Otra clave es otra creación; sin cabecera no hay deduplicación
+    assert _post_cotizacion(cliente, 'clave-2').get_json()['cotizacion_id'] != original.get_json()['cotizacion_id']
+    cliente.post('/api/cotizaciones', json={'cliente_id': 1, 'items': []})
+    assert len(db.obtener_cotizaciones()) == 3
+
+
+def test_misma_clave_con_otro_cuerpo(cliente_http):
+    """Reusar la clave con otro contenido es un 422 y no escribe"""
+    cliente, db = cliente_http
+    db.crear_cliente('Cliente', 'c@test.com')
+
+    assert _post_cotizacion(cliente, 'clave', cantidad=1).status_code == 201
+    assert _post_cotizacion(cliente, 'clave', cantidad=2).status_code == 422
+    assert len(db.obtener_cotizaciones()) == 1
+
+
+def test_claves_por_ruta(cliente_http):
+    """La misma clave en otro endpoint de creación es independiente"""
+    cliente, db = cliente_http
+    encabezado = {'Idempotency-Key': 'compartida'}
+
+    uno = cliente.post('/api/clientes', headers=encabezado, json={'nombre': 'Uno', 'email': 'u@test.com'})
+    dos = cliente.post('/api/clientes', headers=encabezado, json={'nombre': 'Uno', 'email': 'u@test.com'})
+    producto = cliente.post('/api/productos', headers=encabezado, json={
+        'codigo': 'P-1', 'nombre': 'Producto', 'tipo': 'producto', 'precio': 10.0
+    })
+
+    assert uno.get_json() == dos.get_json()
+    assert len(db.obtener_clientes()) == 1
+    assert producto.get_json()['success'] and 'Idempotent-Replayed' not in producto.headers
+
+
+def test_duplicado_en_curso_espera_el_resultado(cliente_http, monkeypatch):
+    """Un duplicado concurrente espera a que la original termine y recibe su respuesta"""
+    cliente, db = cliente_http
+    monkeypatch.setattr(Config, 'IDEMPOTENCIA_ESPERA_SEGUNDOS', 5)
+    alcance = '1:/api/clientes'
+    cuerpo = b'{"nombre": "Uno"}'
+    assert db.reservar_idempotencia(alcance, 'lenta', hashlib.sha256(cuerpo).hexdigest(), 60) is None
+
+    def _terminar():
+        time.sleep(0.3)
+        db.completar_idempotencia(alcance, 'lenta', 201, '{"cliente_id": 7}', 'application/json')
+
+    hilo = threading.Thread(target=_terminar)
+    hilo.start()
+    respuesta = cliente.post('/api/clientes', headers={'Idempotency-Key': 'lenta', 'Content-Type': 'application/json'},
+                             data=cuerpo)
+    hilo.join()
+
+    assert respuesta.status_code == 201
+    assert respuesta.get_json() == {'cliente_id': 7}
+    assert db.obtener_clientes() == []
+
+
+def test_duplicado_en_curso_sin_respuesta_da_409(cliente_http, monkeypatch):
+    """Si la original no termina dentro de la espera se responde 409"""
+    cliente, db = cliente_http
+    monkeypatch.setattr(Config, 'IDEMPOTENCIA_ESPERA_SEGUNDOS', 0.2)
+    cuerpo = b'{"nombre": "Uno"}'
+    db.reservar_idempotencia('1:/api/clientes', 'atorada', hashlib.sha256(cuerpo).hexdigest(), 60)
+
+    respuesta = cliente.post('/api/clientes', headers={'Idempotency-Key': 'atorada', 'Content-Type': 'application/json'},
+                             data=cuerpo)
+    assert respuesta.status_code == 409
+    assert respuesta.headers['Retry-After'] == '1'
+
+
+def test_claves_vencidas_y_abandonadas(tmp_path):
+    """Las claves vencidas se purgan y las reservas abandonadas se pueden retomar"""
+    db = Database(str(tmp_path / 'ttl.db'))
+    assert db.reservar_idempotencia('a', 'k', 'h', ttl_segundos=-1) is None
+    # Vencida: se purga al reservar y la nueva petición la toma
+    assert db.reservar_idempotencia('a', 'k', 'h', ttl_segundos=60) is None
+    assert db.reservar_idempotencia('a', 'k', 'h', ttl_segundos=60)['estado'] == 'en_proceso'
+    assert db.reservar_idempotencia('a', 'k', 'h', ttl_segundos=60, abandono_segundos=-1) is None
+
+    db.liberar_idempotencia('a', 'k')
+    assert db.consultar_idempotencia('a', 'k') is None
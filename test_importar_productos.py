@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la importación masiva de productos (CSV / XLSX)
+"""
+
+import io
+import zipfile
+
+import pytest
+
+from database import Database
+from importar_productos import ImportacionError, importar_archivo
+
+
+def _xlsx(filas):
+    """XLSX mínimo con cadenas compartidas y números"""
+    cadenas = []
+    xml_filas = []
+    for r, fila in enumerate(filas, start=1):
+        celdas = []
+        for c, valor in enumerate(fila):
+            ref = f'{chr(65 + c)}{r}'
+            if isinstance(valor, (int, float)):
+                celdas.append(f'<c r="{ref}"><v>{valor}</v></c>')
+            else:
+                cadenas.append(valor)
+                celdas.append(f'<c r="{ref}" t="s"><v>{len(cadenas) - 1}</v></c>')
+        xml_filas.append(f'<row r="{r}">{"".join(celdas)}</row>')
+
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    ns_r = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as libro:
+        libro.writestr('xl/workbook.xml',
+                       f'<workbook {ns} {ns_r}><sheets><sheet name="Precios" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        libro.writestr('xl/_rels/workbook.xml.rels',
+                       '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                       '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>')
+        libro.writestr('xl/sharedStrings.xml',
+                       f'<sst {ns}>' + ''.join(f'<si><t>{c}</t></si>' for c in cadenas) + '</sst>')
+        libro.writestr('xl/worksheets/sheet1.xml', f'<worksheet {ns}><sheetData>{"".join(xml_filas)}</sheetData></worksheet>')
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / 'importar.db'))
+
+
+def test_csv_inserta_actualiza_y_rechaza(db):
+    """Encabezados con acentos, delimitador ';', precios con formato y filas inválidas"""
+    existente = db.crear_producto('CAM-01', 'Cámara', 'Original', 'producto', 100.0, categoria='Video')
+    csv_texto = (
+        'Código;Nombre;Precio;Categoría\n'
+        'CAM-01;Cámara domo;$1,500.00;Video\n'
+        'NVR-08;Grabador;4000;Video\n'
+        ';Sin código;10;\n'
+        'MAL-1;Precio malo;abc;\n'
+        'NVR-08;Grabador 8 canales;4100;Video\n'
+    )
+    resultado = importar_archivo(db, io.BytesIO(csv_texto.encode('utf-8')), 'lista.csv', tamano_lote=10)
+
+    assert resultado['insertados'] == 1 and resultado['actualizados'] == 1
+    assert resultado['duplicados'] == 1 and resultado['rechazados'] == 2
+    assert [e['fila'] for e in resultado['errores']] == [4, 5]
+
+    camara = db.obtener_producto(existente)
+    assert camara['nombre'] == 'Cámara domo' and camara['precio'] == 1500.0
+    # Columnas ausentes en el archivo no se tocan
+    assert camara['descripcion'] == 'Original'
+    assert db.buscar_producto_por_codigo('NVR-08')['nombre'] == 'Grabador 8 canales'
+
+
+def test_precios_no_finitos_son_errores_de_fila(db):
+    """'nan' e 'inf' se rechazan como cualquier precio inválido, sin romper la importación"""
+    csv_texto = 'codigo,nombre,precio\nA-1,Uno,nan\nA-2,Dos,inf\nA-3,Tres,-Infinity\nA-4,Cuatro,10\n'
+    resultado = importar_archivo(db, io.BytesIO(csv_texto.encode('utf-8')), 'lista.csv')
+
+    assert resultado['insertados'] == 1 and resultado['rechazados'] == 3
+    assert [e['fila'] for e in resultado['errores']] == [2, 3, 4]
+    assert all(e['error'].startswith('precio inválido') for e in resultado['errores'])
+
+
+def test_reimportar_sin_cambios(db):
+    """Volver a importar el mismo archivo no reescribe filas"""
+    csv_texto = 'codigo,nombre,precio\n' + ''.join(f'P-{i},Producto {i},{i}\n' for i in range(25))
+
+    primera = importar_archivo(db, io.BytesIO(csv_texto.encode()), 'lista.csv', tamano_lote=10)
+    segunda = importar_archivo(db, io.BytesIO(csv_texto.encode()), 'lista.csv', tamano_lote=10)
+
+    assert primera['insertados'] == 25
+    assert segunda['insertados'] == 0 and segunda['actualizados'] == 0 and segunda['sin_cambios'] == 25
+    assert len(db.obtener_productos()) == 25
+
+
+def test_xlsx_y_encabezados_faltantes(db):
+    """XLSX leído sin dependencias extra; sin columnas requeridas no se importa nada"""
+    libro = _xlsx([
+        ['SKU', 'Producto', 'Precio unitario', 'Tipo'],
+        ['SERV-1', 'Instalación', 800, 'Servicio'],
+        ['CAB-1', 'Cable', 12.5, 'producto'],
+    ])
+    resultado = importar_archivo(db, libro, 'precios.xlsx')
+    assert resultado['insertados'] == 2 and resultado['rechazados'] == 0
+    assert db.buscar_producto_por_codigo('SERV-1')['tipo'] == 'servicio'
+    assert db.buscar_producto_por_codigo('CAB-1')['precio'] == 12.5
+
+    with pytest.raises(ImportacionError, match='precio'):
+        importar_archivo(db, io.BytesIO(b'codigo,nombre\nX,Y\n'), 'lista.csv')
+    with pytest.raises(ImportacionError):
+        importar_archivo(db, io.BytesIO(b'hola'), 'lista.pdf')
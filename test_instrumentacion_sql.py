@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la instrumentación de SQL por petición (instrumentacion_sql.py)
+"""
+
+import logging
+import sqlite3
+
+import pytest
+
+import app as aplicacion
+import instrumentacion_sql
+from config import Config
+from database import Database
+
+
+@pytest.fixture(autouse=True)
+def instrumentacion(monkeypatch):
+    monkeypatch.setattr(Config, 'SQL_INSTRUMENTACION', True)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'instrumentacion.db'))
+    db.crear_cliente('Cliente', 'c@test.com')
+    return db
+
+
+@pytest.fixture
+def cliente_http(db, monkeypatch):
+    monkeypatch.setattr(aplicacion, 'db', db)
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['rol'] = 'admin'
+    return cliente
+
+
+def test_acumula_sentencias_y_conexiones(db):
+    """Cada método suma sus sentencias y su préstamo de conexión a la petición en curso"""
+    token = instrumentacion_sql.iniciar_peticion()
+    try:
+        db.obtener_cliente(1)
+        db.obtener_cliente(1)
+        db.actualizar_cliente(1, 'Renombrado', 'c@test.com')
+        estadisticas = instrumentacion_sql.estadisticas_actuales()
+    finally:
+        instrumentacion_sql.finalizar_peticion(token)
+
+    assert estadisticas.conexiones == 3
+    assert estadisticas.sentencias >= 3
+    assert estadisticas.repetidas(1) == [('SELECT * FROM clientes WHERE id = ?', 2)]
+    assert estadisticas.tiempo_s > 0 and estadisticas.lenta is not None
+    assert instrumentacion_sql.estadisticas_actuales() is None
+
+
+def test_escrituras_de_la_cola_cuentan_en_la_peticion(tmp_path):
+    """Las sentencias que ejecuta el hilo escritor se suman a la petición que las encoló"""
+    db = Database(str(tmp_path / 'cola.db'), cola_escritura=True)
+    token = instrumentacion_sql.iniciar_peticion()
+    try:
+        db.crear_cliente('Cliente', 'c@test.com')
+        formas = instrumentacion_sql.estadisticas_actuales().formas
+    finally:
+        instrumentacion_sql.finalizar_peticion(token)
+
+    assert any(forma.startswith('INSERT INTO clientes') for forma in formas)
+
+
+def test_server_timing_en_las_respuestas(cliente_http):
+    """Las respuestas llevan Server-Timing con el tiempo de SQL, sin el texto de las sentencias"""
+    respuesta = cliente_http.get('/api/clientes')
+    cabecera = respuesta.headers['Server-Timing']
+
+    assert cabecera.startswith('db;dur=')
+    assert 'sentencias' in cabecera and 'conexiones"' in cabecera
+    assert 'SELECT' not in cabecera
+
+
+def test_server_timing_solo_para_administradores(cliente_http, monkeypatch):
+    """Sin SQL_SERVER_TIMING los demás usuarios no reciben detalles de la base"""
+    with cliente_http.session_transaction() as sesion:
+        sesion['rol'] = 'usuario'
+    assert 'Server-Timing' not in cliente_http.get('/api/clientes').headers
+
+    monkeypatch.setattr(Config, 'SQL_SERVER_TIMING', True)
+    assert cliente_http.get('/api/clientes').headers['Server-Timing'].startswith('db;dur=')
+
+
+def test_apagada_sin_envoltorios(tmp_path, monkeypatch, cliente_http):
+    """Con la instrumentación apagada las conexiones son sqlite3.Connection y no hay Server-Timing"""
+    monkeypatch.setattr(Config, 'SQL_INSTRUMENTACION', False)
+    db = Database(str(tmp_path / 'sin_instrumentacion.db'))
+    conn = db.get_connection()
+    assert type(conn.raw) is sqlite3.Connection
+    conn.close()
+
+    monkeypatch.setattr(aplicacion, 'db', db)
+    assert 'Server-Timing' not in cliente_http.get('/api/clientes').headers
+
+
+def test_log_de_sentencias_lentas_sin_valores(db, monkeypatch, caplog):
+    """Las sentencias lentas se registran con los tipos de sus parámetros, no con los valores"""
+    monkeypatch.setattr(Config, 'SQL_LENTA_MS', 0)
+    with caplog.at_level(logging.WARNING, logger='instrumentacion_sql'):
+        db.obtener_cliente(1)
+
+    mensajes = [registro.getMessage() for registro in caplog.records]
+    assert any(m.startswith('Sentencia lenta') for m in mensajes)
+    assert any('SELECT * FROM clientes WHERE id = ? params=(int)' in m for m in mensajes)
+
+
+def test_aviso_n_mas_1_en_debug(cliente_http, monkeypatch, capsys):
+    """En modo debug se avisa cuando una misma sentencia se repite más del umbral"""
+    monkeypatch.setattr(Config, 'SQL_N_MAS_1_UMBRAL', 0)
+    cliente_http.get('/api/clientes')
+    assert 'Posible N+1' not in capsys.readouterr().out
+
+    monkeypatch.setattr(aplicacion.app, 'debug', True)
+    respuesta = cliente_http.get('/api/clientes')
+    assert 'Posible N+1 en GET /api/clientes' in capsys.readouterr().out
+    assert 'desc="SELECT' in respuesta.headers['Server-Timing']
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de la persistencia por diferencias de items (actualizar_cotizacion)
+"""
+
+from database import Database
+
+
+def _crear(tmp_path, n=3):
+    db = Database(str(tmp_path / 'items.db'))
+    cliente_id = db.crear_cliente('Cliente', 'cliente@test.com')
+    items = [
+        {'concepto': f'Concepto {i}', 'descripcion': '', 'cantidad': 1, 'precio_unitario': 10.0 * (i + 1)}
+        for i in range(n)
+    ]
+    cotizacion_id, _ = db.crear_cotizacion(cliente_id, items)
+    return db, cliente_id, cotizacion_id
+
+
+def test_solo_se_modifican_los_items_cambiados(tmp_path):
+    """Editar, quitar y agregar items conserva los ids de los no tocados"""
+    db, cliente_id, cotizacion_id = _crear(tmp_path)
+    items = db.obtener_cotizacion(cotizacion_id)['items']
+    ids = [item['id'] for item in items]
+
+    nuevos = [
+        {**items[0]},                          # sin cambios
+        {**items[1], 'cantidad': 5},           # modificado
+        {'concepto': 'Nuevo', 'cantidad': 2, 'precio_unitario': 7.5},
+    ]
+    db.actualizar_cotizacion(cotizacion_id, cliente_id, nuevos)
+
+    cotizacion = db.obtener_cotizacion(cotizacion_id)
+    guardados = cotizacion['items']
+    assert [item['id'] for item in guardados[:2]] == ids[:2]
+    assert ids[2] not in [item['id'] for item in guardados]
+    assert guardados[1]['cantidad'] == 5
+    assert guardados[1]['subtotal'] == 100.0
+    assert guardados[2]['concepto'] == 'Nuevo'
+    assert cotizacion['subtotal'] == 10.0 + 100.0 + 15.0
+
+
+def test_items_sin_id_reemplazan_la_lista(tmp_path):
+    """Sin ids (clientes antiguos de la API) se reemplazan todos los items"""
+    db, cliente_id, cotizacion_id = _crear(tmp_path)
+    db.actualizar_cotizacion(cotizacion_id, cliente_id, [
+        {'concepto': 'Único', 'cantidad': 1, 'precio_unitario': 1.0}
+    ])
+
+    items = db.obtener_cotizacion(cotizacion_id)['items']
+    assert [item['concepto'] for item in items] == ['Único']
+
+
+def test_id_de_otra_cotizacion_se_inserta_como_nuevo(tmp_path):
+    """Un id ajeno no modifica items de otra cotización"""
+    db, cliente_id, cotizacion_id = _crear(tmp_path)
+    otra_id, _ = db.crear_cotizacion(cliente_id, [{'concepto': 'Otra', 'cantidad': 1, 'precio_unitario': 1.0}])
+    ajeno = db.obtener_cotizacion(otra_id)['items'][0]
+
+    db.actualizar_cotizacion(cotizacion_id, cliente_id, [{**ajeno, 'concepto': 'Cambiado'}])
+
+    assert db.obtener_cotizacion(otra_id)['items'][0]['concepto'] == 'Otra'
+    assert db.obtener_cotizacion(cotizacion_id)['items'][0]['concepto'] == 'Cambiado'
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas del listado paginado por cursor (listar_cotizaciones)
+"""
+
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'listado.db'))
+    cliente_a = db.crear_cliente('Cliente A', 'a@test.com')
+    cliente_b = db.crear_cliente('Cliente B', 'b@test.com')
+    for i in range(25):
+        cliente = cliente_a if i % 2 == 0 else cliente_b
+        db.crear_cotizacion(cliente, [{'concepto': 'X', 'cantidad': 1, 'precio_unitario': 100.0 * (i + 1)}])
+    db.actualizar_estado_cotizacion(3, 'enviada')
+    return db
+
+
+def test_recorrido_completo_sin_repetidos(db):
+    """Recorrer todas las páginas devuelve cada cotización una vez, en orden"""
+    vistos = []
+    cursor = None
+    while True:
+        pagina = db.listar_cotizaciones(limite=7, cursor=cursor)
+        vistos.extend(cot['id'] for cot in pagina['cotizaciones'])
+        cursor = pagina['siguiente_cursor']
+        if not cursor:
+            break
+
+    assert vistos == list(range(25, 0, -1))
+
+
+def test_filtros(db):
+    """Los filtros se combinan y el total respeta los filtros"""
+    pagina = db.listar_cotizaciones(cliente_id=2, total_min=500, con_total=True)
+    assert pagina['total'] == len(pagina['cotizaciones']) == 10
+    assert all(cot['cliente_id'] == 2 and cot['total'] >= 500 for cot in pagina['cotizaciones'])
+
+    assert [cot['id'] for cot in db.listar_cotizaciones(estado='enviada')['cotizaciones']] == [3]
+    assert db.listar_cotizaciones(fecha_hasta='2000-01-01')['cotizaciones'] == []
+
+
+def test_cursor_invalido(db):
+    """Un cursor alterado se rechaza con ValueError"""
+    with pytest.raises(ValueError):
+        db.listar_cotizaciones(cursor='no-es-un-cursor')
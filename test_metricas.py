@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las métricas de Prometheus (metricas.py y /metrics)
+"""
+
+import os
+
+import pytest
+
+import app as aplicacion
+import metricas
+from config import Config
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'metricas.db'))
+    db.crear_cliente('Cliente', 'c@test.com')
+    return db
+
+
+@pytest.fixture
+def cliente_http(db, monkeypatch):
+    monkeypatch.setattr(aplicacion, 'db', db)
+    monkeypatch.setattr(Config, 'METRICAS_DIR', '')
+    monkeypatch.setattr(metricas, 'registro', metricas.Registro())
+    return aplicacion.app.test_client()
+
+
+def _iniciar_sesion(cliente, rol):
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['rol'] = rol
+
+
+def test_acceso_a_metrics(cliente_http, monkeypatch):
+    """/metrics exige token del scraper o sesión de administrador"""
+    assert cliente_http.get('/metrics').status_code == 401
+
+    monkeypatch.setattr(Config, 'METRICAS_TOKEN', 'secreto')
+    assert cliente_http.get('/metrics', headers={'Authorization': 'Bearer otro'}).status_code == 401
+    respuesta = cliente_http.get('/metrics', headers={'Authorization': 'Bearer secreto'})
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == 'text/plain'
+
+    _iniciar_sesion(cliente_http, 'vendedor')
+    assert cliente_http.get('/metrics').status_code == 403
+    _iniciar_sesion(cliente_http, 'admin')
+    assert cliente_http.get('/metrics').status_code == 200
+
+
+def test_histograma_por_ruta(cliente_http):
+    """Las peticiones se agrupan por la plantilla de la ruta, con latencia, tamaño y SQL"""
+    _iniciar_sesion(cliente_http, 'admin')
+    cliente_http.get('/api/clientes')
+    cliente_http.get('/api/clientes/1')
+    texto = cliente_http.get('/metrics').get_data(as_text=True)
+
+    assert '# TYPE cotizador_http_request_duration_seconds histogram' in texto
+    assert 'cotizador_http_request_duration_seconds_bucket{method="GET",route="/api/clientes",le="+Inf"} 1' in texto
+    assert 'cotizador_http_request_duration_seconds_count{method="GET",route="/api/clientes/<int:cliente_id>"} 1' in texto
+    assert 'cotizador_http_requests_total{method="GET",route="/api/clientes",status="200"} 1' in texto
+    assert 'cotizador_db_statements_total{method="GET",route="/api/clientes"}' in texto
+    # La petición a /metrics sigue en curso mientras se genera la respuesta
+    assert 'cotizador_http_requests_in_flight{method="GET",route="/metrics"} 1' in texto
+    assert 'cotizador_http_requests_in_flight{method="GET",route="/api/clientes"} 0' in texto
+
+
+@pytest.mark.parametrize('instrumentacion', [False, True])
+def test_sql_por_peticion_con_y_sin_instrumentacion(tmp_path, monkeypatch, instrumentacion):
+    """Tiempo y sentencias de base por petición se registran también sin los envoltorios"""
+    monkeypatch.setattr(Config, 'SQL_INSTRUMENTACION', instrumentacion)
+    db = Database(str(tmp_path / f'sql_{instrumentacion}.db'))
+    db.crear_cliente('Cliente', 'c@test.com')
+    monkeypatch.setattr(aplicacion, 'db', db)
+    monkeypatch.setattr(Config, 'METRICAS_DIR', '')
+    monkeypatch.setattr(metricas, 'registro', metricas.Registro())
+    cliente = aplicacion.app.test_client()
+    _iniciar_sesion(cliente, 'admin')
+
+    cliente.get('/api/clientes')
+    texto = cliente.get('/metrics').get_data(as_text=True)
+
+    etiquetas = '{method="GET",route="/api/clientes"}'
+    sentencias = next(linea for linea in texto.splitlines()
+                      if linea.startswith('cotizador_db_statements_total' + etiquetas))
+    assert float(sentencias.split()[-1]) >= 1
+    assert f'cotizador_db_request_duration_seconds_count{etiquetas} 1' in texto
+    suma = next(linea for linea in texto.splitlines()
+                if linea.startswith('cotizador_db_request_duration_seconds_sum' + etiquetas))
+    assert float(suma.split()[-1]) > 0
+
+
+def test_medir_duracion_resultado(monkeypatch):
+    """El decorador registra result=ok|error según el valor devuelto o la excepción"""
+    registro = metricas.Registro()
+    monkeypatch.setattr(metricas, 'registro', registro)
+
+    @metricas.medir_duracion('cotizador_smtp_send_duration_seconds', kind='prueba')
+    def enviar(exito):
+        if exito is None:
+            raise RuntimeError('SMTP caído')
+        return exito, 'mensaje'
+
+    enviar(True)
+    enviar(False)
+    with pytest.raises(RuntimeError):
+        enviar(None)
+
+    series = registro.instantanea()
+    ok = series[('cotizador_smtp_send_duration_seconds', (('kind', 'prueba'), ('result', 'ok')))]
+    error = series[('cotizador_smtp_send_duration_seconds', (('kind', 'prueba'), ('result', 'error')))]
+    assert sum(ok[:-1]) == 1 and sum(error[:-1]) == 2
+
+
+def test_suma_entre_procesos_y_workers_terminados(tmp_path, monkeypatch):
+    """Se suman los archivos de todos los procesos; un worker terminado no se pierde ni se cuenta dos veces"""
+    directorio = str(tmp_path)
+
+    # Otro worker: su archivo queda con un pid ficticio
+    otro = metricas.Registro()
+    otro.incrementar('cotizador_http_requests_total', 3, route='/api/clientes')
+    otro.incrementar('cotizador_http_requests_in_flight', 1, route='/api/clientes')
+    otro.observar('cotizador_pdf_render_duration_seconds', 0.2, result='ok')
+    otro.escribir(directorio)
+    archivo_otro = os.path.join(directorio, 'proceso_999999.json')
+    os.replace(os.path.join(directorio, f'proceso_{os.getpid()}.json'), archivo_otro)
+
+    monkeypatch.setattr(metricas, 'registro', metricas.Registro())
+    metricas.registro.incrementar('cotizador_http_requests_total', 2, route='/api/clientes')
+
+    clave = ('cotizador_http_requests_total', (('route', '/api/clientes'),))
+    medidor = ('cotizador_http_requests_in_flight', (('route', '/api/clientes'),))
+    total = metricas.combinar(directorio)
+    assert total[clave] == 5 and total[medidor] == 1
+
+    with open(archivo_otro, encoding='utf-8') as f:
+        contenido = f.read()
+    metricas.proceso_terminado(999999, directorio)
+    assert not os.path.exists(archivo_otro)
+    total = metricas.combinar(directorio)
+    assert total[clave] == 5 and medidor not in total
+    assert sum(total[('cotizador_pdf_render_duration_seconds', (('result', 'ok'),))][:-1]) == 1
+
+    # Lectura entre la escritura del acumulado y el borrado del archivo del worker
+    with open(archivo_otro, 'w', encoding='utf-8') as f:
+        f.write(contenido)
+    assert metricas.combinar(directorio)[clave] == 5
+
+    metricas.limpiar_directorio(directorio)
+    assert os.listdir(directorio) == []
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas del motor de migraciones versionadas (migrations.py)
+"""
+
+import sqlite3
+
+import migrations
+from database import Database
+
+
+def test_base_nueva_queda_en_ultima_version(tmp_path):
+    """Una base vacía se crea completa y con el usuario admin"""
+    ruta = str(tmp_path / 'nueva.db')
+    desde, hasta = migrations.migrate(ruta)
+
+    assert (desde, hasta) == (0, migrations.ULTIMA_VERSION)
+    conn = sqlite3.connect(ruta)
+    assert 'emails_destino' in migrations._columnas(conn, 'cotizaciones')
+    assert conn.execute("SELECT rol FROM usuarios WHERE username = 'admin'").fetchone() == ('admin',)
+    conn.close()
+
+
+def test_esquema_al_dia_no_escribe(tmp_path):
+    """Con el esquema al día no se abre ninguna transacción de escritura"""
+    ruta = str(tmp_path / 'aldia.db')
+    Database(ruta)
+
+    conn = sqlite3.connect(ruta)
+    cambios_antes = conn.execute('PRAGMA data_version').fetchone()[0]
+    Database(ruta)
+    assert migrations.migrate(ruta) == (migrations.ULTIMA_VERSION, migrations.ULTIMA_VERSION)
+    assert conn.execute('PRAGMA data_version').fetchone()[0] == cambios_antes
+    conn.close()
+
+
+def test_base_antigua_sin_columnas(tmp_path):
+    """Una base creada con el esquema original recibe las columnas faltantes"""
+    ruta = str(tmp_path / 'antigua.db')
+    conn = sqlite3.connect(ruta)
+    conn.execute('''
+        CREATE TABLE clientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL,
+            email TEXT NOT NULL, telefono TEXT, direccion TEXT, rfc TEXT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+    ''')
+    conn.execute('''
+        CREATE TABLE cotizaciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, numero_cotizacion TEXT UNIQUE NOT NULL,
+            cliente_id INTEGER NOT NULL, fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_validez DATE, subtotal REAL NOT NULL, iva REAL DEFAULT 0,
+            total REAL NOT NULL, notas TEXT, estado TEXT DEFAULT 'pendiente')
+    ''')
+    conn.execute("INSERT INTO clientes (nombre, email) VALUES ('A', 'a@test.com')")
+    conn.execute('''
+        INSERT INTO cotizaciones (numero_cotizacion, cliente_id, subtotal, total)
+        VALUES ('INT-20250101-0001', 1, 100, 116)
+    ''')
+    conn.commit()
+    conn.close()
+
+    db = Database(ruta)
+    cotizacion = db.obtener_cotizacion(1)
+    assert cotizacion['token_aprobacion']
+    assert cotizacion['estado_aprobacion'] == 'pendiente'
+    assert 'emails_destino' in cotizacion
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Regresión de planes de consulta para database.py
+
+Se ejecutan todos los métodos públicos de Database contra una base con
+datos, se capturan las sentencias SQL reales (con parámetros expandidos)
+y se revisa su EXPLAIN QUERY PLAN: ninguna consulta puede recorrer una
+tabla completa sin índice ni ordenar con un B-tree temporal.
+"""
+
+import re
+import sqlite3
+
+import pytest
+
+from database import Database
+
+# Métodos que no ejecutan SQL propio
+SIN_SQL = {'get_connection', 'pool_stats', 'cache_stats', 'init_db', 'archivo_disponible', 'cola_stats'}
+
+# (método, fragmento de SQL, motivo) con plan aceptado aunque ordene o recorra
+PLANES_PERMITIDOS = [
+    ('listar_cotizaciones', 'c.total >=',
+     'el rango de totales usa idx_cotizaciones_total y sólo ordena las filas del rango'),
+    ('compactar_cambios', 'GROUP BY tabla, registro_id',
+     'mantenimiento periódico que revisa toda la bitácora a propósito'),
+    ('reparar_resumen_cotizaciones', 'WITH items AS',
+     'reparación manual que recalcula el resumen de todas las cotizaciones a propósito'),
+]
+
+# '--' son los comentarios que reporta el trace al entrar a un trigger
+SENTENCIAS_SIN_PLAN = ('BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', 'SAVEPOINT', 'RELEASE', 'ATTACH', 'DETACH',
+                       'CREATE', 'ALTER', '--')
+
+PROBLEMA = re.compile(r'^(SCAN (\w+)( LEFT-JOIN)?$|USE TEMP B-TREE)')
+SUBCONSULTA = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\w+)$')
+
+
+def _sembrar(db):
+    """Datos suficientes para que el planificador elija índices reales"""
+    clientes = [db.crear_cliente(f'Cliente {i:03d}', f'c{i}@test.com') for i in range(100)]
+    productos = [
+        db.crear_producto(f'P-{i:04d}', f'Producto {i}', 'Descripción', 'producto', 10.0 + i,
+                          categoria=f'Categoría {i % 7}')
+        for i in range(200)
+    ]
+    cotizaciones = []
+    for i in range(600):
+        items = [
+            {'producto_id': productos[(i + j) % len(productos)], 'concepto': f'Item {j}',
+             'cantidad': 1 + j, 'precio_unitario': 50.0}
+            for j in range(3)
+        ]
+        cotizaciones.append(db.crear_cotizacion(clientes[i % len(clientes)], items, creado_por=1)[0])
+    db.agregar_adjuntos(cotizaciones[0], [{
+        'nombre_original': 'plano.pdf', 'nombre_archivo': 'x_plano.pdf',
+        'ruta_archivo': 'uploads/x_plano.pdf', 'mime_tipo': 'application/pdf', 'tamano_bytes': 10
+    }])
+    return {'clientes': clientes, 'productos': productos, 'cotizaciones': cotizaciones}
+
+
+def _ejercicios(db, datos):
+    """Una llamada representativa por método público"""
+    cliente_id = datos['clientes'][5]
+    cotizacion_id = datos['cotizaciones'][10]
+    producto_id = datos['productos'][3]
+    token = db.obtener_cotizacion(cotizacion_id)['token_aprobacion']
+    item = {'concepto': 'Nuevo', 'cantidad': 1, 'precio_unitario': 1.0}
+
+    return {
+        'crear_cliente': lambda: db.crear_cliente('Nuevo', 'nuevo@test.com'),
+        'actualizar_cliente': lambda: db.actualizar_cliente(cliente_id, 'Cambiado', 'x@test.com'),
+        'obtener_clientes': lambda: db.obtener_clientes(),
+        'obtener_cliente': lambda: db.obtener_cliente(cliente_id),
+        'eliminar_cliente': lambda: db.eliminar_cliente(db.crear_cliente('Temporal', 't@test.com')),
+        'crear_cotizacion': lambda: db.crear_cotizacion(cliente_id, [item]),
+        'crear_cotizaciones_lote': lambda: [
+            db.crear_cotizaciones_lote([{'cliente_id': cliente_id, 'items': [item, item]}] * 3),
+            db.crear_cotizaciones_lote([{'cliente_id': cliente_id, 'items': [item]}, {'cliente_id': 0}], modo='parcial'),
+        ],
+        'obtener_cotizaciones': lambda: db.obtener_cotizaciones(),
+        'listar_cotizaciones': lambda: [
+            db.listar_cotizaciones(limite=20, con_total=True),
+            db.listar_cotizaciones(cursor=db.listar_cotizaciones(limite=5)['siguiente_cursor']),
+            db.listar_cotizaciones(estado='pendiente'),
+            db.listar_cotizaciones(estado_aprobacion='aprobado'),
+            db.listar_cotizaciones(cliente_id=cliente_id),
+            db.listar_cotizaciones(creado_por=1),
+            db.listar_cotizaciones(fecha_desde='2020-01-01', fecha_hasta='2020-01-31'),
+            db.listar_cotizaciones(total_min=100, total_max=120),
+        ],
+        'iterar_clientes': lambda: list(db.iterar_clientes()),
+        'iterar_cotizaciones': lambda: list(db.iterar_cotizaciones()),
+        'iterar_productos': lambda: [list(db.iterar_productos()), list(db.iterar_productos(True))],
+        'obtener_cotizacion': lambda: [
+            db.obtener_cotizacion(cotizacion_id),
+            db.obtener_cotizacion(cotizacion_id, include=()),
+            db.obtener_cotizacion(cotizacion_id, include='items'),
+        ],
+        'existe_cotizacion': lambda: db.existe_cotizacion(cotizacion_id),
+        'agregar_adjuntos': lambda: db.agregar_adjuntos(cotizacion_id, [{
+            'nombre_original': 'a.pdf', 'nombre_archivo': 'a.pdf', 'ruta_archivo': 'a.pdf'
+        }]),
+        'obtener_adjuntos': lambda: db.obtener_adjuntos(cotizacion_id),
+        'actualizar_cotizacion': lambda: db.actualizar_cotizacion(
+            cotizacion_id, cliente_id, db.obtener_cotizacion(cotizacion_id)['items'][:2] + [item]),
+        'eliminar_cotizacion': lambda: db.eliminar_cotizacion(datos['cotizaciones'][20]),
+        'autenticar_usuario': lambda: db.autenticar_usuario('admin', 'admin123'),
+        'crear_usuario': lambda: db.crear_usuario('vendedor', 'secreto', 'Vendedor', 'v@test.com'),
+        'obtener_usuarios': lambda: db.obtener_usuarios(),
+        'obtener_usuario': lambda: db.obtener_usuario(1),
+        'actualizar_usuario': lambda: db.actualizar_usuario(1, nombre_completo='Admin'),
+        'cambiar_password': lambda: db.cambiar_password(1, 'admin123'),
+        'eliminar_usuario': lambda: db.eliminar_usuario(999),
+        'actualizar_estado_cotizacion': lambda: db.actualizar_estado_cotizacion(cotizacion_id, 'enviada'),
+        'crear_producto': lambda: db.crear_producto('NUEVO-1', 'Nuevo', '', 'servicio', 5.0),
+        'obtener_productos': lambda: [db.obtener_productos(), db.obtener_productos(incluir_inactivos=True)],
+        'obtener_producto': lambda: db.obtener_producto(producto_id),
+        'buscar_producto_por_codigo': lambda: db.buscar_producto_por_codigo('P-0003'),
+        'buscar_productos': lambda: [
+            db.buscar_productos('produc 1'), db.buscar_productos('categoría', incluir_inactivos=True)
+        ],
+        'actualizar_producto': lambda: db.actualizar_producto(producto_id, codigo='P-0003', precio=99.0),
+        'eliminar_producto': lambda: db.eliminar_producto(datos['productos'][-1]),
+        'repreciar_productos': lambda: [
+            db.repreciar_productos('porcentaje', 5, categoria='Categoría 3', simular=True),
+            db.repreciar_productos('factor', 1.1, redondeo=1, prefijo_codigo='P-01'),
+            db.repreciar_productos('delta', -1, ids=[producto_id]),
+        ],
+        'obtener_historial_precios': lambda: [
+            db.obtener_historial_precios(producto_id=producto_id),
+            db.obtener_historial_precios(lote=db.repreciar_productos('delta', 2, ids=[producto_id])['lote']),
+        ],
+        'importar_productos': lambda: db.importar_productos(
+            ('codigo', 'nombre', 'precio'),
+            [{'codigo': 'P-0004', 'nombre': 'Producto 4', 'precio': 1.0},
+             {'codigo': 'IMP-1', 'nombre': 'Importado', 'precio': 2.0}]),
+        'obtener_cotizacion_por_token': lambda: db.obtener_cotizacion_por_token(token),
+        'actualizar_estado_aprobacion': lambda: db.actualizar_estado_aprobacion(token, 'aprobado', 'Ok'),
+        'actualizar_emails_destino': lambda: db.actualizar_emails_destino(cotizacion_id, 'a@test.com'),
+        'obtener_categorias': lambda: db.obtener_categorias(),
+        'versiones_tablas': lambda: db.versiones_tablas('productos', 'clientes'),
+        'obtener_cambios': lambda: [
+            db.obtener_cambios(), db.obtener_cambios(0), db.obtener_cambios(5, tablas=['productos'], limite=10)
+        ],
+        'compactar_cambios': lambda: db.compactar_cambios(dias=0),
+        'reparar_resumen_cotizaciones': lambda: db.reparar_resumen_cotizaciones(),
+        'reservar_idempotencia': lambda: [
+            db.reservar_idempotencia('1:/api/clientes', 'k1', 'h', 60),
+            db.reservar_idempotencia('1:/api/clientes', 'k1', 'h', 60),
+        ],
+        'consultar_idempotencia': lambda: db.consultar_idempotencia('1:/api/clientes', 'k1'),
+        'completar_idempotencia': lambda: db.completar_idempotencia(
+            '1:/api/clientes', 'k1', 201, '{}', 'application/json'),
+        'liberar_idempotencia': lambda: db.liberar_idempotencia('1:/api/clientes', 'k1'),
+        # Al final: archiva la cotización aprobada por actualizar_estado_aprobacion
+        'archivar_cotizaciones': lambda: [
+            db.archivar_cotizaciones(dias=3650, dias_estado_final=-1, tamano_lote=50),
+            db.obtener_cotizacion(cotizacion_id, archivo=True),
+            db.listar_cotizaciones(archivo=True, con_total=True),
+            db.listar_cotizaciones(archivo=True, estado_aprobacion='aprobado'),
+        ],
+    }
+
+
+@pytest.fixture(scope='module')
+def sentencias(tmp_path_factory):
+    """Sentencias SQL ejecutadas por cada método público: {método: [sql, ...]}"""
+    ruta = str(tmp_path_factory.mktemp('planes') / 'planes.db')
+    db = Database(ruta)
+    datos = _sembrar(db)
+    ejercicios = _ejercicios(db, datos)
+
+    capturadas = {}
+    metodo_actual = [None]
+
+    def _registrar(sql):
+        if metodo_actual[0]:
+            capturadas.setdefault(metodo_actual[0], []).append(sql)
+
+    # Sólo las conexiones nuevas del pool llevan el trace
+    pool = db._pool
+    pool.close_all()
+    crear_original = pool._crear_conexion
+
+    def _crear_con_trace():
+        conn = crear_original()
+        conn.set_trace_callback(_registrar)
+        return conn
+
+    pool._crear_conexion = _crear_con_trace
+    try:
+        for metodo, ejercicio in ejercicios.items():
+            metodo_actual[0] = metodo
+            ejercicio()
+    finally:
+        metodo_actual[0] = None
+        pool._crear_conexion = crear_original
+        pool.close_all()
+
+    return ruta, ejercicios, capturadas
+
+
+def test_todos_los_metodos_estan_cubiertos(sentencias):
+    """Cada método público nuevo debe agregarse a los ejercicios de esta prueba"""
+    _, ejercicios, _ = sentencias
+    publicos = {
+        nombre for nombre in dir(Database)
+        if not nombre.startswith('_') and callable(getattr(Database, nombre))
+    }
+    assert publicos - SIN_SQL - set(ejercicios) == set()
+
+
+def test_sin_recorridos_completos_ni_ordenamientos_temporales(sentencias):
+    """Ninguna consulta cae en SCAN de tabla completa o en USE TEMP B-TREE"""
+    ruta, _, capturadas = sentencias
+    conn = sqlite3.connect(ruta)
+    conn.execute('ATTACH DATABASE ? AS archivo', (Database(ruta).archivo_path,))
+
+    problemas = []
+    for metodo, lista in capturadas.items():
+        for sql in dict.fromkeys(lista):
+            if sql.lstrip().upper().startswith(SENTENCIAS_SIN_PLAN):
+                continue
+            if any(metodo == m and fragmento in sql for m, fragmento, _ in PLANES_PERMITIDOS):
+                continue
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+            # Recorrer el resultado de una subconsulta (ya filtrada por índice) es válido
+            subconsultas = {m.group(1) for m in map(SUBCONSULTA.match, plan) if m}
+            malos = [
+                paso for paso, m in zip(plan, map(PROBLEMA.match, plan))
+                if m and m.group(2) not in subconsultas
+            ]
+            if malos:
+                problemas.append(f"{metodo}: {' | '.join(malos)}\n    {' '.join(sql.split())}")
+
+    conn.close()
+    assert not problemas, 'Planes con recorrido completo u ordenamiento temporal:\n' + '\n'.join(problemas)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las filas de solo lectura (filas.py) y del proveedor JSON (proveedor_json.py)
+"""
+
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+
+import app as aplicacion
+import proveedor_json
+from database import Database
+from filas import FilaDict
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'json.db'))
+    db.crear_cliente('Señor Núñez', 'n@test.com')
+    db.crear_producto('CAM-01', 'Cámara', 'Domo 4MP', 'producto', 1500.0, categoria='CCTV')
+    return db
+
+
+def test_listados_devuelven_filas_de_solo_lectura(db):
+    """Catálogo y listados devuelven FilaDict: acceso por nombre, get, `in`, sin mutar y copia con como_dict"""
+    producto = db.obtener_productos()[0]
+    assert isinstance(producto, FilaDict)
+    assert producto['codigo'] == 'CAM-01' and producto.get('no_existe', 'x') == 'x'
+    assert 'precio' in producto and 'no_existe' not in producto
+    with pytest.raises(TypeError):
+        producto['precio'] = 1.0
+    with pytest.raises(TypeError):
+        producto.update(precio=1.0)
+    copia = producto.como_dict()
+    copia['precio'] = 1.0
+    assert db.obtener_productos()[0]['precio'] == 1500.0
+    assert isinstance(db.obtener_clientes()[0], FilaDict)
+
+
+def test_listado_grande_sin_hook_por_fila(db, monkeypatch):
+    """orjson codifica los listados sin llamar al hook default por fila (y más rápido que con sqlite3.Row)"""
+    if proveedor_json.orjson is None:
+        pytest.skip('requiere orjson')
+    db.importar_productos(
+        ('codigo', 'nombre', 'precio'),
+        ({'codigo': f'P-{i:05d}', 'nombre': f'Producto {i}', 'precio': 10.0} for i in range(5000)),
+    )
+    app = aplicacion.app
+    llamadas = []
+    original = proveedor_json.ProveedorJSON.default
+
+    def contar(o):
+        llamadas.append(type(o))
+        return original(o)
+
+    monkeypatch.setattr(proveedor_json.ProveedorJSON, 'default', staticmethod(contar))
+    productos = db.obtener_productos()
+    assert len(productos) == 5001
+
+    with app.app_context():
+        cuerpo = app.json.response(productos).get_data()
+        assert llamadas == []
+
+        # Las mismas filas como sqlite3.Row pasan por el hook una vez cada una
+        conn = sqlite3.connect(db.db_path)
+        conn.row_factory = sqlite3.Row
+        filas_row = conn.execute('SELECT * FROM productos WHERE activo = 1 ORDER BY nombre').fetchall()
+        conn.close()
+        assert json.loads(app.json.response(filas_row).get_data()) == json.loads(cuerpo)
+        assert len(llamadas) == len(filas_row)
+
+        monkeypatch.setattr(proveedor_json.ProveedorJSON, 'default', staticmethod(original))
+        tiempos = {}
+        for nombre, filas in (('filas_dict', productos), ('sqlite_row', filas_row)):
+            mejores = []
+            for _ in range(5):
+                inicio = time.perf_counter()
+                app.json.response(filas)
+                mejores.append(time.perf_counter() - inicio)
+            tiempos[nombre] = min(mejores)
+    assert tiempos['filas_dict'] < tiempos['sqlite_row']
+
+
+@pytest.mark.parametrize('con_orjson', [True, False])
+def test_respuesta_igual_al_proveedor_de_flask(db, monkeypatch, con_orjson):
+    """Con o sin orjson, las filas se codifican igual que sus diccionarios con el proveedor por omisión"""
+    if not con_orjson:
+        monkeypatch.setattr(proveedor_json, 'orjson', None)
+    app = aplicacion.app
+    datos = {'productos': db.obtener_productos(), 'fecha': datetime(2025, 1, 2, 3, 4, 5)}
+    esperado = {'productos': [dict(p) for p in datos['productos']], 'fecha': datos['fecha']}
+
+    with app.app_context():
+        cuerpo = app.json.response(datos).get_data()
+        referencia = proveedor_json.DefaultJSONProvider(app).response(esperado).get_data()
+
+    assert json.loads(cuerpo) == json.loads(referencia)
+    assert json.loads(cuerpo)['fecha'] == 'Thu, 02 Jan 2025 03:04:05 GMT'
+
+
+def test_api_y_streaming_con_filas(db, monkeypatch):
+    """Los endpoints (normal y en streaming) entregan objetos JSON, no arreglos"""
+    monkeypatch.setattr(aplicacion, 'db', db)
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 1
+        sesion['rol'] = 'admin'
+
+    clientes = cliente.get('/api/clientes').get_json()
+    assert clientes[0]['nombre'] == 'Señor Núñez'
+
+    respuesta = cliente.get('/api/productos?format=ndjson')
+    lineas = [json.loads(linea) for linea in respuesta.get_data(as_text=True).splitlines()]
+    assert lineas[0]['codigo'] == 'CAM-01'
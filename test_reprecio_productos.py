@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas del reprecio masivo de productos
+"""
+
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'reprecio.db'))
+    db.crear_producto('DET-1', 'Detector 1', '', 'producto', 1980.0, categoria='SDI')
+    db.crear_producto('DET-2', 'Detector 2', '', 'producto', 1986.0, categoria='SDI')
+    db.crear_producto('SERV-1', 'Servicio', '', 'servicio', 25000.0, categoria='SDI')
+    db.crear_producto('CAM-1', 'Cámara', '', 'producto', 1500.0, categoria='Video')
+    return db
+
+
+def _precios(db):
+    return {p['codigo']: p['precio'] for p in db.obtener_productos(incluir_inactivos=True)}
+
+
+def test_simulacion_no_escribe(db):
+    """La vista previa calcula los precios nuevos sin modificar nada"""
+    antes = _precios(db)
+    resultado = db.repreciar_productos('porcentaje', 10, categoria='SDI', tipo='producto', simular=True)
+
+    assert resultado['simulacion'] and resultado['lote'] is None
+    assert resultado['afectados'] == 2
+    assert {f['codigo']: f['precio_nuevo'] for f in resultado['muestra']} == {'DET-1': 2178.0, 'DET-2': 2184.6}
+    assert _precios(db) == antes
+
+
+def test_factor_con_redondeo_e_historial(db):
+    """Factor de tipo de cambio redondeado a pesos; antes/después quedan en el historial"""
+    resultado = db.repreciar_productos('factor', 1.032, redondeo=10, prefijo_codigo='DET-', usuario_id=1)
+
+    assert resultado['afectados'] == 2
+    precios = _precios(db)
+    assert precios['DET-1'] == 2040.0 and precios['DET-2'] == 2050.0
+    assert precios['CAM-1'] == 1500.0
+
+    historial = db.obtener_historial_precios(lote=resultado['lote'])
+    assert [(h['codigo'], h['precio_anterior'], h['precio_nuevo']) for h in historial] == [
+        ('DET-1', 1980.0, 2040.0), ('DET-2', 1986.0, 2050.0)
+    ]
+    assert historial[0]['usuario_id'] == 1
+    # La caché del catálogo refleja el cambio
+    assert db.buscar_producto_por_codigo('DET-1')['precio'] == 2040.0
+
+
+def test_delta_por_ids_sin_negativos_y_sin_cambios(db):
+    """Los precios no bajan de cero; productos que no cambian no se registran"""
+    cam = db.buscar_producto_por_codigo('CAM-1')['id']
+    resultado = db.repreciar_productos('delta', -2000, ids=[cam])
+    assert resultado['afectados'] == 1 and _precios(db)['CAM-1'] == 0.0
+
+    repetido = db.repreciar_productos('delta', -2000, ids=[cam])
+    assert repetido['afectados'] == 0
+    assert len(db.obtener_historial_precios(producto_id=cam)) == 1
+
+
+def test_validaciones(db):
+    """Sin filtros, operación desconocida o factor inválido no se reprecia"""
+    with pytest.raises(ValueError):
+        db.repreciar_productos('porcentaje', 5)
+    with pytest.raises(ValueError):
+        db.repreciar_productos('multiplicar', 2, categoria='SDI')
+    with pytest.raises(ValueError):
+        db.repreciar_productos('factor', 0, categoria='SDI')
+    assert db.repreciar_productos('porcentaje', 1, todos=True)['afectados'] == 4
+
+
+def test_solo_redondeo(db):
+    """'redondeo' deja el precio y sólo lo lleva al múltiplo pedido"""
+    resultado = db.repreciar_productos('redondeo', redondeo=50, categoria='SDI', tipo='producto')
+
+    assert resultado['afectados'] == 2
+    assert _precios(db)['DET-1'] == 2000.0 and _precios(db)['DET-2'] == 2000.0
+    assert _precios(db)['SERV-1'] == 25000.0
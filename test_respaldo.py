@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas del respaldo en caliente (respaldo.py)
+"""
+
+import os
+import sqlite3
+import threading
+
+import pytest
+
+import respaldo
+from database import Database
+
+
+@pytest.fixture
+def instalacion(tmp_path):
+    """Base con datos y carpetas de archivos como en /opt/cotizador"""
+    raiz = tmp_path / 'app'
+    (raiz / 'data').mkdir(parents=True)
+    (raiz / 'uploads' / 'productos').mkdir(parents=True)
+    (raiz / 'pdfs').mkdir()
+    (raiz / 'uploads' / 'productos' / 'foto.png').write_bytes(b'png' * 1000)
+    (raiz / 'uploads' / 'plano.pdf').write_bytes(b'pdf' * 1000)
+    (raiz / 'pdfs' / 'INT-0001.pdf').write_bytes(b'cotizacion')
+
+    db = Database(str(raiz / 'data' / 'cotizaciones.db'))
+    cliente_id = db.crear_cliente('Cliente', 'c@test.com')
+    for _ in range(50):
+        db.crear_cotizacion(cliente_id, [{'concepto': 'X', 'cantidad': 1, 'precio_unitario': 10.0}])
+    return raiz, db
+
+
+def _respaldar(raiz, destino, **kwargs):
+    return respaldo.respaldar(str(destino), [str(raiz / 'data' / 'cotizaciones.db'), str(raiz / 'data' / 'archive.db')],
+                              ['uploads', 'pdfs'], str(raiz), paginas_por_paso=2, pausa=0, **kwargs)
+
+
+def test_respaldo_en_caliente_consistente(instalacion, tmp_path):
+    """Con un writer activo la copia es consistente y pasa integrity_check"""
+    raiz, db = instalacion
+    detener = threading.Event()
+
+    def _escribir():
+        while not detener.is_set():
+            db.crear_cliente('Concurrente', 'x@test.com')
+
+    hilo = threading.Thread(target=_escribir)
+    hilo.start()
+    try:
+        resultado = _respaldar(raiz, tmp_path / 'respaldos')
+    finally:
+        detener.set()
+        hilo.join()
+
+    info = resultado['manifiesto']['bases']['cotizaciones.db']
+    assert info['integridad'] == 'ok' and info['pasos'] > 1
+    assert 'archive.db' not in resultado['manifiesto']['bases']  # aún no existe
+
+    copia = os.path.join(resultado['ruta'], 'bases', 'cotizaciones.db')
+    conn = sqlite3.connect(copia)
+    assert conn.execute('SELECT COUNT(*) FROM cotizaciones').fetchone()[0] == 50
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    conn.close()
+    assert not os.path.exists(copia + '-wal')
+
+
+def test_archivos_incrementales(instalacion, tmp_path):
+    """Sólo se copian archivos nuevos o modificados; el contenido repetido se guarda una vez"""
+    raiz, _ = instalacion
+    destino = tmp_path / 'respaldos'
+
+    primero = _respaldar(raiz, destino)['manifiesto']
+    assert len(primero['archivos']) == 3 and primero['archivos_copiados'] == 3
+
+    assert _respaldar(raiz, destino)['manifiesto']['archivos_copiados'] == 0
+
+    (raiz / 'pdfs' / 'INT-0001.pdf').write_bytes(b'cotizacion v2')
+    (raiz / 'pdfs' / 'copia.pdf').write_bytes(b'pdf' * 1000)  # mismo contenido que plano.pdf
+    tercero = _respaldar(raiz, destino)['manifiesto']
+    assert tercero['archivos_copiados'] == 1
+    assert tercero['archivos']['pdfs/copia.pdf']['sha256'] == tercero['archivos']['uploads/plano.pdf']['sha256']
+
+
+def test_verificar_y_restaurar(instalacion, tmp_path):
+    """Un respaldo se verifica y se restaura; un objeto faltante se detecta"""
+    raiz, _ = instalacion
+    resultado = _respaldar(raiz, tmp_path / 'respaldos')
+    assert respaldo.verificar_respaldo(resultado['ruta'], rehash=True) == []
+
+    restaurado = tmp_path / 'restaurado'
+    assert respaldo.restaurar(resultado['ruta'], str(restaurado)) == {'bases': 1, 'archivos': 3}
+    assert (restaurado / 'uploads' / 'productos' / 'foto.png').read_bytes() == b'png' * 1000
+    assert Database(str(restaurado / 'bases' / 'cotizaciones.db')).obtener_cotizaciones()
+
+    sha256 = resultado['manifiesto']['archivos']['pdfs/INT-0001.pdf']['sha256']
+    os.remove(tmp_path / 'respaldos' / 'objetos' / sha256[:2] / sha256)
+    assert respaldo.verificar_respaldo(resultado['ruta']) == [f'pdfs/INT-0001.pdf: falta el objeto {sha256}']
+    with pytest.raises(respaldo.RespaldoError):
+        respaldo.restaurar(resultado['ruta'], str(tmp_path / 'otro'))
+
+
+def test_retencion(instalacion, tmp_path):
+    """Se borran respaldos vencidos (dejando los mínimos) y los objetos huérfanos"""
+    raiz, _ = instalacion
+    destino = tmp_path / 'respaldos'
+    viejos = []
+    for _ in range(3):
+        viejos.append(_respaldar(raiz, destino)['ruta'])
+        (raiz / 'pdfs' / 'INT-0001.pdf').write_bytes(os.urandom(64))
+    for indice, ruta in enumerate(viejos):
+        os.rename(ruta, os.path.join(destino, f'2020010{indice + 1}_020000'))
+
+    resultado = _respaldar(raiz, destino, retencion_dias=30, minimos=2)
+    assert resultado['retencion']['respaldos_borrados'] == 2
+    # Los dos primeros PDF sólo los usaban los respaldos borrados
+    assert resultado['retencion']['objetos_borrados'] == 2
+    assert len(respaldo.listar_respaldos(str(destino))) == 2
+    assert all(respaldo.verificar_respaldo(ruta) == [] for _, ruta in respaldo.listar_respaldos(str(destino)))
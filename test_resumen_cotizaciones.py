@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las columnas de resumen de cotizaciones mantenidas por triggers
+"""
+
+import pytest
+
+import migrations
+from database import Database
+
+
+ITEM = {'concepto': 'Instalación', 'cantidad': 1, 'precio_unitario': 100.0}
+
+
+def _adjunto(nombre, tamano):
+    return {'nombre_original': nombre, 'nombre_archivo': f'x_{nombre}',
+            'ruta_archivo': f'uploads/x_{nombre}', 'mime_tipo': 'application/pdf', 'tamano_bytes': tamano}
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'resumen.db'))
+    db.crear_cliente('Cliente', 'c@test.com')
+    return db
+
+
+def _resumen(db, cotizacion_id):
+    fila = next(c for c in db.obtener_cotizaciones() if c['id'] == cotizacion_id)
+    return fila['items_count'], fila['adjuntos_count'], fila['adjuntos_bytes'], fila['ultimo_envio']
+
+
+def test_triggers_mantienen_el_resumen(db):
+    """Altas, ediciones y bajas de items y adjuntos actualizan el resumen del listado"""
+    cotizacion_id, _ = db.crear_cotizacion(1, [ITEM, ITEM, ITEM])
+    assert _resumen(db, cotizacion_id) == (3, 0, 0, None)
+
+    db.agregar_adjuntos(cotizacion_id, [_adjunto('a.pdf', 1000), _adjunto('b.pdf', None)])
+    assert _resumen(db, cotizacion_id) == (3, 2, 1000, None)
+
+    items = db.obtener_cotizacion(cotizacion_id)['items']
+    db.actualizar_cotizacion(cotizacion_id, 1, [dict(items[0]), ITEM])
+    assert _resumen(db, cotizacion_id)[0] == 2
+
+    db.actualizar_emails_destino(cotizacion_id, 'a@test.com')
+    assert _resumen(db, cotizacion_id)[3] is not None
+
+    listado = db.listar_cotizaciones()['cotizaciones'][0]
+    assert (listado['items_count'], listado['adjuntos_count'], listado['adjuntos_bytes']) == (2, 2, 1000)
+
+
+def test_lote_y_escrituras_fuera_de_database(db):
+    """executemany del lote, SQL directo y mover un item de cotización cuadran con el conteo real"""
+    resultado = db.crear_cotizaciones_lote([
+        {'cliente_id': 1, 'items': [ITEM] * 4},
+        {'cliente_id': 1, 'items': [ITEM]},
+    ])
+    primera, segunda = (c['id'] for c in resultado['creadas'])
+    assert _resumen(db, primera)[0] == 4 and _resumen(db, segunda)[0] == 1
+
+    resultado = db.crear_cotizaciones_lote([{'cliente_id': 1, 'items': [ITEM] * 2}], modo='parcial')
+    assert _resumen(db, resultado['creadas'][0]['id'])[0] == 2
+
+    conn = db.get_connection()
+    conn.execute('UPDATE cotizacion_items SET cotizacion_id = ? WHERE id = '
+                 '(SELECT MIN(id) FROM cotizacion_items WHERE cotizacion_id = ?)', (segunda, primera))
+    conn.execute("INSERT INTO cotizacion_items (cotizacion_id, concepto, cantidad, precio_unitario, subtotal) "
+                 "VALUES (?, 'Extra', 1, 1, 1)", (segunda,))
+    conn.execute('INSERT INTO cotizacion_adjuntos (cotizacion_id, nombre_original, nombre_archivo, '
+                 "ruta_archivo, tamano_bytes) VALUES (?, 'a.pdf', 'x_a.pdf', 'uploads/x_a.pdf', 70)", (segunda,))
+    conn.commit()
+    conn.close()
+    assert _resumen(db, primera)[:3] == (3, 0, 0) and _resumen(db, segunda)[:3] == (3, 1, 70)
+    assert db.reparar_resumen_cotizaciones() == 0
+
+
+def test_muchos_items_una_entrada_y_una_version(db):
+    """Los items no escriben la cotización fila por fila: una entrada de bitácora y una versión por escritura"""
+    cursor = db.obtener_cambios()['cursor']
+    version = db.versiones_tablas('cotizaciones')[0]
+
+    cotizacion_id, _ = db.crear_cotizacion(1, [ITEM] * 500)
+    assert _resumen(db, cotizacion_id)[0] == 500
+    assert db.obtener_cambios()['cursor'] == cursor + 1
+    assert db.versiones_tablas('cotizaciones')[0] == version + 1
+
+    items = db.obtener_cotizacion(cotizacion_id)['items']
+    db.actualizar_cotizacion(cotizacion_id, 1, [dict(item) for item in items[:200]] + [ITEM] * 50)
+    assert _resumen(db, cotizacion_id)[0] == 250
+    assert db.obtener_cambios()['cursor'] == cursor + 2
+    assert db.versiones_tablas('cotizaciones')[0] == version + 2
+
+    # Los adjuntos sólo mueven columnas de resumen: sin bitácora ni versión
+    db.agregar_adjuntos(cotizacion_id, [_adjunto(f'{i}.pdf', 10) for i in range(20)])
+    assert _resumen(db, cotizacion_id)[:3] == (250, 20, 200)
+    assert db.obtener_cambios()['cursor'] == cursor + 2
+    assert db.versiones_tablas('cotizaciones')[0] == version + 2
+
+
+def test_reparar_recalcula_solo_lo_desfasado(db):
+    """La reparación corrige los resúmenes alterados y no toca los correctos"""
+    correcta, _ = db.crear_cotizacion(1, [ITEM])
+    alterada, _ = db.crear_cotizacion(1, [ITEM, ITEM])
+    db.agregar_adjuntos(alterada, [_adjunto('a.pdf', 500)])
+
+    conn = db.get_connection()
+    conn.execute('UPDATE cotizaciones SET items_count = 9, adjuntos_bytes = 0 WHERE id = ?', (alterada,))
+    conn.commit()
+    conn.close()
+
+    assert db.reparar_resumen_cotizaciones() == 1
+    assert _resumen(db, alterada)[:3] == (2, 1, 500)
+    assert _resumen(db, correcta)[:3] == (1, 0, 0)
+    assert db.reparar_resumen_cotizaciones() == 0
+
+
+def test_migracion_15_restaura_triggers(db):
+    """Una base en la versión 14 (sin triggers) recupera los triggers y los conteos desfasados"""
+    cotizacion_id, _ = db.crear_cotizacion(1, [ITEM])
+    conn = db.get_connection()
+    migrations._m014_resumen_por_sentencia(conn)
+    conn.execute("INSERT INTO cotizacion_items (cotizacion_id, concepto, cantidad, precio_unitario, subtotal) "
+                 "VALUES (?, 'Extra', 1, 1, 1)", (cotizacion_id,))
+    conn.execute('PRAGMA user_version = 14')
+    conn.commit()
+    conn.close()
+    assert _resumen(db, cotizacion_id)[0] == 1
+
+    migrations.migrate(db.db_path)
+    assert _resumen(db, cotizacion_id)[0] == 2
+    db.actualizar_cotizacion(cotizacion_id, 1, [ITEM])
+    assert _resumen(db, cotizacion_id)[0] == 1
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Prueba de concurrencia para la numeración de cotizaciones (tabla secuencias)
+
+Varios procesos crean cotizaciones al mismo tiempo sobre la misma base; los
+números deben ser únicos y sin huecos.
+"""
+
+import multiprocessing
+import sqlite3
+
+from database import Database
+
+PROCESOS = 4
+COTIZACIONES_POR_PROCESO = 500
+
+
+def _crear_cotizaciones(ruta, cliente_id, cantidad):
+    db = Database(ruta)
+    item = {'concepto': 'Servicio', 'cantidad': 1, 'precio_unitario': 100.0}
+    return [db.crear_cotizacion(cliente_id, [item])[1] for _ in range(cantidad)]
+
+
+def test_numeros_unicos_y_consecutivos_en_paralelo(tmp_path):
+    """Miles de cotizaciones desde procesos paralelos: sin duplicados ni huecos"""
+    ruta = str(tmp_path / 'secuencia.db')
+    db = Database(ruta)
+    cliente_id = db.crear_cliente('Cliente', 'cliente@test.com')
+
+    with multiprocessing.Pool(PROCESOS) as pool:
+        resultados = pool.starmap(
+            _crear_cotizaciones,
+            [(ruta, cliente_id, COTIZACIONES_POR_PROCESO)] * PROCESOS
+        )
+
+    numeros = [numero for lote in resultados for numero in lote]
+    total = PROCESOS * COTIZACIONES_POR_PROCESO
+    assert len(set(numeros)) == total
+
+    consecutivos = sorted(int(numero.rsplit('-', 1)[1]) for numero in numeros)
+    assert consecutivos == list(range(1, total + 1))
+
+
+def test_secuencia_continua_tras_eliminar(tmp_path):
+    """Eliminar una cotización no provoca números repetidos"""
+    db = Database(str(tmp_path / 'eliminar.db'))
+    cliente_id = db.crear_cliente('Cliente', 'cliente@test.com')
+    item = {'concepto': 'Servicio', 'cantidad': 1, 'precio_unitario': 10.0}
+
+    primera_id, _ = db.crear_cotizacion(cliente_id, [item])
+    _, segundo = db.crear_cotizacion(cliente_id, [item])
+    db.eliminar_cotizacion(primera_id)
+    _, tercero = db.crear_cotizacion(cliente_id, [item])
+
+    assert segundo.endswith('-0002')
+    assert tercero.endswith('-0003')
+
+
+def test_base_existente_continua_desde_el_maximo(tmp_path):
+    """La migración siembra la secuencia con el consecutivo más alto emitido"""
+    ruta = str(tmp_path / 'existente.db')
+    db = Database(ruta)
+    cliente_id = db.crear_cliente('Cliente', 'cliente@test.com')
+
+    conn = sqlite3.connect(ruta)
+    conn.execute('''
+        INSERT INTO cotizaciones (numero_cotizacion, cliente_id, subtotal, total)
+        VALUES ('INT-20250101-0041', ?, 1, 1)
+    ''', (cliente_id,))
+    conn.execute("DELETE FROM secuencias")
+    conn.commit()
+    conn.close()
+
+    item = {'concepto': 'Servicio', 'cantidad': 1, 'precio_unitario': 10.0}
+    _, numero = db.crear_cotizacion(cliente_id, [item])
+    assert numero.endswith('-0042')